@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Benchmarks for cardisco.
+
+* :mod:`benchmarks.corpus` generates synthetic documents, and replays the
+  test fixtures.
+* :mod:`benchmarks.harness` times each stage of discovery (parsing, link
+  discovery and end-to-end :func:`cardisco.discover`), and measures its peak
+  memory usage.
+* :mod:`benchmarks.run` runs the benchmarks, and writes the results as JSON.
+* :mod:`benchmarks.compare` compares the results of two runs.
+
+Run them from the top-level directory::
+
+    python -m benchmarks.run -o before.json
+    python -m benchmarks.run -o after.json
+    python -m benchmarks.compare before.json after.json
+'''
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Compares the results of two benchmark runs::
+
+    python -m benchmarks.compare before.json after.json [--threshold 0.1]
+
+The exit status is 1 if any benchmark got slower (by its best time) by more
+than the threshold, or found a different number of links.
+'''
+
+from argparse import ArgumentParser
+import json
+import sys
+
+
+def _key(result):
+    return (result['document'], result['stage'], result['backend'])
+
+
+def compare(before, after, threshold=0.1):
+    '''Compares two sets of results.
+
+    :param dict before: The results of the first run.
+    :param dict after: The results of the second run.
+    :param float threshold: The relative slowdown that counts as a regression.
+    :returns: A list of ``(key, before, after, ratio, regressed)`` tuples,
+              for the benchmarks which are in both runs.
+    :rtype: :class:`list`
+    '''
+    old = dict((_key(result), result) for result in before['results'])
+    rows = []
+    for result in after['results']:
+        key = _key(result)
+        if key not in old:
+            continue
+        previous = old[key]
+        if previous['best']:
+            ratio = result['best'] / previous['best']
+        else:
+            ratio = 1.0
+        regressed = ratio > 1 + threshold or \
+            result['links'] != previous['links']
+        rows.append((key, previous, result, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Compares two benchmark runs.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='the relative slowdown that counts as a '
+                             'regression (default: 0.1)')
+    args = parser.parse_args(argv)
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    regressions = 0
+    for key, previous, result, ratio, regressed in compare(
+            before, after, threshold=args.threshold):
+        if regressed:
+            regressions += 1
+        print '%-45s %-8s %-8s %10.6fs %10.6fs %6.2fx%s' % (
+            key + (previous['best'], result['best'], ratio,
+                   ' !' if regressed else ''))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
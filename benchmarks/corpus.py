@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+The documents that the benchmarks are run against.
+'''
+
+from glob import glob
+import os
+
+from cardisco import MODULES
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(ROOT_DIR, 'tests')
+
+#: The encodings that synthetic documents can be generated in.
+#: ``undeclared`` is UTF-8 without a ``<meta charset>``.
+ENCODINGS = ('utf-8', 'iso-8859-1', 'undeclared', 'utf-16')
+#: Where the ``<base/>`` element goes in the list of ``<link/>`` elements.
+BASE_POSITIONS = (None, 'first', 'middle', 'last')
+
+DEFAULTS = {
+    'links': 10,
+    'head_elements': 10,
+    'body_size': 10000,
+    'base': None,
+    'encoding': 'utf-8',
+}
+
+_LINK_TYPES = sorted(MODULES)
+_HEAD_FILLER = [
+    u'<meta name="description" content="Filler \xe9l\xe9ment %d">',
+    u'<script>var filler%d = "<p>\xe9</p>";</script>',
+    u'<style>.filler%d { color: red; }</style>',
+    u'<link rel="stylesheet" type="text/css" href="/css/%d.css">',
+]
+_PARAGRAPH = u'<p class="c%d">Lorem ipsum dolor sit amet, caf\xe9 cr\xe8me ' \
+             u'<a href="/page/%d">br\xfbl\xe9e</a>.</p>\n'
+
+
+class Document(object):
+    '''A benchmark document.
+
+    :param str name: A unique name for the document.
+    :param str data: The document, as it would be sent by a server.
+    :param dict params: The parameters that the document was generated with
+                        (if any).
+    :param str content_type: The ``Content-Type`` it is served with.
+    '''
+
+    def __init__(self, name, data, params=None, content_type='text/html'):
+        self.name = name
+        self.data = data
+        self.params = params or {}
+        self.content_type = content_type
+
+
+def make_html(links=10, head_elements=10, body_size=10000, base=None,
+              encoding='utf-8'):
+    '''Generates an HTML document.
+
+    :param int links: The number of feed ``<link/>`` elements in the head.
+    :param int head_elements: The number of other elements in the head.
+    :param int body_size: The approximate size of the body, in characters.
+    :param base: Where to put the ``<base/>`` element, if anywhere. One of
+                 :data:`BASE_POSITIONS`.
+    :type base: :class:`str` or :const:`None`
+    :param str encoding: One of :data:`ENCODINGS`.
+    :rtype: :class:`str`
+    '''
+    head = []
+    if encoding in ('utf-8', 'iso-8859-1'):
+        head.append(u'<meta charset="%s">' % encoding)
+    head.append(u'<title>Synthetic document</title>')
+    for i in xrange(head_elements):
+        head.append(_HEAD_FILLER[i % len(_HEAD_FILLER)] % i)
+    feeds = [u'<link rel="alternate" type="%s" href="/feeds/%d" '
+             u'title="Fl\xfbx %d">' % (_LINK_TYPES[i % len(_LINK_TYPES)], i, i)
+             for i in xrange(links)]
+    if base is not None:
+        position = {
+            'first': 0,
+            'middle': len(feeds) // 2,
+            'last': len(feeds),
+        }[base]
+        feeds.insert(position, u'<base href="http://mirror.example.com/">')
+    head.extend(feeds)
+    body = []
+    size = 0
+    i = 0
+    while size < body_size:
+        paragraph = _PARAGRAPH % (i, i)
+        body.append(paragraph)
+        size += len(paragraph)
+        i += 1
+    html = u'<!DOCTYPE html>\n<html><head>\n%s\n</head><body>\n%s</body>' \
+           u'</html>' % (u'\n'.join(head), u''.join(body))
+    if encoding == 'undeclared':
+        encoding = 'utf-8'
+    return html.encode(encoding)
+
+
+def generate(name, **params):
+    '''Generates a :class:`Document`. Parameters which aren't given take their
+    values from :data:`DEFAULTS`.
+
+    :param str name: The name of the document.
+    :param dict \*\*params: Parameters for :func:`make_html`.
+    :rtype: :class:`Document`
+    '''
+    values = dict(DEFAULTS)
+    values.update(params)
+    return Document('synthetic/%s' % name, make_html(**values), values)
+
+
+def synthetic_corpus(quick=False):
+    '''Generates documents which each vary one parameter from
+    :data:`DEFAULTS`, including a series with thousands of links and a
+    ``<base/>`` element, which shows how link resolution scales.
+
+    :param bool quick: Whether to leave out the larger documents.
+    :rtype: a generator of :class:`Document` objects
+    '''
+    yield generate('default')
+    for links in [0, 100, 1000] if quick else [0, 100, 1000, 4000, 8000]:
+        yield generate('links-%d' % links, links=links, base='middle')
+    for count in [0, 100] if quick else [0, 100, 1000]:
+        yield generate('head-%d' % count, head_elements=count)
+    for size in [0, 100000] if quick else [0, 100000, 1000000]:
+        yield generate('body-%d' % size, body_size=size)
+    for base in BASE_POSITIONS[1:]:
+        yield generate('base-%s' % base, base=base)
+    for encoding in ENCODINGS[1:]:
+        yield generate('encoding-%s' % encoding, encoding=encoding)
+
+
+def fixture_corpus(quick=False):
+    '''Replays the HTML fixtures from the test suite.
+
+    :param bool quick: Ignored; the fixtures are all small.
+    :rtype: a generator of :class:`Document` objects
+    '''
+    for path in sorted(glob(os.path.join(FIXTURE_DIR, '*', '*.htm*'))):
+        name = os.path.relpath(path, FIXTURE_DIR).replace(os.sep, '/')
+        with open(path, 'rb') as f:
+            yield Document('fixtures/%s' % name, f.read())
+
+
+CORPORA = {
+    'synthetic': synthetic_corpus,
+    'fixtures': fixture_corpus,
+}
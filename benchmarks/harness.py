@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Timing and peak memory measurements for each stage of discovery:
+
+* ``parse``: building the tree, with :func:`cardisco.backends.parse_document`.
+* ``links``: finding and resolving the links in an already-built tree (i.e.
+  the discoverers' ``parse`` step).
+* ``discover``: :func:`cardisco.discover`, end to end, against a local HTTP
+  server.
+'''
+
+from contextlib import contextmanager
+import os
+from timeit import default_timer
+
+import cardisco
+from cardisco import _get_dispatcher
+from cardisco.backends import parse_document
+from tests.local_server import LocalServer, Page
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+STAGES = ('parse', 'links', 'discover')
+BASE_URL = 'http://www.example.com/'
+
+
+def time_calls(func, repeat):
+    '''Calls a function several times.
+
+    :param callable func: The function to time.
+    :param int repeat: The number of times to call it.
+    :returns: The duration of each call, in seconds.
+    :rtype: :class:`list` of :class:`float`
+    '''
+    timings = []
+    for i in xrange(repeat):
+        start = default_timer()
+        func()
+        timings.append(default_timer() - start)
+    return timings
+
+
+def peak_memory(func):
+    '''Calls a function in a forked child process, and measures how much the
+    child's peak resident set size grows.
+
+    :param callable func: The function to measure.
+    :returns: The growth, in kilobytes (on Linux; macOS reports bytes), or
+              :const:`None` if it can't be measured on this platform.
+    :rtype: :class:`int` or :const:`None`
+    '''
+    if resource is None or not hasattr(os, 'fork'):
+        return None
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            func()
+            after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(write_fd, str(after - before))
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    chunks = []
+    while True:
+        data = os.read(read_fd, 64)
+        if not data:
+            break
+        chunks.append(data)
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    data = ''.join(chunks)
+    return int(data) if data else None
+
+
+def _path(document):
+    return '/%s' % document.name
+
+
+@contextmanager
+def serve(documents):
+    '''Serves documents on a local HTTP server, for the ``discover`` stage.
+
+    :param documents: The documents to serve.
+    :type documents: a collection of
+                     :class:`~benchmarks.corpus.Document` objects
+    :returns: A context manager, which returns the server.
+    '''
+    pages = dict((_path(document), Page(document.data, headers={
+        'Content-Type': document.content_type,
+    })) for document in documents)
+    with LocalServer(pages) as server:
+        yield server
+
+
+def _count_links(result):
+    return sum(len(urls) for urls in result.itervalues())
+
+
+def stage_function(stage, document, backend, server=None):
+    '''Prepares a stage for a document, so that only the stage itself is
+    measured.
+
+    :param str stage: One of :data:`STAGES`.
+    :param document: The document.
+    :type document: :class:`~benchmarks.corpus.Document`
+    :param str backend: The parser backend.
+    :param server: The server returned by :func:`serve`, which is needed
+                   for the ``discover`` stage.
+    :returns: A function which runs the stage, and returns the number of
+              links found (or :const:`None` for the ``parse`` stage).
+    :rtype: :class:`callable`
+    '''
+    if stage == 'parse':
+        def func():
+            parse_document(document.data, backend=backend)
+    elif stage == 'links':
+        dispatcher = _get_dispatcher()
+        doc = parse_document(document.data, backend=backend)
+        url = BASE_URL + document.name
+
+        def func():
+            return _count_links(dispatcher.parse(doc, url=url))
+    elif stage == 'discover':
+        if server is None:
+            raise ValueError('The discover stage needs a server')
+        url = server.url(_path(document))
+
+        def func():
+            return _count_links(cardisco.discover(url, backend=backend))
+    else:
+        raise ValueError('Unknown stage: %r' % stage)
+    return func
+
+
+def measure(stage, document, backend, repeat=3, memory=True, server=None):
+    '''Measures a stage for a document.
+
+    :param str stage: One of :data:`STAGES`.
+    :param document: The document.
+    :type document: :class:`~benchmarks.corpus.Document`
+    :param str backend: The parser backend.
+    :param int repeat: The number of times to time the stage.
+    :param bool memory: Whether to measure the peak memory usage, too.
+    :param server: The server returned by :func:`serve`.
+    :returns: A JSON-serializable record of the measurements.
+    :rtype: :class:`dict`
+    '''
+    func = stage_function(stage, document, backend, server=server)
+    found = func()  # warm up
+    timings = time_calls(func, repeat)
+    ordered = sorted(timings)
+    return {
+        'document': document.name,
+        'params': document.params,
+        'bytes': len(document.data),
+        'stage': stage,
+        'backend': backend,
+        'repeat': repeat,
+        'best': ordered[0],
+        'median': ordered[len(ordered) // 2],
+        'mean': sum(timings) / len(timings),
+        'peak_memory_kb': peak_memory(func) if memory else None,
+        'links': found,
+    }
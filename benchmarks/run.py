@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Runs the benchmarks, and writes the results as JSON::
+
+    python -m benchmarks.run [--quick] [-o results.json]
+
+Run ``python -m benchmarks.run --help`` for the other options.
+'''
+
+from argparse import ArgumentParser
+from datetime import datetime
+import json
+import platform
+import sys
+
+import html5lib
+from lxml import etree
+
+from cardisco.backends import BACKENDS
+from .corpus import CORPORA
+from .harness import measure, serve, STAGES
+
+
+def metadata(args):
+    '''Describes the environment that the benchmarks are run in.
+
+    :rtype: :class:`dict`
+    '''
+    return {
+        'started': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'html5lib': html5lib.__version__,
+        'lxml': etree.__version__,
+        'quick': args.quick,
+        'repeat': args.repeat,
+    }
+
+
+def run(args, log=sys.stderr):
+    '''Runs the benchmarks selected by the command line arguments.
+
+    :returns: The metadata and a list of results.
+    :rtype: :class:`dict`
+    '''
+    documents = []
+    for name in args.corpus or sorted(CORPORA):
+        documents.extend(document for document in CORPORA[name](args.quick)
+                         if args.filter is None or
+                         args.filter in document.name)
+    stages = args.stage or STAGES
+    backends = args.backend or BACKENDS
+    results = []
+    with serve(documents) as server:
+        for document in documents:
+            for stage in stages:
+                for backend in backends:
+                    result = measure(stage, document, backend,
+                                     repeat=args.repeat,
+                                     memory=not args.no_memory, server=server)
+                    results.append(result)
+                    log.write('%-45s %-8s %-8s %10.6fs\n' % (
+                        document.name, stage, backend, result['best']))
+    return {
+        'metadata': metadata(args),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Runs the cardisco benchmarks.')
+    parser.add_argument('-o', '--output', default='-',
+                        help='the file to write the results to (default: '
+                             'standard output)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='the number of times to time each benchmark')
+    parser.add_argument('--quick', action='store_true',
+                        help='leave out the larger documents')
+    parser.add_argument('--corpus', action='append', choices=sorted(CORPORA),
+                        help='only use the given corpus')
+    parser.add_argument('--stage', action='append', choices=STAGES,
+                        help='only measure the given stage')
+    parser.add_argument('--backend', action='append', choices=BACKENDS,
+                        help='only use the given parser backend')
+    parser.add_argument('--filter',
+                        help='only use documents whose names contain this')
+    parser.add_argument('--no-memory', action='store_true',
+                        help="don't measure peak memory usage")
+    args = parser.parse_args(argv)
+    report = run(args)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=1, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,9 +18,11 @@ An autodiscovery library.
 .. moduleauthor:: Mark Lee <cardisco lazymalevolence com>
 '''
 
-import html5lib
-import httplib2
+from .results import DiscoveryResult, Link
+from .stats import (BUILD, BYTES_READ, clock, DECODE, FETCH, MEMO_HITS,
+                    MEMO_MISSES, PROBE)
 from importlib import import_module
+from threading import Lock
 
 MODULES = {
     'application/atom+xml': '.atom',
@@ -30,11 +32,14 @@ MODULES = {
 }
 
 _MODULE_CACHE = {}
+_DISPATCHER = None
+_REGISTRY_LOCK = Lock()
 
 HTTP_ACCEPT = '%s, text/html, text/*; q=0.5' % ', '.join(MODULES.keys())
 
 
-def discover(url, http=None, **kwargs):
+def discover(url, http=None, cache=None, backend='html5lib', prefilter=False,
+             hooks=None, compact=False, memo=None, probe=None, **kwargs):
     '''Discovers various metadata URLs embedded in an HTML document, such
     as feeds and RDF.
 
@@ -42,58 +47,277 @@ def discover(url, http=None, **kwargs):
     :param http: The :mod:`httplib2` HTTP object. If it's not set, one will
                  be created.
     :type http: :class:`httplib2.Http` or :const:`None`
+    :param cache: The cache used to avoid downloading and parsing unchanged
+                  documents.
+    :type cache: :class:`cardisco.cache.DiscoveryCache` or :const:`None`
+    :param str backend: The parser backend to use. See
+                        :mod:`cardisco.backends`.
+    :param bool prefilter: Whether to skip parsing documents which can't
+                           contain any matching links. See
+                           :mod:`cardisco.prefilter`.
+    :param hooks: The object that timings and counters are reported to. See
+                  :mod:`cardisco.stats`.
+    :type hooks: :class:`cardisco.stats.Hooks` or :const:`None`
+    :param bool compact: Whether to return a
+                         :class:`~cardisco.results.DiscoveryResult` instead
+                         of a dictionary. See :mod:`cardisco.results`.
+    :param memo: The memo used to avoid parsing document heads which have
+                 already been parsed. See :mod:`cardisco.memo`.
+    :type memo: :class:`cardisco.memo.HeadMemo` or :const:`None`
+    :param probe: The object which probes well-known feed paths when the
+                  document doesn't link to anything, or the response has an
+                  error status. See :mod:`cardisco.probe`.
+    :type probe: :class:`cardisco.probe.Prober` or :const:`None`
     :param dict \*\*kwargs: Extra arguments to :meth:`httplib2.Http.request`.
     :returns: A dictionary, where the key is the URL's MIME type and the value
               is a dictionary of URL-title pairs.
-    :rtype: :class:`dict`
+    :rtype: :class:`dict` or :class:`~cardisco.results.DiscoveryResult`
     '''
     if not http:
+        import httplib2
+
         http = httplib2.Http()
-    if 'headers' in kwargs:
-        kwargs['headers']['Accept'] = HTTP_ACCEPT
-    else:
-        kwargs['headers'] = {
-            'Accept': HTTP_ACCEPT,
-        }
+    headers = kwargs['headers'] = dict(kwargs.get('headers') or {})
+    headers['Accept'] = HTTP_ACCEPT
+    entry = None
+    if cache is not None:
+        entry = cache.get(url)
+        if entry is not None:
+            headers.update(entry.conditional_headers())
+    if hooks is not None:
+        start = clock()
     response, content = http.request(url, **kwargs)
-    if response['content-type'] in MODULES:
-        # assume the server's not lying
-        return {
-            response['content_type']: {
-                url: None,
-            },
-        }
-    # TODO if someone wishes to, they can implement the MIME sniffing
-    # algorithm here.
-    return parse_html(content, url=url)
-
-
-def parse_html(file_obj_or_str, url=None):
+    if hooks is not None:
+        hooks.stage(FETCH, clock() - start, len(content))
+        hooks.count(BYTES_READ, len(content))
+    if entry is not None and response.status == 304:
+        return _cached_result(entry.result, compact)
+    result = _result_from_response(url, response.get('content-type'),
+                                   content, backend=backend,
+                                   prefilter=prefilter, hooks=hooks,
+                                   compact=compact, memo=memo)
+    if probe is not None and (response.status >= 400 or
+                              not any(result.itervalues())):
+        if hooks is not None:
+            start = clock()
+        found = probe.probe(url)
+        if hooks is not None:
+            hooks.stage(PROBE, clock() - start, len(found))
+        if found:
+            result = _probed_result(result, found, compact)
+    if cache is not None and response.status == 200:
+        etag = response.get('etag')
+        last_modified = response.get('last-modified')
+        if etag or last_modified or cache.store_unvalidated:
+            cache.set(url, result, etag, last_modified)
+    return result
+
+
+def discover_many(urls, *args, **kwargs):
+    '''Runs :func:`discover` on a number of URLs concurrently. See
+    :func:`cardisco.batch.discover_many`.
+    '''
+    from .batch import discover_many
+
+    return discover_many(urls, *args, **kwargs)
+
+
+def discover_streaming(url, *args, **kwargs):
+    '''Discovers metadata URLs without reading the whole document. See
+    :func:`cardisco.stream.discover_streaming`.
+    '''
+    from .stream import discover_streaming
+
+    return discover_streaming(url, *args, **kwargs)
+
+
+def discover_async(urls, *args, **kwargs):
+    '''Discovers metadata URLs in a number of documents, using an event
+    loop. See :func:`cardisco.aio.discover_async`.
+    '''
+    from .aio import discover_async
+
+    return discover_async(urls, *args, **kwargs)
+
+
+def _probed_result(result, found, compact):
+    if compact:
+        links = list(result.links)
+        known = set((link.type, link.href) for link in links)
+        for name, hrefs in sorted(found.iteritems()):
+            for href in sorted(hrefs):
+                if (name, href) not in known:
+                    links.append(Link(name, href, position=None))
+        return DiscoveryResult(result.names | frozenset(found), links)
+    merged = _empty_result()
+    for links in (result, found):
+        for name, hrefs in links.iteritems():
+            merged.setdefault(name, {}).update(hrefs)
+    return merged
+
+
+def _cached_result(result, compact):
+    from .cache import copy_result
+
+    result = copy_result(result)
+    if compact and not isinstance(result, DiscoveryResult):
+        return DiscoveryResult.from_dict(result)
+    if not compact and isinstance(result, DiscoveryResult):
+        return result.to_dict()
+    return result
+
+
+def _feed_result(mime_type, url, compact=False):
+    '''The result for a URL which is a feed (or another metadata document)
+    itself.
+    '''
+    if compact:
+        return DiscoveryResult(frozenset([mime_type]),
+                               [Link(mime_type, url)])
+    return {
+        mime_type: {
+            url: None,
+        },
+    }
+
+
+def _result_from_response(url, content_type, content, backend='html5lib',
+                          prefilter=False, hooks=None, compact=False,
+                          memo=None):
+    from .encoding import charset_label
+    from .sniff import sniff, SNIFF_LENGTH
+
+    if hooks is not None:
+        start = clock()
+    mime_type = sniff(content_type, content[:SNIFF_LENGTH])
+    if mime_type in MODULES:
+        result = _feed_result(mime_type, url, compact)
+    elif mime_type is None:
+        result = _empty_result(compact)
+    else:
+        return parse_html(content, url=url, backend=backend,
+                          prefilter=prefilter, hooks=hooks, compact=compact,
+                          encoding=charset_label(content_type), memo=memo)
+    if hooks is not None:
+        hooks.stage(DECODE, clock() - start, len(content))
+    return result
+
+
+def parse_html(file_obj_or_str, url=None, head_only=False,
+               backend='html5lib', prefilter=False, hooks=None, compact=False,
+               encoding=None, memo=None):
     '''Discovers various metadata URLs embedded in a given HTML document, such
     as feeds and RDF.
 
     :param file_obj_or_str: The HTML document to be parsed.
-    :type file_obj_or_str: a file-like object or :class:`str`
+    :type file_obj_or_str: a file-like object, :class:`str` or
+                           :class:`unicode`
     :param url: The URL that the HTML document was retrieved from.
     :type url: :class:`str` or :const:`None`
+    :param bool head_only: Whether to stop parsing the document once the end
+                           of the ``<head/>`` section is reached. See
+                           :mod:`cardisco.head`.
+    :param str backend: The parser backend to use. See
+                        :mod:`cardisco.backends`.
+    :param bool prefilter: Whether to scan the document for candidate links
+                           before parsing it, and skip parsing it if there
+                           aren't any. See :mod:`cardisco.prefilter`.
+    :param hooks: The object that timings and counters are reported to. See
+                  :mod:`cardisco.stats`.
+    :type hooks: :class:`cardisco.stats.Hooks` or :const:`None`
+    :param bool compact: Whether to return a
+                         :class:`~cardisco.results.DiscoveryResult` instead
+                         of a dictionary. See :mod:`cardisco.results`.
+    :param encoding: The encoding of the document given by the transport
+                     layer (e.g. the ``charset`` of the HTTP
+                     ``Content-Type`` header). A byte order mark takes
+                     precedence over it, and if it's not set, the document
+                     is pre-scanned for a ``<meta/>`` declaration. See
+                     :mod:`cardisco.encoding`.
+    :type encoding: :class:`str` or :const:`None`
+    :param memo: The memo used to avoid parsing document heads which have
+                 already been parsed. File-like objects are read in full
+                 when it is set. See :mod:`cardisco.memo`.
+    :type memo: :class:`cardisco.memo.HeadMemo` or :const:`None`
     :returns: A dictionary, where the key is the URL's MIME type and the value
               is a dictionary of URL-title pairs.
-    :rtype: :class:`dict`
+    :rtype: :class:`dict` or :class:`~cardisco.results.DiscoveryResult`
     '''
-    urls = {}
+    from .backends import parse_document
+    from .encoding import decode_document
+    from .prefilter import may_have_links
+
+    dispatcher = _get_dispatcher()
+    if hooks is not None:
+        start = clock()
+    if prefilter and dispatcher.head_only:
+        if hasattr(file_obj_or_str, 'read'):
+            file_obj_or_str = file_obj_or_str.read()
+        if not may_have_links(file_obj_or_str, dispatcher.link_types):
+            if hooks is not None:
+                hooks.stage(DECODE, clock() - start, len(file_obj_or_str))
+            return _empty_result(compact)
+    key = None
+    if memo is not None and dispatcher.head_only:
+        if hasattr(file_obj_or_str, 'read'):
+            file_obj_or_str = file_obj_or_str.read()
+        key = memo.key(file_obj_or_str, encoding=encoding, backend=backend)
+        links = memo.get(key)
+        if hooks is not None:
+            hooks.count(MEMO_MISSES if links is None else MEMO_HITS)
+        if links is not None:
+            if hooks is not None:
+                hooks.stage(DECODE, clock() - start, len(file_obj_or_str))
+            return links.resolve(url, dispatcher, compact=compact)
+    size = None
+    if not hasattr(file_obj_or_str, 'read'):
+        size = len(file_obj_or_str)
+        file_obj_or_str = decode_document(file_obj_or_str, encoding)
+        encoding = None
+    if hooks is None:
+        doc = parse_document(file_obj_or_str, backend=backend,
+                             head_only=head_only, encoding=encoding)
+    else:
+        hooks.stage(DECODE, clock() - start, size)
+        start = clock()
+        doc = parse_document(file_obj_or_str, backend=backend,
+                             head_only=head_only, encoding=encoding)
+        hooks.stage(BUILD, clock() - start, size)
+    if key is not None:
+        links = dispatcher.extract(doc)
+        memo.set(key, links)
+        return links.resolve(url, dispatcher, compact=compact)
+    return dispatcher.parse(doc, url=url, hooks=hooks, compact=compact)
+
+
+def _empty_result(compact=False):
+    dispatcher = _get_dispatcher()
+    if compact:
+        return dispatcher.empty
+    return dict((name, {}) for name in dispatcher.discoverers)
+
+
+def _get_dispatcher():
+    '''Loads the discoverer modules and the discoverers provided through
+    entry points (see :mod:`cardisco.registry`), only when they're first
+    needed, and returns the :class:`~cardisco.engine.LinkDispatcher` for
+    them. The registry is built separately and then published all at once,
+    so that concurrent callers never see a partially loaded registry.
+    '''
+    global _DISPATCHER, _MODULE_CACHE
+
+    if _MODULE_CACHE:
+        return _DISPATCHER
+    from .engine import LinkDispatcher
+    from .registry import discoverer_class, entry_point_discoverers
 
-    # load the modules only when the function is first called.
-    if not _MODULE_CACHE:
+    with _REGISTRY_LOCK:
+        if _MODULE_CACHE:
+            return _DISPATCHER
+        cache = entry_point_discoverers()
         for name, module in MODULES.iteritems():
             mod = import_module(module, package=__name__)
-            try:
-                _MODULE_CACHE[name] = mod.Discoverer
-            except AttributeError:
-                raise AttributeError('''\
-Could not find a Discoverer object in the %s module.''' % name)
-
-    doc = html5lib.parse(file_obj_or_str, treebuilder='lxml')
-    print type(doc)
-    for name, discoverer in _MODULE_CACHE.iteritems():
-        urls[name] = discoverer.parse(doc, url=url)
-    return urls
+            cache[name] = discoverer_class(mod, name)
+        _DISPATCHER = LinkDispatcher(cache)
+        _MODULE_CACHE = cache
+        return _DISPATCHER
@@ -0,0 +1,625 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Event-driven discovery, built on top of an :mod:`asyncore` socket map.
+
+Requests are made through a pluggable :class:`Transport`, so that many
+documents can be retrieved at once from a single thread. The (CPU-bound)
+HTML parsing is handed off to a small thread pool, so the event loop is
+never blocked by html5lib.
+
+Host names are resolved by a small thread pool as well, since
+:func:`socket.getaddrinfo` has no non-blocking interface. IP addresses are
+used as-is.
+
+Callers that already run an :mod:`asyncore` loop can share their socket
+map with an :class:`AsyncDiscoverer` and call :meth:`AsyncDiscoverer.poll`
+from it. Everyone else can use :func:`discover_async`, which runs its own
+loop.
+'''
+
+import asyncore
+from collections import deque
+from functools import partial
+import os
+from Queue import Empty, Queue
+import select
+import socket
+import ssl
+import sys
+from threading import Lock
+from time import sleep, time
+from urlparse import urljoin, urlsplit
+
+from .stream import DEFAULT_MAX_BYTES
+
+DEFAULT_CONCURRENCY = 100
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+#: How long (in seconds) a single :meth:`AsyncDiscoverer.poll` call waits
+#: for network activity.
+POLL_INTERVAL = 0.05
+#: The default number of threads used by :class:`AsyncoreTransport` to
+#: resolve host names.
+RESOLVER_THREADS = 4
+REDIRECT_CODES = frozenset([301, 302, 303, 307, 308])
+
+_USE_POLL = hasattr(select, 'poll')
+# Resolver threads wake the event loop up through a pipe, which asyncore can
+# only wait on where file_dispatcher exists (i.e., not on Windows).
+_CAN_WAKE = hasattr(asyncore, 'file_dispatcher')
+
+
+class Response(object):
+    '''A response returned by a :class:`Transport`.
+
+    :param int status: The HTTP status code.
+    :param dict headers: The response headers, with lowercase names.
+    :param str body: The response body.
+    '''
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class Transport(object):
+    '''The interface used by :class:`AsyncDiscoverer` to make HTTP requests.
+
+    A transport must not block: :meth:`request` starts a request, and the
+    callback is invoked once it has completed (from within the event loop,
+    i.e. while :func:`asyncore.loop` is running on the socket map).
+    '''
+
+    def request(self, url, headers, callback, socket_map):
+        '''Starts a ``GET`` request.
+
+        :param str url: The URL to retrieve.
+        :param dict headers: Extra request headers.
+        :param callback: Called with ``(response, error)`` when the request
+                         has completed. One of the arguments is always
+                         :const:`None`.
+        :type callback: a callable accepting a :class:`Response` and an
+                        :class:`Exception`
+        :param dict socket_map: The :mod:`asyncore` socket map to use.
+        :returns: An object with a ``cancel()`` method, which aborts the
+                  request without invoking the callback.
+        '''
+        raise NotImplementedError()
+
+    def close(self):
+        '''Releases any resources held by the transport, such as threads.
+        Requests still in flight must have been cancelled first.
+        '''
+        pass
+
+
+def _resolve(host, port):
+    try:
+        return socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0], None
+    except Exception as e:
+        return None, e
+
+
+class _Waker(asyncore.file_dispatcher if _CAN_WAKE else object):
+    '''Hands the results of the resolver threads back to the event loop.
+
+    A byte is written to a pipe for every result, so that the loop wakes
+    up and calls :meth:`handle_read`, which passes the results on to their
+    clients. The waker closes itself once no resolution is outstanding, so
+    it doesn't keep an otherwise idle socket map busy.
+    '''
+
+    def __init__(self, socket_map, on_close):
+        read_fd, self.write_fd = os.pipe()
+        asyncore.file_dispatcher.__init__(self, read_fd, map=socket_map)
+        # file_dispatcher works on a duplicate of the descriptor.
+        os.close(read_fd)
+        self.on_close = on_close
+        self.lock = Lock()
+        self.results = deque()
+        self.pending = 0
+
+    def notify(self, client, result):
+        '''Called from a resolver thread.'''
+        with self.lock:
+            if self.write_fd is not None:
+                self.results.append((client, result))
+                os.write(self.write_fd, 'x')
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.recv(4096)
+        while self.results:
+            client, result = self.results.popleft()
+            self.pending -= 1
+            client.resolved(*result)
+        if not self.pending:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            if self.write_fd is None:
+                return
+            os.close(self.write_fd)
+            self.write_fd = None
+        asyncore.file_dispatcher.close(self)
+        self.on_close(self)
+
+
+class _HTTPClient(asyncore.dispatcher):
+    '''A minimal, non-blocking HTTP/1.0 client, which stops reading the
+    response once ``max_bytes`` of the body have been received.
+    '''
+
+    def __init__(self, url, headers, callback, socket_map, resolve,
+                 max_bytes=None):
+        asyncore.dispatcher.__init__(self, map=socket_map)
+        self.callback = callback
+        self.max_bytes = max_bytes
+        self.chunks = []
+        self.received = 0
+        self.body_start = None
+        self.finished = False
+        self.handshaking = False
+        self.want_read = False
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('Unsupported URL: %s' % url)
+        self.use_ssl = parts.scheme == 'https'
+        self.host = parts.hostname
+        port = parts.port or (443 if self.use_ssl else 80)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+        lines = [
+            'GET %s HTTP/1.0' % path,
+            'Host: %s' % parts.netloc.rsplit('@', 1)[-1],
+            'Connection: close',
+        ]
+        lines += ['%s: %s' % item for item in headers.iteritems()]
+        self.outbuf = '%s\r\n\r\n' % '\r\n'.join(lines)
+        try:
+            address_info = socket.getaddrinfo(self.host, port, 0,
+                                              socket.SOCK_STREAM, 0,
+                                              socket.AI_NUMERICHOST)[0]
+        except socket.gaierror:
+            resolve(self, self.host, port)
+        else:
+            self._connect(address_info)
+
+    def _connect(self, address_info):
+        family, socktype, proto, name, address = address_info
+        self.create_socket(family, socktype)
+        try:
+            self.connect(address)
+        except Exception:
+            self.close()
+            raise
+
+    def resolved(self, address_info, error):
+        '''Called from the event loop once the host name has been resolved.
+        '''
+        if self.finished:
+            return
+        if error is None:
+            try:
+                self._connect(address_info)
+            except Exception as e:
+                error = e
+        if error is not None:
+            self._finish(None, error)
+
+    def _handshake(self):
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLError as e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                self.want_read = True
+            elif e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                self.want_read = False
+            else:
+                raise
+        else:
+            self.handshaking = False
+
+    def handle_connect(self):
+        if self.use_ssl:
+            context = ssl.create_default_context()
+            self.socket = context.wrap_socket(self.socket,
+                                              server_hostname=self.host,
+                                              do_handshake_on_connect=False)
+            self.handshaking = True
+            self._handshake()
+
+    def writable(self):
+        if not self.connected:
+            return True
+        if self.handshaking:
+            return not self.want_read
+        return bool(self.outbuf)
+
+    def handle_write(self):
+        if self.handshaking:
+            self._handshake()
+            return
+        sent = self.send(self.outbuf)
+        self.outbuf = self.outbuf[sent:]
+
+    def handle_read(self):
+        if self.handshaking:
+            self._handshake()
+            return
+        try:
+            data = self.recv(65536)
+        except ssl.SSLError as e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                return
+            raise
+        if data:
+            self.chunks.append(data)
+            self.received += len(data)
+            if self.max_bytes is not None:
+                self._check_size()
+
+    def _check_size(self):
+        if self.body_start is None:
+            end = ''.join(self.chunks).find('\r\n\r\n')
+            if end < 0:
+                return
+            self.body_start = end + 4
+        if self.received - self.body_start >= self.max_bytes:
+            # the rest of the body isn't needed, as with StreamedResponse
+            self.handle_close()
+
+    def handle_close(self):
+        self.close()
+        try:
+            response = self._parse_response(''.join(self.chunks))
+        except Exception as e:
+            self._finish(None, e)
+        else:
+            self._finish(response, None)
+
+    def handle_error(self):
+        self.close()
+        self._finish(None, sys.exc_info()[1])
+
+    def _parse_response(self, data):
+        head, sep, body = data.partition('\r\n\r\n')
+        if not sep:
+            raise ValueError('Incomplete HTTP response')
+        lines = head.split('\r\n')
+        status = int(lines[0].split(None, 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip().lower()] = value.strip()
+        if self.max_bytes is not None:
+            body = body[:self.max_bytes]
+        return Response(status, headers, body)
+
+    def _finish(self, response, error):
+        if not self.finished:
+            self.finished = True
+            self.callback(response, error)
+
+    def cancel(self):
+        self.finished = True
+        if self.socket is not None:
+            self.close()
+
+
+class AsyncoreTransport(Transport):
+    '''The default :class:`Transport`, which only uses the standard library.
+
+    Host names are resolved by a thread pool, and the results are fed back
+    to the event loop. A lookup can't be interrupted, so a request which
+    times out while its host name is being resolved keeps a resolver
+    thread busy until :func:`socket.getaddrinfo` returns. On platforms
+    where :mod:`asyncore` can't wait on a pipe (Windows), names are resolved
+    on the event loop, which blocks it.
+
+    :param int resolver_threads: The number of threads used to resolve host
+                                 names.
+    :param max_bytes: The maximum number of bytes read from a response
+                      body (the rest of the body is discarded).
+    :type max_bytes: :class:`int` or :const:`None`
+    '''
+
+    def __init__(self, resolver_threads=RESOLVER_THREADS,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.resolver_threads = resolver_threads
+        self.max_bytes = max_bytes
+        self._pool = None
+        self._wakers = {}
+
+    def request(self, url, headers, callback, socket_map):
+        return _HTTPClient(url, headers, callback, socket_map,
+                           partial(self._resolve, socket_map),
+                           max_bytes=self.max_bytes)
+
+    def close(self):
+        for waker in self._wakers.values():
+            waker.close()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def _resolve(self, socket_map, client, host, port):
+        if not _CAN_WAKE:
+            client.resolved(*_resolve(host, port))
+            return
+        key = id(socket_map)
+        waker = self._wakers.get(key)
+        if waker is None:
+            waker = self._wakers[key] = _Waker(
+                socket_map, lambda waker: self._wakers.pop(key, None))
+        if self._pool is None:
+            from multiprocessing.pool import ThreadPool
+
+            self._pool = ThreadPool(self.resolver_threads)
+        waker.pending += 1
+        self._pool.apply_async(_resolve, (host, port),
+                               callback=partial(waker.notify, client))
+
+
+class _Job(object):
+
+    def __init__(self, url, headers, callback):
+        self.url = url
+        self.fetch_url = url
+        self.headers = headers
+        self.callback = callback
+        self.redirects = 0
+        self.handle = None
+        self.deadline = None
+
+
+def _parse(job, body, encoding):
+    from . import parse_html
+    try:
+        return job, parse_html(body, url=job.url, encoding=encoding)
+    except Exception as e:
+        return job, e
+
+
+class AsyncDiscoverer(object):
+    '''Runs :func:`cardisco.discover` style requests on an event loop.
+
+    :param transport: The transport used to make the HTTP requests. If it's
+                      not set, an :class:`AsyncoreTransport` is used.
+    :type transport: :class:`Transport` or :const:`None`
+    :param int concurrency: The maximum number of requests in flight.
+    :param timeout: The number of seconds after which a single request is
+                    aborted.
+    :type timeout: :class:`int` or :class:`float`
+    :param int parse_workers: The number of threads used to parse HTML.
+    :param socket_map: The :mod:`asyncore` socket map to use. If it's not
+                       set, a private one is created.
+    :type socket_map: :class:`dict` or :const:`None`
+    '''
+
+    def __init__(self, transport=None, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT, parse_workers=2, socket_map=None):
+        self._owns_transport = transport is None
+        self.transport = transport or AsyncoreTransport()
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.parse_workers = parse_workers
+        self.socket_map = {} if socket_map is None else socket_map
+        self._waiting = deque()
+        self._active = set()
+        self._parsed = Queue()
+        self._parsing = 0
+        self._pool = None
+
+    def discover(self, url, callback, headers=None):
+        '''Queues a URL for discovery.
+
+        :param str url: The URL to retrieve the HTML document from.
+        :param callback: Called (from :meth:`poll`) with ``(url, result)``
+                         once the URL has been processed. The result is
+                         either the dictionary which :func:`cardisco.discover`
+                         would have returned, or an exception.
+        :param headers: Extra request headers.
+        :type headers: :class:`dict` or :const:`None`
+        '''
+        from . import HTTP_ACCEPT
+
+        headers = dict(headers or {})
+        headers['Accept'] = HTTP_ACCEPT
+        self._waiting.append(_Job(url, headers, callback))
+        self._start_waiting()
+
+    def pending(self):
+        '''Returns the number of URLs that haven't been processed yet.
+
+        :rtype: :class:`int`
+        '''
+        return len(self._waiting) + len(self._active) + self._parsing
+
+    def poll(self, timeout=POLL_INTERVAL):
+        '''Runs one iteration of the event loop, and invokes the callbacks of
+        any URLs which have finished.
+
+        :param timeout: The maximum number of seconds to wait for activity.
+        :type timeout: :class:`int` or :class:`float`
+        '''
+        if self.socket_map:
+            asyncore.loop(timeout=timeout, use_poll=_USE_POLL,
+                          map=self.socket_map, count=1)
+            self._deliver_parsed(block=False)
+        elif self._parsing:
+            self._deliver_parsed(block=True, timeout=timeout)
+        elif self._active:
+            # the transport doesn't use the socket map, so there's nothing
+            # to wait on; don't spin while its requests are in flight
+            sleep(timeout)
+        self._check_timeouts()
+        self._start_waiting()
+
+    def run(self):
+        '''Runs the event loop until every queued URL has been processed.'''
+        while self.pending():
+            self.poll()
+
+    def close(self):
+        '''Aborts any outstanding requests and stops the parser threads. The
+        transport is closed as well, unless it was passed in by the caller.
+        '''
+        for job in list(self._active):
+            if job.handle is not None:
+                job.handle.cancel()
+        self._active.clear()
+        self._waiting.clear()
+        if self._owns_transport:
+            self.transport.close()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def _start_waiting(self):
+        while self._waiting and len(self._active) < self.concurrency:
+            self._start(self._waiting.popleft())
+
+    def _start(self, job):
+        job.deadline = time() + self.timeout
+        self._active.add(job)
+        try:
+            job.handle = self.transport.request(
+                job.fetch_url, job.headers,
+                lambda response, error: self._on_response(job, response,
+                                                          error),
+                self.socket_map)
+        except Exception as e:
+            self._on_response(job, None, e)
+
+    def _check_timeouts(self):
+        now = time()
+        for job in list(self._active):
+            if job.deadline < now:
+                self._active.discard(job)
+                if job.handle is not None:
+                    job.handle.cancel()
+                job.callback(job.url, socket.timeout('timed out'))
+
+    def _on_response(self, job, response, error):
+        if job not in self._active:
+            return
+        self._active.discard(job)
+        if error is not None:
+            job.callback(job.url, error)
+        elif response.status in REDIRECT_CODES and \
+                'location' in response.headers:
+            job.redirects += 1
+            if job.redirects > MAX_REDIRECTS:
+                job.callback(job.url, ValueError('Too many redirects'))
+            else:
+                job.fetch_url = urljoin(job.fetch_url,
+                                        response.headers['location'])
+                self._start(job)
+        else:
+            self._handle_response(job, response)
+
+    def _handle_response(self, job, response):
+        from . import _empty_result, MODULES
+        from .encoding import charset_label
+        from .sniff import sniff
+
+        content_type = response.headers.get('content-type')
+        mime_type = sniff(content_type, response.body)
+        if mime_type in MODULES:
+            job.callback(job.url, {
+                mime_type: {
+                    job.url: None,
+                },
+            })
+            return
+        elif mime_type is None:
+            job.callback(job.url, _empty_result())
+            return
+        if self._pool is None:
+            from multiprocessing.pool import ThreadPool
+
+            self._pool = ThreadPool(self.parse_workers)
+        self._parsing += 1
+        self._pool.apply_async(_parse, (job, response.body,
+                                        charset_label(content_type)),
+                               callback=self._parsed.put)
+
+    def _deliver_parsed(self, block, timeout=None):
+        while self._parsing:
+            try:
+                job, result = self._parsed.get(block, timeout)
+            except Empty:
+                return
+            block = False
+            self._parsing -= 1
+            job.callback(job.url, result)
+
+
+def discover_async(urls, transport=None, concurrency=DEFAULT_CONCURRENCY,
+                   timeout=DEFAULT_TIMEOUT, parse_workers=2, headers=None):
+    '''Discovers various metadata URLs embedded in a number of HTML
+    documents, using a single-threaded event loop for the requests.
+
+    The URLs are consumed lazily, so ``urls`` can be an arbitrarily long
+    iterator.
+
+    :param urls: The URLs to retrieve the HTML documents from.
+    :type urls: an iterable of :class:`str`
+    :param transport: See :class:`AsyncDiscoverer`.
+    :param int concurrency: See :class:`AsyncDiscoverer`.
+    :param timeout: See :class:`AsyncDiscoverer`.
+    :param int parse_workers: See :class:`AsyncDiscoverer`.
+    :param headers: Extra request headers.
+    :type headers: :class:`dict` or :const:`None`
+    :returns: An iterator of ``(url, result)`` tuples, in the order in which
+              the URLs are finished. The result is either the dictionary
+              which :func:`cardisco.discover` would have returned, or an
+              exception.
+    :rtype: iterator
+    '''
+    discoverer = AsyncDiscoverer(transport=transport,
+                                 concurrency=concurrency, timeout=timeout,
+                                 parse_workers=parse_workers)
+    finished = deque()
+    callback = lambda url, result: finished.append((url, result))
+    urls = iter(urls)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and discoverer.pending() < concurrency * 2:
+                try:
+                    url = urls.next()
+                except StopIteration:
+                    exhausted = True
+                else:
+                    discoverer.discover(url, callback, headers=headers)
+            if not (discoverer.pending() or finished):
+                break
+            discoverer.poll()
+            while finished:
+                yield finished.popleft()
+    finally:
+        discoverer.close()
@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .base import BaseDiscoverer
+from .base import BaseDiscoverer, LinkRule
 
 
 class Discoverer(BaseDiscoverer):
@@ -22,8 +22,6 @@ class Discoverer(BaseDiscoverer):
     * http://tools.ietf.org/html/draft-snell-atompub-autodiscovery-00
     '''
 
-    @classmethod
-    def check_link_element(cls, element):
-        rel = element.attrib['rel'].lower().split(' ')
-        ltype = element.attrib['type'].lower().strip()
-        return ltype == 'application/atom+xml' and 'alternate' in rel
+    rules = (
+        LinkRule(types=['application/atom+xml'], rels=['alternate']),
+    )
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Parser backends, which turn an HTML document into the tree that the
+discoverers work on.
+
+* ``html5lib`` parses the document the same way that a browser does. It is
+  always correct, but it is written in pure Python.
+* ``lxml`` uses libxml2's HTML parser, which is much faster, but which
+  builds a different tree from html5lib for some malformed documents.
+* ``auto`` uses the ``lxml`` backend, and falls back to ``html5lib`` when
+  the document head looks like it might be parsed differently by the two.
+
+Whichever backend is used, the discoverers get a tree whose elements are in
+the XHTML namespace (as html5lib produces it), so that their XPath
+expressions work unchanged.
+'''
+
+from lxml import etree
+import re
+
+from .base import XHTML_NAMESPACE
+from .encoding import decode_document, prescan
+from .prefilter import head_region, head_tags
+
+BACKENDS = ('html5lib', 'lxml', 'auto')
+
+#: The elements which html5lib keeps in the document head.
+HEAD_ELEMENTS = frozenset(['base', 'basefont', 'bgsound', 'link', 'meta',
+                           'noframes', 'noscript', 'script', 'style',
+                           'template', 'title'])
+
+_HEAD_LINK_RE = re.compile(r'<(?:link|base)[\s/>]', re.I)
+_CHARSET_RE = re.compile(r'charset', re.I)
+_NON_ASCII_RE = re.compile(r'[\x80-\xff]')
+
+
+class SuspiciousDocument(Exception):
+    '''Raised when the ``lxml`` backend may not have parsed the document head
+    the same way that html5lib would have.
+    '''
+
+
+def _read(file_obj_or_str):
+    if hasattr(file_obj_or_str, 'read'):
+        return file_obj_or_str.read()
+    return file_obj_or_str
+
+
+def parse_with_html5lib(file_obj_or_str, head_only=False, encoding=None):
+    '''Parses an HTML document with html5lib.
+
+    :param file_obj_or_str: The HTML document to be parsed.
+    :type file_obj_or_str: a file-like object, :class:`str` or
+                           :class:`unicode`
+    :param bool head_only: Whether to stop parsing the document once the end
+                           of the ``<head/>`` section is reached.
+    :param encoding: The encoding label given by the transport layer, for
+                     documents which haven't been decoded.
+    :type encoding: :class:`str` or :const:`None`
+    :rtype: :class:`lxml.etree._ElementTree`
+    '''
+    # html5lib is slow to import, and not needed for pre-parsed documents
+    if head_only:
+        from .head import parse_head
+
+        return parse_head(file_obj_or_str, encoding=encoding)
+    import html5lib
+
+    kwargs = {}
+    if encoding and not isinstance(file_obj_or_str, unicode):
+        kwargs['transport_encoding'] = encoding
+    return html5lib.parse(file_obj_or_str, treebuilder='lxml', **kwargs)
+
+
+def parse_with_lxml(file_obj_or_str, strict=False):
+    '''Parses an HTML document with libxml2, and returns a tree which only
+    contains the ``<html/>`` and ``<head/>`` elements, and the (element)
+    children of the head.
+
+    :param file_obj_or_str: The HTML document to be parsed.
+    :type file_obj_or_str: a file-like object, :class:`str` or
+                           :class:`unicode`
+    :param bool strict: Whether to raise :exc:`SuspiciousDocument` when the
+                        document head might be parsed differently by
+                        html5lib.
+    :rtype: :class:`lxml.etree._ElementTree`
+    '''
+    data = _read(file_obj_or_str)
+    if strict:
+        region = head_region(data)
+        if isinstance(region, str) and _NON_ASCII_RE.search(region) and \
+           not _CHARSET_RE.search(region):
+            # libxml2 and html5lib guess the encoding differently.
+            raise SuspiciousDocument('undeclared encoding')
+        if any('&' in tag for tag in head_tags(region)):
+            # libxml2 and html5lib resolve character references differently
+            # (e.g. &#150; or &amp without a semicolon).
+            raise SuspiciousDocument('character reference in head')
+        expected_links = len(_HEAD_LINK_RE.findall(region))
+    root = None
+    if data.strip():
+        if isinstance(data, unicode):
+            parser = etree.HTMLParser(recover=True, encoding='utf-8')
+            data = data.encode('utf-8')
+        else:
+            parser = etree.HTMLParser(recover=True)
+        root = etree.fromstring(data, parser)
+    source_head = None
+    if root is not None and root.tag == 'html':
+        source_head = root.find('head')
+
+    html = etree.Element('{%s}html' % XHTML_NAMESPACE,
+                         nsmap={'html': XHTML_NAMESPACE})
+    head = etree.SubElement(html, '{%s}head' % XHTML_NAMESPACE)
+    links = 0
+    if source_head is not None:
+        if strict and (source_head.text or '').strip():
+            raise SuspiciousDocument('text in head')
+        for child in source_head:
+            if strict and (child.tail or '').strip():
+                raise SuspiciousDocument('text in head')
+            if not isinstance(child.tag, basestring):
+                continue
+            if strict and child.tag not in HEAD_ELEMENTS:
+                raise SuspiciousDocument('<%s/> in head' % child.tag)
+            element = etree.SubElement(head, '{%s}%s' % (XHTML_NAMESPACE,
+                                                         child.tag))
+            for name, value in child.attrib.iteritems():
+                try:
+                    element.set(name, value)
+                except ValueError:
+                    # not a valid XML attribute name
+                    pass
+            if child.tag in ('link', 'base'):
+                links += 1
+    if strict and links != expected_links:
+        raise SuspiciousDocument('<link/> or <base/> outside of head')
+    return etree.ElementTree(html)
+
+
+def parse_document(file_obj_or_str, backend='html5lib', head_only=False,
+                   encoding=None):
+    '''Parses an HTML document with the given backend.
+
+    :param file_obj_or_str: The HTML document to be parsed.
+    :type file_obj_or_str: a file-like object, :class:`str` or
+                           :class:`unicode`
+    :param str backend: One of :data:`BACKENDS`.
+    :param bool head_only: Whether the html5lib backend should stop parsing
+                           the document once the end of the ``<head/>``
+                           section is reached.
+    :param encoding: The encoding label given by the transport layer, for
+                     documents which haven't been decoded. See
+                     :mod:`cardisco.encoding`.
+    :type encoding: :class:`str` or :const:`None`
+    :rtype: :class:`lxml.etree._ElementTree`
+    '''
+    if backend == 'html5lib':
+        return parse_with_html5lib(file_obj_or_str, head_only=head_only,
+                                   encoding=encoding)
+    elif backend not in BACKENDS:
+        raise ValueError('Unknown parser backend: %r' % backend)
+    data = _read(file_obj_or_str)
+    if not isinstance(data, unicode):
+        data = decode_document(data, encoding)
+    if not isinstance(data, unicode):
+        region = head_region(data)
+        if _CHARSET_RE.search(region):
+            # Don't let libxml2 honour a declaration that html5lib ignores
+            # (e.g. utf-7), or one past the prescan.
+            data = data.decode(prescan(region, len(region)) or 'cp1252',
+                               'replace')
+    if backend == 'lxml':
+        return parse_with_lxml(data)
+    try:
+        return parse_with_lxml(data, strict=True)
+    except SuspiciousDocument:
+        return parse_with_html5lib(data, head_only=head_only)
@@ -13,57 +13,315 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from threading import Lock
 from urlparse import urljoin
 
+XHTML_NAMESPACE = 'http://www.w3.org/1999/xhtml'
+#: The namespace map that XPath expressions are compiled with.
+NAMESPACES = {
+    'html': XHTML_NAMESPACE,
+}
+
+
+def compile_xpath(xpath):
+    '''Compiles an XPath expression, in which the ``html`` prefix refers to
+    the XHTML namespace (which html5lib puts the elements in).
+
+    :param str xpath: The XPath expression.
+    :rtype: :class:`lxml.etree.XPath`
+    '''
+    from lxml import etree
+
+    return etree.XPath(xpath, namespaces=NAMESPACES)
+
+
+class LazyXPath(object):
+    '''An XPath expression (see :func:`compile_xpath`) which is compiled when
+    it is first evaluated, so that defining discoverers doesn't import
+    :mod:`lxml`.
+
+    :param str path: The XPath expression.
+    '''
+
+    _lock = Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self._compiled = None
+
+    def __call__(self, doc):
+        compiled = self._compiled
+        if compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = compile_xpath(self.path)
+                compiled = self._compiled
+        return compiled(doc)
+
+
+BASE_XPATH = LazyXPath('/html:html/html:head/html:base')
+
+
+class ParseContext(object):
+    '''The state needed to resolve the links found in one HTML document.
+
+    Discoverers are stateless, so that one document's ``<base/>`` element
+    can't leak into another document being parsed at the same time.
+
+    :param doc: The HTML document.
+    :type doc: :class:`lxml.etree._ElementTree`
+    :param nsmap: Unused; the ``<base/>`` XPath expression is compiled with
+                  :data:`NAMESPACES`.
+    :type nsmap: :class:`dict` or :const:`None`
+    :param url: The URL that the HTML document was retrieved from.
+    :type url: :class:`str` or :const:`None`
+    '''
+
+    def __init__(self, doc, nsmap=None, url=None):
+        self.url = url
+        self.base_element = None
+        self.positions = None
+        self.base_idx = None
+        self.html_base = None
+        self._hrefs = {}
+        bases = BASE_XPATH(doc)
+        if bases:
+            head_element = bases[0].getparent()
+            # built once, so that finding a link's position is O(1)
+            self.positions = dict((child, idx)
+                                  for idx, child in enumerate(head_element))
+            self.base_element = bases[0]
+            self.base_idx = self.positions[self.base_element]
+            self.html_base = self.base_element.attrib['href']
+
+    def follows_base(self, element):
+        '''Determines whether a ``<link/>`` element is resolved against the
+        ``<base/>`` element, rather than the document URL.
+
+        :param element: The ``<link/>`` element.
+        :type element: :class:`lxml.etree._Element`
+        :rtype: :class:`bool`
+        '''
+        return self.base_element is not None and \
+            self.base_idx < self.positions[element]
+
+    def get_link_href(self, element):
+        '''Resolves the ``href`` attribute of a ``<link/>`` element against
+        the document URL or the ``<base/>`` element preceding it.
+
+        :param element: The ``<link/>`` element.
+        :type element: :class:`lxml.etree._Element`
+        :rtype: :class:`str`
+        '''
+        base = self.url
+        if self.base_element is not None:
+            if self.base_idx < self.positions[element]:
+                base = self.html_base
+        href = element.attrib['href'].strip()
+        if not base:
+            return href
+        key = (base, href)
+        try:
+            return self._hrefs[key]
+        except KeyError:
+            joined = self._hrefs[key] = urljoin(base, href)
+            return joined
+
+
+def rel_tokens(rel):
+    '''Splits a (lowercased) ``rel`` attribute into its tokens. Only spaces
+    separate tokens (as they always have for the built-in discoverers), not
+    tabs or newlines.
+
+    :param rel: The attribute value.
+    :type rel: :class:`str` or :class:`unicode`
+    :rtype: :class:`list`
+    '''
+    return rel.lower().split(' ')
+
+
+class LinkRule(object):
+    '''Declares which ``<link/>`` elements a discoverer matches.
+
+    :param types: The link types which are matched (compared in lowercase,
+                  unless the rule is exact), or :const:`None` if the
+                  ``type`` attribute doesn't matter.
+    :type types: a collection of :class:`str`, or :const:`None`
+    :param rels: The ``rel`` tokens, one of which the link must have, or
+                 :const:`None` if the ``rel`` attribute is optional.
+    :type rels: a collection of :class:`str`, or :const:`None`
+    :param bool exact: Whether the ``type`` and ``rel`` attributes must be
+                       exactly one of the given values (which is what RSS
+                       autodiscovery requires), instead of being compared
+                       case-insensitively (and as a list of tokens, for
+                       ``rel``).
+    '''
+
+    def __init__(self, types=None, rels=None, exact=False):
+        if exact and types is None:
+            raise ValueError('Exact rules must have types')
+        if not exact:
+            # normalized the same way as the attributes they are compared to
+            if types is not None:
+                types = [ltype.lower().strip() for ltype in types]
+            if rels is not None:
+                rels = [rel.lower() for rel in rels]
+        self.types = None if types is None else frozenset(types)
+        self.rels = None if rels is None else frozenset(rels)
+        self.exact = exact
+
+    def __repr__(self):
+        return 'LinkRule(types=%r, rels=%r, exact=%r)' % (
+            self.types and sorted(self.types), self.rels and sorted(self.rels),
+            self.exact)
+
+    def match(self, element):
+        '''Determines whether a ``<link/>`` element is matched by the rule.
+
+        :param element: The ``<link/>`` element.
+        :type element: :class:`lxml.etree._Element`
+        :rtype: :class:`bool`
+        '''
+        attrib = element.attrib
+        ltype = attrib.get('type')
+        rel = attrib.get('rel')
+        if self.exact:
+            return ltype in self.types and (self.rels is None or
+                                            rel in self.rels)
+        if self.types is not None and \
+           (ltype is None or ltype.lower().strip() not in self.types):
+            return False
+        if self.rels is None:
+            return True
+        return rel is not None and not self.rels.isdisjoint(rel_tokens(rel))
+
+
+class DiscovererType(type):
+    '''The metaclass of discoverers, which gives each discoverer class
+    (including subclasses which only override ``xpath``) its own
+    :class:`LazyXPath` for its :attr:`xpath` expression, when the class is
+    defined. The expression is compiled once, when it is first used.
+
+    The compiled expression is used by :meth:`BaseDiscoverer.parse`, and by
+    :func:`cardisco.parse_html` for the discoverers which override
+    ``xpath`` (see :mod:`cardisco.engine`). The other discoverers don't run
+    their own query there: the head links are selected once for all of
+    them.
+    '''
+
+    def __init__(cls, name, bases, attrs):
+        super(DiscovererType, cls).__init__(name, bases, attrs)
+        cls.compile()
+
+    def compile(cls):
+        '''(Re)creates the compiled :attr:`xpath` expression of the class.'''
+        cls._xpath_source = cls.xpath
+        cls.compiled_xpath = LazyXPath(cls.xpath)
+
+    def select(cls, doc):
+        '''Returns the elements selected by the :attr:`xpath` expression of
+        the class, recompiling it if it was reassigned after the class was
+        defined.
+
+        :param doc: The HTML document.
+        :type doc: :class:`lxml.etree._ElementTree`
+        :rtype: :class:`list`
+        '''
+        if cls._xpath_source is not cls.xpath:
+            cls.compile()
+        return cls.compiled_xpath(doc)
+
 
 class BaseDiscoverer(object):
     '''Code that is common amongst the different Discoverer modules.'''
 
-    xpath = '/html:html/html:head/html:link[@type][@rel][@href]'
+    __metaclass__ = DiscovererType
+
+    xpath = '/html:html/html:head/html:link[@href]'
+    #: The attributes that a ``<link/>`` element must have in order to be
+    #: passed to :meth:`check_link_element`.
+    required_attributes = ('type', 'rel', 'href')
+    #: The :class:`LinkRule` objects which declare the links that the
+    #: discoverer matches (any one of them has to match). The
+    #: :class:`~cardisco.engine.LinkDispatcher` compiles them into a lookup
+    #: table, unless :meth:`check_link_element` is overridden.
+    rules = None
+    #: The (lowercase) link types that a discoverer without :attr:`rules`
+    #: (or with its own :meth:`check_link_element`) is interested in. If
+    #: it's not set, the discoverer is asked about every link.
+    link_types = None
 
     @classmethod
-    def _parse_base(cls, doc, nsmap):
+    def _parse_base(cls, doc, nsmap, url=None):
         '''Parses the HTML for a ``<base/>`` element, which is then applied
         to any link found.
 
         :param doc: The HTML document.
         :type doc: :class:`lxml.etree._ElementTree`
-        :param dict nsmap: The namespace map used with the ``<base/>`` XPath
-                           expression.
+        :param nsmap: Unused (see :class:`ParseContext`).
+        :type nsmap: :class:`dict` or :const:`None`
+        :param url: The URL that the HTML document was retrieved from.
+        :type url: :class:`str` or :const:`None`
+        :rtype: :class:`ParseContext`
         '''
-        cls.base_element = None
-        xpath = '/html:html/html:head/html:base'
-        bases = doc.xpath(xpath, namespaces=nsmap)
-        if bases:
-            head_element = doc.xpath(xpath[:-10], namespaces=nsmap)[0]
-            cls.head_children = list(head_element)
-            cls.base_element = bases[0]
-            cls.base_idx = cls.head_children.index(cls.base_element)
-            cls.html_base = cls.base_element.attrib['href']
+        return ParseContext(doc, nsmap, url=url)
 
     @classmethod
-    def _get_link_href(cls, doc_url, element):
-        base = doc_url
-        if cls.base_element is not None:
-            link_idx = cls.head_children.index(element)
-            if cls.base_idx < link_idx:
-                base = cls.html_base
-        href = element.attrib['href'].strip()
-        if base:
-            href = urljoin(base, href)
-        return href
+    def _get_link_href(cls, context, element):
+        return context.get_link_href(element)
 
     @classmethod
     def parse(cls, doc, url=None):
         feeds = {}
-        nsmap = doc.getroot().nsmap
-        cls._parse_base(doc, nsmap)
-        for element in doc.xpath(cls.xpath, namespaces=nsmap):
-            if cls.check_link_element(element):
-                href = cls._get_link_href(url, element)
+        context = cls._parse_base(doc, NAMESPACES, url=url)
+        for element in cls.select(doc):
+            if cls.match_link(element):
+                href = cls._get_link_href(context, element)
                 feeds[href] = element.attrib.get('title')
         return feeds
 
     @classmethod
     def check_link_element(cls, element):
-        return True
+        '''Determines whether a ``<link/>`` element (which has all of the
+        :attr:`required_attributes`) is matched by one of the :attr:`rules`.
+        Discoverers without rules match every link.
+
+        :param element: The ``<link/>`` element.
+        :type element: :class:`lxml.etree._Element`
+        :rtype: :class:`bool`
+        '''
+        if cls.rules is None:
+            return True
+        for rule in cls.rules:
+            if rule.match(element):
+                return True
+        return False
+
+    @classmethod
+    def dispatch_rules(cls):
+        '''Returns the rules that the dispatcher can compile into its lookup
+        table, i.e. :attr:`rules`, unless :meth:`check_link_element` has been
+        overridden with other logic.
+
+        :rtype: a sequence of :class:`LinkRule` objects, or :const:`None`
+        '''
+        if cls.check_link_element.__func__ is not \
+           BaseDiscoverer.check_link_element.__func__:
+            return None
+        return cls.rules
+
+    @classmethod
+    def match_link(cls, element):
+        '''Determines whether a ``<link/>`` element from the document head is
+        matched by the discoverer, i.e. whether it would be found by
+        :meth:`parse`.
+
+        :param element: The ``<link/>`` element.
+        :type element: :class:`lxml.etree._Element`
+        :rtype: :class:`bool`
+        '''
+        attrib = element.attrib
+        for name in cls.required_attributes:
+            if name not in attrib:
+                return False
+        return cls.check_link_element(element)
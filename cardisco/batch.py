@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Discovers the metadata URLs of many HTML documents concurrently.
+'''
+
+from Queue import Empty, Full, Queue
+from threading import Event, Thread
+
+#: How long (in seconds) a blocked thread waits before checking whether the
+#: batch has been abandoned.
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+def _put(queue, item, stop):
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=POLL_INTERVAL)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def _get(queue, stop):
+    while not stop.is_set():
+        try:
+            return queue.get(timeout=POLL_INTERVAL)
+        except Empty:
+            pass
+    return _DONE
+
+
+def _request_kwargs(kwargs):
+    # discover() modifies the headers, so every request gets its own copy.
+    request_kwargs = dict(kwargs)
+    if 'headers' in kwargs:
+        request_kwargs['headers'] = dict(kwargs['headers'])
+    return request_kwargs
+
+
+def discover_many(urls, workers=10, http_factory=None, **kwargs):
+    '''Runs :func:`cardisco.discover` on a number of URLs, using a bounded
+    pool of worker threads.
+
+    Each worker creates its own HTTP object (:class:`httplib2.Http` is not
+    thread-safe), and reuses it for every URL that it handles, so that
+    connections to the same host are kept alive. The URLs are consumed
+    lazily, so ``urls`` can be an arbitrarily long iterator.
+
+    If the returned iterator is closed (or garbage collected) before it is
+    exhausted, the remaining URLs are abandoned, and it waits for the
+    workers to finish the requests in flight and exit. No worker is left
+    running once the iterator is exhausted or closed.
+
+    :param urls: The URLs to retrieve the HTML documents from.
+    :type urls: an iterable of :class:`str`
+    :param int workers: The maximum number of concurrent requests.
+    :param http_factory: A callable which returns a new HTTP object. If it's
+                         not set, :class:`httplib2.Http` is used.
+    :param dict \*\*kwargs: Extra arguments to :func:`cardisco.discover`.
+    :returns: An iterator of ``(url, result)`` tuples, in the order in which
+              the URLs are finished. The result is either the dictionary
+              returned by :func:`cardisco.discover`, or the exception that it
+              raised.
+    :rtype: iterator
+    '''
+    from . import discover
+
+    if http_factory is None:
+        import httplib2
+
+        http_factory = httplib2.Http
+    tasks = Queue(workers * 2)
+    results = Queue(workers * 2)
+    stop = Event()
+    feed_error = []
+
+    def feed():
+        try:
+            for url in urls:
+                if not _put(tasks, url, stop):
+                    return
+        except Exception as e:
+            feed_error.append(e)
+        for i in xrange(workers):
+            if not _put(tasks, _DONE, stop):
+                return
+
+    def work():
+        try:
+            http = http_factory()
+        except Exception as e:
+            http = None
+            http_error = e
+        try:
+            while True:
+                url = _get(tasks, stop)
+                if url is _DONE:
+                    break
+                if http is None:
+                    result = http_error
+                else:
+                    try:
+                        result = discover(url, http=http,
+                                          **_request_kwargs(kwargs))
+                    except Exception as e:
+                        result = e
+                if not _put(results, (url, result), stop):
+                    break
+        finally:
+            _put(results, _DONE, stop)
+
+    threads = [Thread(target=feed)]
+    threads += [Thread(target=work) for i in xrange(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        remaining = workers
+        while remaining:
+            item = _get(results, stop)
+            if item is _DONE:
+                remaining -= 1
+            else:
+                yield item
+        if feed_error:
+            raise feed_error[0]
+    finally:
+        stop.set()
+        # The feed thread may be blocked reading ``urls``; it makes no
+        # requests and exits at its next put, so only the workers are joined.
+        for thread in threads[1:]:
+            thread.join()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Caches discovery results, so that unchanged documents don't have to be
+downloaded and parsed again.
+
+The cache stores the result of :func:`cardisco.discover` together with the
+``ETag`` and ``Last-Modified`` validators of the response. On the next call
+for the same URL, a conditional request is made, and if the server replies
+with ``304 Not Modified``, the cached result is returned.
+'''
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+from .results import DiscoveryResult
+
+
+def _result_size(url, result):
+    '''Roughly estimates the memory used by a discovery result, in bytes.'''
+    size = len(url)
+    for name, links in result.iteritems():
+        size += len(name)
+        for href, title in links.iteritems():
+            size += len(href) + len(title or '')
+    return size
+
+
+def copy_result(result):
+    '''Copies a discovery result, so that the caller can't modify the cached
+    version. Compact results are read-only, so they aren't copied.
+
+    :param result: The discovery result.
+    :type result: :class:`dict` or
+                  :class:`~cardisco.results.DiscoveryResult`
+    :rtype: :class:`dict` or :class:`~cardisco.results.DiscoveryResult`
+    '''
+    if isinstance(result, DiscoveryResult):
+        return result
+    return dict((name, dict(links)) for name, links in result.iteritems())
+
+
+class CacheEntry(object):
+    '''A cached discovery result.
+
+    :param dict result: The discovery result.
+    :param etag: The ``ETag`` header of the response.
+    :type etag: :class:`str` or :const:`None`
+    :param last_modified: The ``Last-Modified`` header of the response.
+    :type last_modified: :class:`str` or :const:`None`
+    :param float stored: When the entry was stored (a UNIX timestamp).
+    '''
+
+    def __init__(self, result, etag=None, last_modified=None, stored=None,
+                 size=0):
+        self.result = result
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored = time() if stored is None else stored
+        self.size = size
+
+    def conditional_headers(self):
+        '''Returns the request headers needed to revalidate the entry.
+
+        :rtype: :class:`dict`
+        '''
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class DiscoveryCache(object):
+    '''An in-memory, thread-safe LRU cache of discovery results.
+
+    :param int max_entries: The maximum number of cached URLs.
+    :param max_size: The maximum (estimated) size of the cached results, in
+                     bytes.
+    :type max_size: :class:`int` or :const:`None`
+    :param ttl: The number of seconds after which an entry is discarded.
+    :type ttl: :class:`int`, :class:`float` or :const:`None`
+    :param bool store_unvalidated: Whether :func:`cardisco.discover` should
+                                   also store results without an ``ETag`` or
+                                   ``Last-Modified`` validator.
+    '''
+
+    def __init__(self, max_entries=10000, max_size=None, ttl=None,
+                 store_unvalidated=False):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.ttl = ttl
+        self.store_unvalidated = store_unvalidated
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, url):
+        entry = self._entries.pop(url)
+        self.size -= entry.size
+
+    def get(self, url):
+        '''Retrieves the entry for a URL, and marks it as recently used.
+
+        :param str url: The URL.
+        :rtype: :class:`CacheEntry` or :const:`None`
+        '''
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            self._remove(url)
+            if self.ttl is not None and entry.stored + self.ttl < time():
+                return None
+            self._entries[url] = entry
+            self.size += entry.size
+            return entry
+
+    def set(self, url, result, etag=None, last_modified=None):
+        '''Stores the discovery result for a URL, evicting the least recently
+        used entries if the cache is full.
+
+        :param str url: The URL.
+        :param dict result: The discovery result.
+        :param etag: The ``ETag`` header of the response.
+        :type etag: :class:`str` or :const:`None`
+        :param last_modified: The ``Last-Modified`` header of the response.
+        :type last_modified: :class:`str` or :const:`None`
+        '''
+        entry = CacheEntry(copy_result(result), etag, last_modified,
+                           size=_result_size(url, result))
+        with self._lock:
+            if url in self._entries:
+                self._remove(url)
+            self._entries[url] = entry
+            self.size += entry.size
+            while len(self._entries) > self.max_entries or \
+                    (self.max_size is not None and self.size > self.max_size):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, url):
+        '''Removes the entry for a URL, if there is one.
+
+        :param str url: The URL.
+        '''
+        with self._lock:
+            if url in self._entries:
+                self._remove(url)
+
+    def clear(self):
+        '''Removes every entry.'''
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+The ``cardisco`` command, which runs discovery over a list of URLs and/or
+local HTML files::
+
+    cardisco [-w WORKERS] [--threads] [-o OUTPUT [--resume]] [INPUT]
+
+``INPUT`` (standard input by default) has one URL or file path per line.
+Blank lines, and lines starting with ``#``, are skipped. One JSON object is
+written per input, as soon as it is finished, with the (zero-based) position
+of the input in ``index``::
+
+    {"index": 1, "input": "http://example.com/", "result": {...}}
+    {"error": "error: [Errno 111] Connection refused", "index": 0, ...}
+
+The inputs are handed to a pool of worker processes (or threads), and only a
+bounded number of them are in flight at a time, so memory usage doesn't grow
+with the size of the input. Since the output is in completion order, a slow
+input doesn't hold up the others. An interrupted run can be resumed with
+``--resume``, which skips the inputs whose index is in a (complete) line of
+the output file.
+'''
+
+from argparse import ArgumentParser
+import json
+import multiprocessing
+import os
+from Queue import Queue
+import re
+import sys
+from threading import Thread
+from urllib import pathname2url
+
+from .backends import BACKENDS
+
+_URL_RE = re.compile(r'^https?://', re.I)
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def _error_message(error):
+    '''Formats an exception for the ``error`` field of the output, whatever
+    its message is made of.
+
+    :param error: The exception.
+    :type error: :class:`BaseException`
+    :rtype: :class:`unicode`
+    '''
+    try:
+        message = unicode(error)
+    except UnicodeError:
+        try:
+            message = str(error).decode('utf-8', 'replace')
+        except UnicodeError:
+            message = _text(repr(error.args))
+    return u'%s: %s' % (type(error).__name__, message)
+
+
+def _error_line(idx, item, error):
+    return json.dumps({
+        'index': idx,
+        'input': _text(item),
+        'error': _error_message(error),
+    }, sort_keys=True)
+
+
+class _Worker(object):
+    '''Runs discovery on one input at a time.'''
+
+    def __init__(self, options):
+        import httplib2
+        from . import _get_dispatcher
+
+        self.options = options
+        self.http = httplib2.Http(timeout=options['timeout'])
+        _get_dispatcher()
+
+    def discover(self, item):
+        from . import discover, parse_html
+
+        if _URL_RE.match(item):
+            return discover(item, http=self.http,
+                            backend=self.options['backend'],
+                            prefilter=self.options['prefilter'])
+        path = os.path.abspath(item)
+        with open(path, 'rb') as f:
+            data = f.read()
+        return parse_html(data, url='file://%s' % pathname2url(path),
+                          backend=self.options['backend'],
+                          prefilter=self.options['prefilter'])
+
+    def __call__(self, idx, item):
+        try:
+            return json.dumps({
+                'index': idx,
+                'input': _text(item),
+                'result': self.discover(item),
+            }, sort_keys=True)
+        except Exception as e:
+            return _error_line(idx, item, e)
+
+
+def _work(tasks, results, options):
+    try:
+        worker = _Worker(options)
+    except Exception as e:
+        # answer every input, so that run() doesn't wait forever
+        error = e
+        worker = lambda idx, item: _error_line(idx, item, error)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        idx, item = task
+        line = None
+        try:
+            line = worker(idx, item)
+        finally:
+            if line is None:
+                line = _error_line(idx, item, RuntimeError('worker stopped'))
+            results.put(line)
+
+
+def read_inputs(lines):
+    '''Returns the inputs in a list of lines.
+
+    :param lines: The lines.
+    :type lines: an iterable of :class:`str`
+    :rtype: a generator of :class:`str`
+    '''
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def completed_inputs(path):
+    '''Finds the inputs which have a complete line in an output file, and
+    truncates any incomplete last line (left behind by an interrupted run).
+
+    Lines without an ``index`` (written in input order by older versions)
+    are taken to be for the input at their own position.
+
+    :param str path: The output file.
+    :returns: The indexes of the inputs already processed.
+    :rtype: :class:`set` of :class:`int`
+    '''
+    done = set()
+    if not os.path.exists(path):
+        return done
+    end = 0
+    with open(path, 'rb') as f:
+        for position, line in enumerate(f):
+            if not line.endswith('\n'):
+                break
+            end += len(line)
+            try:
+                done.add(json.loads(line).get('index', position))
+            except (AttributeError, ValueError):
+                pass
+    with open(path, 'r+b') as f:
+        f.truncate(end)
+    return done
+
+
+def run(inputs, output, workers=None, threads=False, window=None,
+        done=(), **options):
+    '''Runs discovery over the inputs, and writes a JSON line per input, in
+    completion order.
+
+    :param inputs: The URLs and file paths.
+    :type inputs: an iterable of :class:`str`
+    :param output: The file that the results are written to.
+    :type output: a file-like object
+    :param workers: The number of worker processes (or threads). Defaults to
+                    the number of CPUs.
+    :type workers: :class:`int` or :const:`None`
+    :param bool threads: Whether to use threads instead of processes.
+    :param window: The maximum number of inputs in flight (i.e. read, but
+                   not yet written). Defaults to ``4 * workers``.
+    :type window: :class:`int` or :const:`None`
+    :param done: The indexes of the inputs to skip (see
+                 :func:`completed_inputs`).
+    :type done: a collection of :class:`int`
+    :param dict \*\*options: ``backend``, ``prefilter`` and ``timeout``.
+    :returns: The number of inputs processed.
+    :rtype: :class:`int`
+    '''
+    options.setdefault('backend', 'html5lib')
+    options.setdefault('prefilter', False)
+    options.setdefault('timeout', 30)
+    workers = workers or multiprocessing.cpu_count()
+    window = window or 4 * workers
+    if threads:
+        tasks, results = Queue(window), Queue(window)
+        pool = [Thread(target=_work, args=(tasks, results, options))
+                for i in xrange(workers)]
+        for thread in pool:
+            thread.daemon = True
+    else:
+        tasks = multiprocessing.Queue(window)
+        results = multiprocessing.Queue(window)
+        pool = [multiprocessing.Process(target=_work,
+                                        args=(tasks, results, options))
+                for i in xrange(workers)]
+    for worker in pool:
+        worker.start()
+    inputs = enumerate(inputs)
+    sent = written = 0
+    exhausted = False
+    try:
+        while not exhausted or written < sent:
+            if not exhausted and sent - written < window:
+                try:
+                    task = inputs.next()
+                except StopIteration:
+                    exhausted = True
+                else:
+                    if task[0] not in done:
+                        tasks.put(task)
+                        sent += 1
+                continue
+            output.write(results.get())
+            output.write('\n')
+            written += 1
+        for worker in pool:
+            tasks.put(None)
+        for worker in pool:
+            worker.join()
+    finally:
+        output.flush()
+        if not threads:
+            for worker in pool:
+                if worker.is_alive():
+                    worker.terminate()
+    return written
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='cardisco',
+                            description='Discovers the feeds (and other '
+                                        'metadata) linked from web pages.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='a file with one URL or HTML file path per line '
+                             '(default: standard input)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='the file to write the JSON lines to (default: '
+                             'standard output)')
+    parser.add_argument('--resume', action='store_true',
+                        help='skip the inputs which already have results in '
+                             'the output file, and append to it')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='the number of workers (default: the number of '
+                             'CPUs)')
+    parser.add_argument('--threads', action='store_true',
+                        help='use worker threads instead of processes')
+    parser.add_argument('--window', type=int,
+                        help='the maximum number of inputs in flight '
+                             '(default: 4 times the number of workers)')
+    parser.add_argument('--backend', choices=BACKENDS, default='html5lib',
+                        help='the parser backend (default: html5lib)')
+    parser.add_argument('--prefilter', action='store_true',
+                        help="don't parse documents which can't contain "
+                             "any matching links")
+    parser.add_argument('--timeout', type=float, default=30,
+                        help='the socket timeout, in seconds (default: 30)')
+    args = parser.parse_args(argv)
+    if args.resume and args.output == '-':
+        parser.error('--resume needs an output file')
+
+    if args.input == '-':
+        inputs = read_inputs(sys.stdin)
+    else:
+        inputs = read_inputs(open(args.input))
+    done = set()
+    if args.resume:
+        done = completed_inputs(args.output)
+        output = open(args.output, 'ab')
+    elif args.output == '-':
+        output = sys.stdout
+    else:
+        output = open(args.output, 'wb')
+    try:
+        run(inputs, output, workers=args.workers, threads=args.threads,
+            window=args.window, done=done, backend=args.backend,
+            prefilter=args.prefilter, timeout=args.timeout)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
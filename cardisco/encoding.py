@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Works out the character encoding of a document before it is parsed, so that
+it is decoded exactly once, by Python's (C) codecs.
+
+When it's given bytes, html5lib sniffs the encoding itself, in pure Python,
+and it may guess wrong (or find a ``<meta/>`` declaration late) and start
+over. Instead, :func:`cardisco.parse_html` decodes the document itself when
+the encoding is known from, in order of precedence:
+
+1. a byte order mark;
+2. the transport, e.g. the ``charset`` of the HTTP ``Content-Type``
+   header;
+3. a ``<meta charset>`` (or ``<meta http-equiv="Content-Type">``)
+   declaration in the first :data:`PRESCAN_LENGTH` bytes (see
+   :func:`prescan`).
+
+That is the order defined by the HTML specification. If none of them give a
+(known) encoding, the bytes are passed on to the parser, which falls back to
+its own guesses, as before.
+
+Encoding labels are resolved with the label table of the Encoding Standard
+(see :func:`lookup_encoding`), e.g. ``iso-8859-1`` means ``windows-1252``,
+and labels which aren't in it (such as ``hex`` or ``utf-7``) are ignored.
+
+Specification:
+
+* https://html.spec.whatwg.org/multipage/parsing.html#determining-the-character-encoding
+* https://encoding.spec.whatwg.org/#names-and-labels
+'''
+
+import codecs
+import re
+
+import webencodings
+
+#: The number of bytes that :func:`prescan` looks at.
+PRESCAN_LENGTH = 1024
+
+# the codecs which browsers replace with a superset
+_ALIASES = {
+    'shift_jis': 'cp932',
+    'euc_kr': 'cp949',
+    'big5': 'big5hkscs',
+}
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+)
+
+_CHARSET_RE = re.compile(r'''charset\s*=\s*["']?([^"';\s]+)''', re.I)
+_META_RE = re.compile(r'<!--.*?-->|<meta[\s/]([^>]*)', re.I | re.S)
+_ATTRIBUTE_RE = re.compile(
+    r'''([^\s/>"'=]+)\s*(?:=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]*)))?''')
+
+
+def lookup_encoding(label):
+    '''Returns the (Python) name of the encoding that browsers use for an
+    encoding label.
+
+    :param label: The label.
+    :type label: :class:`str` or :const:`None`
+    :returns: The codec name, or :const:`None` if the label isn't in the
+              Encoding Standard (or Python has no codec for it).
+    :rtype: :class:`str` or :const:`None`
+    '''
+    if not label:
+        return None
+    try:
+        encoding = webencodings.lookup(label.strip().strip('"\''))
+    except UnicodeError:
+        return None
+    if encoding is None:
+        return None
+    name = _ALIASES.get(encoding.codec_info.name, encoding.codec_info.name)
+    try:
+        # e.g. x-user-defined, which is only registered by webencodings
+        codecs.lookup(name)
+    except LookupError:
+        return None
+    return str(name)
+
+
+def charset_label(content_type):
+    '''Returns the (unresolved) ``charset`` parameter of a ``Content-Type``
+    header.
+
+    :param content_type: The header value.
+    :type content_type: :class:`str` or :const:`None`
+    :rtype: :class:`str` or :const:`None`
+    '''
+    match = _CHARSET_RE.search(content_type or '')
+    if match is None:
+        return None
+    return match.group(1)
+
+
+def charset_from_content_type(content_type):
+    '''Returns the encoding declared by a ``Content-Type`` header.
+
+    :param content_type: The header value.
+    :type content_type: :class:`str` or :const:`None`
+    :returns: The codec name (see :func:`lookup_encoding`), or :const:`None`
+              if the header doesn't declare a known encoding.
+    :rtype: :class:`str` or :const:`None`
+    '''
+    return lookup_encoding(charset_label(content_type))
+
+
+def _meta_charset(attributes):
+    charset = http_equiv = content = None
+    for match in _ATTRIBUTE_RE.finditer(attributes):
+        name = match.group(1).lower()
+        value = match.group(2)
+        if value is None:
+            value = match.group(3)
+        if value is None:
+            value = match.group(4) or ''
+        if name == 'charset' and charset is None:
+            charset = value
+        elif name == 'http-equiv' and http_equiv is None:
+            http_equiv = value
+        elif name == 'content' and content is None:
+            content = value
+    if charset is not None:
+        return lookup_encoding(charset)
+    if http_equiv is not None and http_equiv.strip().lower() == \
+       'content-type' and content is not None:
+        return charset_from_content_type(content)
+    return None
+
+
+def prescan(data, length=PRESCAN_LENGTH):
+    '''Looks for an encoding declaration in the ``<meta/>`` elements at the
+    start of a document (skipping comments).
+
+    :param str data: The document.
+    :param int length: The number of bytes to look at.
+    :returns: The codec name (see :func:`lookup_encoding`), or :const:`None`
+              if no (known) encoding is declared.
+    :rtype: :class:`str` or :const:`None`
+    '''
+    for match in _META_RE.finditer(data, 0, length):
+        attributes = match.group(1)
+        if attributes is None:
+            continue
+        encoding = _meta_charset(attributes)
+        if encoding is not None:
+            if encoding.startswith('utf-16'):
+                # the document couldn't have been read if it were
+                return 'utf-8'
+            return encoding
+    return None
+
+
+def detect_encoding(data, transport_encoding=None):
+    '''Determines the encoding of a document, without guessing.
+
+    :param str data: The document.
+    :param transport_encoding: The encoding label given by the transport
+                               layer (e.g. the HTTP ``charset``).
+    :type transport_encoding: :class:`str` or :const:`None`
+    :returns: An ``(encoding, offset)`` tuple, where ``offset`` is the length
+              of the byte order mark, if there is one. ``encoding`` is
+              :const:`None` if it couldn't be determined.
+    :rtype: :class:`tuple`
+    '''
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding, len(bom)
+    encoding = lookup_encoding(transport_encoding)
+    if encoding is None:
+        encoding = prescan(data)
+    return encoding, 0
+
+
+def decode_document(data, transport_encoding=None):
+    '''Decodes a document, if its encoding can be determined (see
+    :func:`detect_encoding`).
+
+    :param data: The document.
+    :type data: :class:`str` or :class:`unicode`
+    :param transport_encoding: See :func:`detect_encoding`.
+    :type transport_encoding: :class:`str` or :const:`None`
+    :returns: The decoded document, or the document itself if it's already
+              decoded, or if its encoding couldn't be determined.
+    :rtype: :class:`unicode` or :class:`str`
+    '''
+    if isinstance(data, unicode):
+        return data
+    encoding, offset = detect_encoding(data, transport_encoding)
+    if encoding is None:
+        return data
+    if offset:
+        data = data[offset:]
+    return data.decode(encoding, 'replace')
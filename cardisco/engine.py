@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Single-pass discovery over a parsed HTML document.
+
+Instead of letting every :class:`~cardisco.base.BaseDiscoverer` run its own
+XPath query (and its own ``<base/>`` lookup) over the document, the
+:class:`LinkDispatcher` walks the ``<link/>`` elements in the head once.
+
+The discoverers' :class:`~cardisco.base.LinkRule` objects are compiled into
+hash tables keyed by ``(type, rel)``, so finding the discoverers which match
+a link takes a few dictionary lookups (one per ``rel`` token), however many
+discoverers there are. Discoverers with their own
+:meth:`~cardisco.base.BaseDiscoverer.check_link_element` are looked up by
+their (normalized) :attr:`~cardisco.base.BaseDiscoverer.link_types`, and
+then asked whether they match the link. If they don't declare any link
+types, they are asked about every link, just like their
+:meth:`~cardisco.base.BaseDiscoverer.parse` method would.
+
+Discoverers which override :attr:`~cardisco.base.BaseDiscoverer.xpath` to
+narrow down (or widen) the elements that they look at are run with their
+own (precompiled) XPath expression instead, so that they find the same links
+as their :meth:`~cardisco.base.BaseDiscoverer.parse` method.
+'''
+
+from collections import OrderedDict
+import re
+
+from .base import BaseDiscoverer, LazyXPath, ParseContext, rel_tokens
+from .memo import HeadLinks
+from .results import DiscoveryResult, intern_value, ResultBuilder
+from .stats import clock, discoverer_stage, DISPATCH, LINKS_EXAMINED, \
+    LINKS_MATCHED
+
+LINK_XPATH = BaseDiscoverer.xpath
+_LINK_XPATH = LazyXPath(LINK_XPATH)
+# XPath expressions which only select <link/> elements in the head
+_HEAD_LINK_XPATH_RE = re.compile(
+    r'^/html:html/html:head/html:link(?:\[[^\[\]|]*\])*$')
+
+
+def _add(table, key, entry):
+    entries = table.setdefault(key, [])
+    if entry not in entries:
+        entries.append(entry)
+
+
+class LinkDispatcher(object):
+    '''Dispatches ``<link/>`` elements to discoverers.
+
+    :param dict discoverers: A dictionary, where the key is the name (MIME
+                             type) that the discoverer's results are stored
+                             under, and the value is the discoverer class.
+    '''
+
+    def __init__(self, discoverers):
+        self.discoverers = dict(discoverers)
+        #: The (interned) discoverer names, shared by every compact result.
+        self.names = frozenset(intern_value(name) for name in self.discoverers)
+        #: The compact result of documents without any matching links.
+        self.empty = DiscoveryResult(self.names)
+        #: The discoverers without rules, by link type.
+        self.table = {}
+        #: The ``(name, discoverer)`` tuples of the discoverers without
+        #: rules or link types, which are asked about every link.
+        self.catch_all = []
+        #: The discoverers with exact rules, by ``(type, rel)``, where
+        #: ``rel`` is :const:`None` for rules without ``rel`` values. The
+        #: values are ``(name, discoverer, attributes)`` tuples, where
+        #: ``attributes`` are the required attributes that the rule doesn't
+        #: already check for.
+        self.exact_table = {}
+        #: The discoverers with other rules, by ``(type, rel token)``, where
+        #: either can be :const:`None` if the rule doesn't have any.
+        self.token_table = {}
+        #: The ``(name, discoverer)`` tuples of the discoverers with their
+        #: own :attr:`~cardisco.base.BaseDiscoverer.xpath`.
+        self.selectors = []
+        #: Whether some rule matches links of any type.
+        self.any_type = False
+        #: Whether the discoverers only look at the ``<link/>`` elements in
+        #: the document head (which the pre-filter and the head memo rely
+        #: on).
+        self.head_only = True
+        types = set()
+        for name, discoverer in sorted(self.discoverers.iteritems()):
+            entry = (name, discoverer)
+            if discoverer.xpath != LINK_XPATH:
+                self.selectors.append(entry)
+                self.any_type = True
+                if not _HEAD_LINK_XPATH_RE.match(discoverer.xpath):
+                    self.head_only = False
+                continue
+            rules = discoverer.dispatch_rules()
+            if rules is None:
+                if discoverer.link_types is None:
+                    self.catch_all.append(entry)
+                    self.any_type = True
+                for ltype in discoverer.link_types or ():
+                    _add(self.table, ltype, entry)
+                    types.add(ltype)
+                continue
+            for rule in rules:
+                table = self.exact_table if rule.exact else self.token_table
+                if rule.types is None:
+                    self.any_type = True
+                checked = set(['href'])
+                if rule.types is not None:
+                    checked.add('type')
+                if rule.rels is not None:
+                    checked.add('rel')
+                attributes = tuple(name for name in
+                                   discoverer.required_attributes
+                                   if name not in checked)
+                for ltype in rule.types or (None,):
+                    for rel in rule.rels or (None,):
+                        _add(table, (ltype, rel), entry + (attributes,))
+                    if ltype is not None:
+                        types.add(ltype.lower())
+        #: The (lowercase) link types which can be matched, or :const:`None`
+        #: if links of any type can be matched.
+        self.link_types = None if self.any_type else frozenset(types)
+
+    def match(self, element):
+        '''Finds the discoverers which match a ``<link/>`` element (except for
+        the :attr:`selectors`).
+
+        :param element: The ``<link/>`` element.
+        :type element: :class:`lxml.etree._Element`
+        :returns: ``(name, discoverer)`` tuples.
+        :rtype: :class:`list`
+        '''
+        found, normalized = self._match_rules(element)
+        for name, discoverer in self._custom(normalized):
+            if discoverer.match_link(element):
+                found.append((name, discoverer))
+        return found
+
+    def _custom(self, normalized):
+        '''Returns the discoverers without rules which have to be asked about
+        a link with the given (normalized) link type.
+        '''
+        if normalized is not None and normalized in self.table:
+            return self.table[normalized] + self.catch_all
+        return self.catch_all
+
+    def _match_rules(self, element):
+        '''Finds the discoverers whose rules match a ``<link/>`` element, and
+        returns them with the normalized link type.
+        '''
+        attrib = element.attrib
+        ltype = attrib.get('type')
+        rel = attrib.get('rel')
+        found = []
+        if ltype is not None and self.exact_table:
+            found.extend(self.exact_table.get((ltype, None), ()))
+            if rel is not None:
+                found.extend(self.exact_table.get((ltype, rel), ()))
+        normalized = None if ltype is None else ltype.lower().strip()
+        if self.token_table:
+            if self.any_type and normalized is not None:
+                types = (normalized, None)
+            else:
+                types = (normalized,)
+            tokens = [None]
+            if rel is not None:
+                tokens.extend(set(rel_tokens(rel)))
+            get = self.token_table.get
+            for key_type in types:
+                for token in tokens:
+                    found.extend(get((key_type, token), ()))
+        if found:
+            matched = []
+            for name, discoverer, attributes in found:
+                for attribute in attributes:
+                    if attribute not in attrib:
+                        break
+                else:
+                    if (name, discoverer) not in matched:
+                        matched.append((name, discoverer))
+            found = matched
+        return found, normalized
+
+    def links(self, doc):
+        '''Finds the discoverers which match each ``<link/>`` element in the
+        head of a parsed HTML document, followed by the other elements that
+        the :attr:`selectors` select.
+
+        :param doc: The HTML document.
+        :type doc: :class:`lxml.etree._ElementTree`
+        :returns: ``(position, element, matches)`` tuples, where
+                  ``position`` is :const:`None` for elements which aren't
+                  ``<link/>`` elements in the head, and ``matches`` are
+                  ``(name, discoverer)`` tuples.
+        :rtype: :class:`list`
+        '''
+        if not self.selectors:
+            return [(position, element, self.match(element))
+                    for position, element in enumerate(_LINK_XPATH(doc))]
+        selected = OrderedDict()
+        for name, discoverer in self.selectors:
+            for element in discoverer.select(doc):
+                if discoverer.match_link(element):
+                    selected.setdefault(element, []).append((name,
+                                                             discoverer))
+        links = []
+        for position, element in enumerate(_LINK_XPATH(doc)):
+            matches = self.match(element)
+            others = selected.pop(element, None)
+            if others:
+                matches.extend(others)
+            links.append((position, element, matches))
+        for element, matches in selected.iteritems():
+            links.append((None, element, matches))
+        return links
+
+    def extract(self, doc):
+        '''Finds the links in a parsed HTML document, without resolving them
+        against the document URL (see :mod:`cardisco.memo`).
+
+        :param doc: The HTML document.
+        :type doc: :class:`lxml.etree._ElementTree`
+        :rtype: :class:`cardisco.memo.HeadLinks`
+        '''
+        context = ParseContext(doc)
+        links = []
+        for position, element, matches in self.links(doc):
+            if not matches:
+                continue
+            attrib = element.attrib
+            href = attrib['href'].strip()
+            title = attrib.get('title')
+            rel = attrib.get('rel')
+            follows_base = context.follows_base(element)
+            for name, discoverer in matches:
+                links.append((name, href, title, rel, position, follows_base))
+        return HeadLinks(context.html_base, links)
+
+    def parse(self, doc, url=None, hooks=None, compact=False):
+        '''Discovers the metadata URLs in a parsed HTML document.
+
+        :param doc: The HTML document.
+        :type doc: :class:`lxml.etree._ElementTree`
+        :param url: The URL that the HTML document was retrieved from.
+        :type url: :class:`str` or :const:`None`
+        :param hooks: The object that the time spent in each discoverer, and
+                      the link counters, are reported to.
+        :type hooks: :class:`cardisco.stats.Hooks` or :const:`None`
+        :param bool compact: Whether to return a
+                             :class:`~cardisco.results.DiscoveryResult`
+                             instead of a dictionary.
+        :returns: A dictionary, where the key is the discoverer name and the
+                  value is a dictionary of URL-title pairs.
+        :rtype: :class:`dict` or :class:`~cardisco.results.DiscoveryResult`
+        '''
+        if compact:
+            return self._parse_compact(doc, url, hooks)
+        if hooks is not None:
+            return self._parse_instrumented(doc, url, hooks)
+        results = dict((name, {}) for name in self.discoverers)
+        context = ParseContext(doc, url=url)
+        for position, element, matches in self.links(doc):
+            for name, discoverer in matches:
+                href = context.get_link_href(element)
+                results[name][href] = element.attrib.get('title')
+        return results
+
+    def _parse_compact(self, doc, url, hooks):
+        builder = ResultBuilder(self.names, self.empty)
+        context = ParseContext(doc, url=url)
+        examined = matched = 0
+        for position, element, matches in self.links(doc):
+            for name, discoverer in matches:
+                attrib = element.attrib
+                builder.add(name, context.get_link_href(element),
+                            attrib.get('title'), attrib.get('rel'), position)
+                matched += 1
+            examined += 1
+        if hooks is not None:
+            # only the counters; the links aren't timed per discoverer
+            hooks.count(LINKS_EXAMINED, examined)
+            hooks.count(LINKS_MATCHED, matched)
+        return builder.result()
+
+    def _parse_instrumented(self, doc, url, hooks):
+        # The rule table lookups are shared by every discoverer, so they are
+        # timed as one stage. The code of each discoverer (its own XPath
+        # expression or check_link_element(), and the resolution of its
+        # links) is timed separately.
+        results = dict((name, {}) for name in self.discoverers)
+        timings = dict((name, [0.0, 0]) for name in self.discoverers)
+        dispatch = 0.0
+        examined = matched = 0
+        context = ParseContext(doc, url=url)
+        selected = OrderedDict()
+        for name, discoverer in self.selectors:
+            start = clock()
+            for element in discoverer.select(doc):
+                if discoverer.match_link(element):
+                    selected.setdefault(element, []).append((name,
+                                                             discoverer))
+            timings[name][0] += clock() - start
+        elements = _LINK_XPATH(doc)
+        for element in elements:
+            start = clock()
+            matches, normalized = self._match_rules(element)
+            dispatch += clock() - start
+            for name, discoverer in self._custom(normalized):
+                start = clock()
+                if discoverer.match_link(element):
+                    matches.append((name, discoverer))
+                timings[name][0] += clock() - start
+            matches.extend(selected.pop(element, ()))
+            selected[element] = matches
+        for element, matches in selected.iteritems():
+            examined += 1
+            for name, discoverer in matches:
+                start = clock()
+                href = context.get_link_href(element)
+                results[name][href] = element.attrib.get('title')
+                matched += 1
+                timing = timings[name]
+                timing[0] += clock() - start
+                timing[1] += 1
+        hooks.stage(DISPATCH, dispatch, len(elements))
+        for name, (seconds, links) in timings.iteritems():
+            hooks.stage(discoverer_stage(name), seconds, links)
+        hooks.count(LINKS_EXAMINED, examined)
+        hooks.count(LINKS_MATCHED, matched)
+        return results
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Parses many stored HTML documents in parallel, using a pool of worker
+processes (since html5lib is pure Python, threads don't help).
+
+Documents are sent to the workers in chunks, to amortize the cost of
+pickling them, and only a bounded number of chunks are in flight at a time,
+so arbitrarily long streams of documents can be processed. Each worker loads
+the discoverer registry once, when it starts.
+
+Results are returned in a compact form: a tuple of ``(name, href, title)``
+tuples (see :func:`expand` for turning that back into the usual
+dictionary).
+
+A document which can't be parsed gets the exception instead, or a
+:exc:`WorkerError` if the exception can't be sent back from the worker (or
+if the whole chunk failed, e.g. because it couldn't be pickled). A worker
+process which dies still blocks the pool, as :mod:`multiprocessing` doesn't
+notice it in Python 2.
+'''
+
+from collections import deque
+import cPickle
+from multiprocessing import cpu_count, Pool
+from Queue import Empty, Queue
+
+#: How often (in seconds) :meth:`ParseExecutor.map` checks for failed chunks
+#: when it isn't returning the results in order.
+POLL_INTERVAL = 0.1
+
+_OPTIONS = {}
+
+
+class WorkerError(Exception):
+    '''Stands in for an exception which was raised in a worker process, but
+    couldn't be sent back (or for the failure of a whole chunk). Its message
+    is the ``repr()`` of the original exception.
+    '''
+
+
+def _init_worker(options):
+    from . import _get_dispatcher
+
+    _OPTIONS.update(options)
+    _get_dispatcher()
+
+
+def compact(result):
+    '''Converts a discovery result into its compact form.
+
+    :param dict result: The result of :func:`cardisco.parse_html`.
+    :returns: A tuple of ``(name, href, title)`` tuples, sorted by name.
+    :rtype: :class:`tuple`
+    '''
+    return tuple((name, href, title)
+                 for name, links in sorted(result.iteritems())
+                 for href, title in links.iteritems())
+
+
+def expand(links):
+    '''Converts the compact form of a discovery result back into a
+    dictionary.
+
+    :param tuple links: The compact result.
+    :returns: A dictionary, where the key is the URL's MIME type and the value
+              is a dictionary of URL-title pairs.
+    :rtype: :class:`dict`
+    '''
+    from . import _empty_result
+
+    result = _empty_result()
+    for name, href, title in links:
+        result.setdefault(name, {})[href] = title
+    return result
+
+
+def _picklable_error(error):
+    try:
+        cPickle.loads(cPickle.dumps(error, cPickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return WorkerError(repr(error))
+    return error
+
+
+def _parse_chunk(chunk):
+    from . import parse_html
+
+    results = []
+    for idx, data, url in chunk:
+        try:
+            result = compact(parse_html(data, url=url, **_OPTIONS))
+        except Exception as e:
+            result = _picklable_error(e)
+        results.append((idx, url, result))
+    return results
+
+
+def _failed_chunk(chunk, error):
+    error = WorkerError(repr(error))
+    return [(idx, url, error) for idx, data, url in chunk]
+
+
+def _chunks(documents, chunksize):
+    chunk = []
+    for idx, document in enumerate(documents):
+        if isinstance(document, tuple):
+            data, url = document
+        else:
+            data, url = document, None
+        chunk.append((idx, data, url))
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ParseExecutor(object):
+    '''A pool of worker processes which run :func:`cardisco.parse_html`.
+    Use as a context manager, or call :meth:`close` when done.
+
+    :param processes: The number of worker processes. Defaults to the number
+                      of CPUs.
+    :type processes: :class:`int` or :const:`None`
+    :param int chunksize: The number of documents sent to a worker at once.
+    :param max_pending: The maximum number of chunks in flight. Defaults to
+                        twice the number of processes.
+    :type max_pending: :class:`int` or :const:`None`
+    :param dict \*\*options: Extra arguments to :func:`cardisco.parse_html`
+                            (``backend``, ``head_only`` and ``prefilter``).
+    '''
+
+    def __init__(self, processes=None, chunksize=16, max_pending=None,
+                 **options):
+        self.processes = processes or cpu_count()
+        self.chunksize = chunksize
+        self.max_pending = max_pending or 2 * self.processes
+        self.pool = Pool(self.processes, initializer=_init_worker,
+                         initargs=(options,))
+
+    def map(self, documents, ordered=True):
+        '''Parses documents.
+
+        :param documents: The documents, as :class:`str` objects, or as
+                          ``(document, url)`` tuples.
+        :type documents: an iterable
+        :param bool ordered: Whether to return the results in the same order
+                             as the documents, rather than as soon as they
+                             are ready.
+        :returns: ``(index, url, links)`` tuples, where ``index`` is the
+                  position of the document in ``documents``, and ``links``
+                  is the compact result (see :func:`compact`), or the
+                  exception raised while parsing the document.
+        :rtype: a generator of :class:`tuple` objects
+        '''
+        if ordered:
+            return self._map_ordered(documents)
+        return self._map_unordered(documents)
+
+    def _map_ordered(self, documents):
+        pending = deque()
+        for chunk in _chunks(documents, self.chunksize):
+            pending.append((chunk, self.pool.apply_async(_parse_chunk,
+                                                         (chunk,))))
+            if len(pending) >= self.max_pending:
+                for result in self._chunk_results(*pending.popleft()):
+                    yield result
+        while pending:
+            for result in self._chunk_results(*pending.popleft()):
+                yield result
+
+    def _chunk_results(self, chunk, async_result):
+        try:
+            return async_result.get()
+        except Exception as e:
+            return _failed_chunk(chunk, e)
+
+    def _map_unordered(self, documents):
+        # The callback is only called for chunks which succeed, so the
+        # others are looked for every POLL_INTERVAL seconds.
+        done = Queue()
+        pending = {}
+        for key, chunk in enumerate(_chunks(documents, self.chunksize)):
+            pending[key] = (chunk, self.pool.apply_async(
+                _parse_chunk, (chunk,),
+                callback=lambda results, key=key: done.put((key, results))))
+            if len(pending) >= self.max_pending:
+                for result in self._next_results(pending, done):
+                    yield result
+        while pending:
+            for result in self._next_results(pending, done):
+                yield result
+
+    def _next_results(self, pending, done):
+        while True:
+            try:
+                key, results = done.get(timeout=POLL_INTERVAL)
+            except Empty:
+                for key, (chunk, async_result) in pending.items():
+                    if async_result.ready() and \
+                       not async_result.successful():
+                        del pending[key]
+                        return self._chunk_results(chunk, async_result)
+            else:
+                del pending[key]
+                return results
+
+    def close(self):
+        '''Waits for the workers to finish, and stops them.'''
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        '''Stops the workers immediately.'''
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+
+def parse_many(documents, ordered=True, **kwargs):
+    '''Parses documents with a temporary :class:`ParseExecutor`.
+
+    :param documents: See :meth:`ParseExecutor.map`.
+    :param bool ordered: See :meth:`ParseExecutor.map`.
+    :param dict \*\*kwargs: Arguments to :class:`ParseExecutor`.
+    :rtype: a generator of :class:`tuple` objects
+    '''
+    with ParseExecutor(**kwargs) as executor:
+        for result in executor.map(documents, ordered=ordered):
+            yield result
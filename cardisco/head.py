@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Parses only the ``<head/>`` section of an HTML document.
+
+Every discoverer only looks at ``/html/head/link`` and ``/html/head/base``,
+so there's no point in tokenizing (or building a tree for) the document body.
+The tree builder defined here aborts the html5lib parser as soon as it is
+asked to create the ``<body/>`` (or ``<frameset/>``) element. Per the HTML5
+parsing algorithm, nothing can be inserted into the ``<head/>`` after that
+point, so the resulting tree is identical to a full parse as far as the
+discoverers are concerned.
+'''
+
+import html5lib
+from html5lib.treebuilders.etree_lxml import TreeBuilder
+
+_BODY_ELEMENTS = frozenset(['body', 'frameset'])
+
+
+class HeadParsed(Exception):
+    '''Raised by :class:`HeadTreeBuilder` when the head section has been
+    completely parsed.
+    '''
+
+
+class HeadTreeBuilder(TreeBuilder):
+    '''An lxml tree builder which stops the parser at the start of the body
+    section.
+    '''
+
+    def insertElementNormal(self, token):
+        if token['name'] in _BODY_ELEMENTS and \
+           token.get('namespace', self.defaultNamespace) == \
+           self.defaultNamespace and len(self.openElements) == 1:
+            raise HeadParsed()
+        return TreeBuilder.insertElementNormal(self, token)
+
+
+def parse_head(file_obj_or_str, encoding=None):
+    '''Parses an HTML document up to the end of its ``<head/>`` section.
+
+    When given a file-like object, only as much of it as is needed to find
+    the end of the head (plus the tokenizer's read-ahead buffer) is read.
+
+    :param file_obj_or_str: The HTML document to be parsed.
+    :type file_obj_or_str: a file-like object, :class:`str` or
+                           :class:`unicode`
+    :param encoding: The encoding label given by the transport layer, for
+                     documents which haven't been decoded.
+    :type encoding: :class:`str` or :const:`None`
+    :returns: A document which only contains the ``<html/>`` and ``<head/>``
+              elements of the HTML document.
+    :rtype: :class:`lxml.etree._ElementTree`
+    '''
+    parser = html5lib.HTMLParser(tree=HeadTreeBuilder)
+    kwargs = {}
+    if encoding and not isinstance(file_obj_or_str, unicode):
+        kwargs['transport_encoding'] = encoding
+    try:
+        return parser.parse(file_obj_or_str, **kwargs)
+    except HeadParsed:
+        return parser.tree.getDocument()
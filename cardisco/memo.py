@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Remembers the links found in document heads, so that pages which share the
+same head (e.g. every page generated from a site's template) are only
+parsed once.
+
+Only the head region of a document (everything before its ``<body>`` tag,
+see :func:`cardisco.prefilter.head_region`) can contain the links that the
+discoverers are looking for, so two documents with the same head region
+have the same links. :class:`HeadMemo` maps a hash of the head region
+(see :func:`head_key`) to the links found in it, *before* they are resolved
+against the document URL; on a hit, the links are resolved against the URL
+of the new document (or the ``<base/>`` element in the head), without
+building a tree or running the discoverers.
+
+Pass a :class:`HeadMemo` to :func:`cardisco.parse_html` (or
+:func:`cardisco.discover`) as ``memo``::
+
+    memo = HeadMemo(max_entries=10000)
+    for url, html in pages:
+        result = cardisco.parse_html(html, url=url, memo=memo)
+    print memo.hits, memo.misses
+'''
+
+from collections import OrderedDict
+import hashlib
+import re
+from threading import Lock
+from urlparse import urljoin
+
+from .encoding import detect_encoding
+from .prefilter import _markup, head_region
+from .results import ResultBuilder
+
+_NEWLINE_RE = re.compile(r'\r\n?')
+_UNICODE_NEWLINE_RE = re.compile(u'\r\n?')
+_SPACE = ' \t\n\f'
+
+
+def normalize_head(head):
+    '''Normalizes the whitespace in a head region, without changing how it
+    is parsed: newlines are normalized (as the HTML parser does), and the
+    whitespace between tags (but not inside them, e.g. in attribute values)
+    is removed.
+
+    :param head: The head region.
+    :type head: :class:`str` or :class:`unicode`
+    :rtype: :class:`str` or :class:`unicode`
+    '''
+    if isinstance(head, unicode):
+        head = _UNICODE_NEWLINE_RE.sub(u'\n', head)
+    else:
+        head = _NEWLINE_RE.sub('\n', head)
+    pieces = []
+    pos = 0
+    for start, end in _markup(head):
+        if end is None:
+            break
+        if head[pos:start].strip(_SPACE):
+            pieces.append(head[pos:start])
+        pieces.append(head[start:end])
+        pos = end
+    if head[pos:].strip(_SPACE):
+        pieces.append(head[pos:])
+    return head[:0].join(pieces)
+
+
+def head_key(data, encoding=None, backend='html5lib'):
+    '''Returns the memo key of a document: a hash of its (normalized) head
+    region, and of the other things which affect the links found in it,
+    such as the encoding that an undecoded document is decoded with (which
+    may be declared after the head region, within the first
+    :data:`~cardisco.encoding.PRESCAN_LENGTH` bytes).
+
+    :param data: The HTML document.
+    :type data: :class:`str` or :class:`unicode`
+    :param encoding: The encoding label given by the transport layer.
+    :type encoding: :class:`str` or :const:`None`
+    :param str backend: The parser backend.
+    :rtype: :class:`str`
+    '''
+    head = normalize_head(head_region(data))
+    digest = hashlib.sha1()
+    if isinstance(head, unicode):
+        digest.update('u\0')
+        head = head.encode('utf-8')
+    else:
+        resolved = detect_encoding(data, encoding)[0]
+        digest.update('b\0%s\0' % (resolved or ''))
+    digest.update('%s\0' % backend)
+    digest.update(head)
+    return digest.digest()
+
+
+class HeadLinks(object):
+    '''The (unresolved) links found in a document head.
+
+    :param html_base: The ``href`` of the ``<base/>`` element.
+    :type html_base: :class:`str` or :const:`None`
+    :param tuple links: ``(name, href, title, rel, position, follows_base)``
+                        tuples, where ``follows_base`` is whether the link
+                        comes after the ``<base/>`` element (and so is
+                        resolved against it, rather than the document URL).
+    '''
+
+    __slots__ = ('html_base', 'links')
+
+    def __init__(self, html_base, links):
+        self.html_base = html_base
+        self.links = tuple(links)
+
+    def resolve(self, url, dispatcher, compact=False):
+        '''Resolves the links against a document URL.
+
+        :param url: The URL of the document.
+        :type url: :class:`str` or :const:`None`
+        :param dispatcher: The dispatcher which found the links.
+        :type dispatcher: :class:`cardisco.engine.LinkDispatcher`
+        :param bool compact: Whether to return a
+                             :class:`~cardisco.results.DiscoveryResult`
+                             instead of a dictionary.
+        :rtype: :class:`dict` or :class:`~cardisco.results.DiscoveryResult`
+        '''
+        hrefs = {}
+        if compact:
+            builder = ResultBuilder(dispatcher.names, dispatcher.empty)
+        else:
+            results = dict((name, {}) for name in dispatcher.discoverers)
+        for name, href, title, rel, position, follows_base in self.links:
+            base = self.html_base if follows_base else url
+            if base:
+                key = (base, href)
+                joined = hrefs.get(key)
+                if joined is None:
+                    joined = hrefs[key] = urljoin(base, href)
+                href = joined
+            if compact:
+                builder.add(name, href, title, rel, position)
+            else:
+                results[name][href] = title
+        if compact:
+            return builder.result()
+        return results
+
+
+class HeadMemo(object):
+    '''A thread-safe LRU memo of the links found in document heads.
+
+    :param int max_entries: The maximum number of heads remembered.
+    '''
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        #: The number of lookups which found the head.
+        self.hits = 0
+        #: The number of lookups which didn't find the head.
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    key = staticmethod(head_key)
+
+    def get(self, key):
+        '''Looks up the links for a key, and marks it as recently used.
+
+        :param str key: The key (see :func:`head_key`).
+        :rtype: :class:`HeadLinks` or :const:`None`
+        '''
+        with self._lock:
+            links = self._entries.pop(key, None)
+            if links is None:
+                self.misses += 1
+                return None
+            self._entries[key] = links
+            self.hits += 1
+            return links
+
+    def set(self, key, links):
+        '''Remembers the links for a key, evicting the least recently used
+        entries if the memo is full.
+
+        :param str key: The key (see :func:`head_key`).
+        :param links: The links.
+        :type links: :class:`HeadLinks`
+        '''
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = links
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def hit_rate(self):
+        '''Returns the fraction of lookups which found the head.
+
+        :rtype: :class:`float`
+        '''
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0.0
+        return float(self.hits) / lookups
+
+    def clear(self):
+        '''Forgets every head, and resets the counters.'''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
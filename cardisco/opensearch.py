@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .base import BaseDiscoverer
+from .base import BaseDiscoverer, LinkRule
 
 
 class Discoverer(BaseDiscoverer):
@@ -23,9 +23,7 @@ class Discoverer(BaseDiscoverer):
       (section #Autodiscovery_in_HTML.2FXHTML)
     '''
 
-    @classmethod
-    def check_link_element(cls, element):
-        rel = element.attrib['rel'].lower().split(' ')
-        ltype = element.attrib['type'].lower().strip()
-        return (ltype == 'application/opensearchdescription+xml' and
-                'search' in rel)
+    rules = (
+        LinkRule(types=['application/opensearchdescription+xml'],
+                 rels=['search']),
+    )
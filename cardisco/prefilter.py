@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+A cheap scan of the raw document, which rules out documents that can't
+contain any of the links that the discoverers are looking for, so that they
+don't have to be parsed at all.
+
+The scan errs on the side of caution: it may let through documents which
+turn out to have no matching links, but it must never reject a document
+which does have one. In particular:
+
+* the "head region" only ends at a ``<body>`` start tag which is not inside
+  a comment, a quoted attribute value or a raw text element (e.g.
+  ``<script/>``), since html5lib keeps ``<link/>``
+  elements between ``</head>`` and ``<body>`` in the head;
+* ``type`` attributes containing character references or non-ASCII
+  characters are always considered to be a possible match;
+* documents which look like they use a multi-byte encoding (i.e. UTF-16 or
+  UTF-32) are always parsed.
+'''
+
+import re
+
+# the attributes of a tag, skipping quoted values (which run to the end of
+# the document if they aren't closed), and the end of the tag
+_ATTRIBUTES = r'''(?:[^>"'=]+|=\s*(?:"[^"]*"?|'[^']*'?)|[="'])*>?'''
+# a comment opener, or a whole tag
+_TAG_RE = re.compile(r'''<(?:(!--)|(/?)([a-zA-Z][^\s/>]*)%s|[!?/][^>]*>?)'''
+                     % _ATTRIBUTES)
+_COMMENT_END_RE = re.compile(r'--!?>')
+_RAWTEXT_END_RE = dict((name, re.compile(r'</%s(?=[\s/>]|\Z)%s' %
+                                         (name, _ATTRIBUTES), re.I))
+                       for name in ['script', 'style', 'title', 'textarea',
+                                    'xmp', 'iframe', 'noembed', 'noframes'])
+_LINK_RE = re.compile(r'<link[\s/>]', re.I)
+_TYPE_RE = re.compile(r'''\btype\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''',
+                      re.I)
+_UNSAFE_RE = re.compile(r'[&\x80-\xff]')
+_UNSAFE_UNICODE_RE = re.compile(u'[&\x80-\uffff]')
+#: The number of bytes checked for NUL bytes.
+NUL_CHECK_LENGTH = 1024
+
+
+def _markup(data):
+    '''Yields the ``(start, end)`` positions of the tags, comments and raw
+    text elements (as a whole) in a document, up to its ``<body>`` tag, whose
+    position is yielded as ``(start, None)``.
+    '''
+    pos = 0
+    length = len(data)
+    while True:
+        match = _TAG_RE.search(data, pos)
+        if match is None:
+            return
+        pos = match.end()
+        if match.group(1) is not None:
+            # <!--> and <!---> are (empty) comments
+            if data.startswith('>', pos):
+                pos += 1
+            elif data.startswith('->', pos):
+                pos += 2
+            else:
+                end = _COMMENT_END_RE.search(data, pos)
+                pos = length if end is None else end.end()
+            yield match.start(), pos
+            continue
+        name = match.group(3)
+        if name is not None and not match.group(2):
+            name = name.lower()
+            if name == 'body':
+                yield match.start(), None
+                return
+            elif name in _RAWTEXT_END_RE:
+                end = _RAWTEXT_END_RE[name].search(data, pos)
+                pos = length if end is None else end.end()
+        yield match.start(), pos
+
+
+def head_region(data):
+    '''Returns the part of a document before its ``<body>`` tag.
+
+    :param data: The HTML document.
+    :type data: :class:`str` or :class:`unicode`
+    :rtype: :class:`str` or :class:`unicode`
+    '''
+    for start, end in _markup(data):
+        if end is None:
+            return data[:start]
+    return data
+
+
+def head_tags(data):
+    '''Yields the tags in the head region of a document, skipping comments
+    and the content of raw text elements, except for ``<title/>`` elements,
+    which are yielded as a whole since their text may contain character
+    references.
+
+    :param data: The HTML document.
+    :type data: :class:`str` or :class:`unicode`
+    :rtype: iterator of :class:`str` or :class:`unicode`
+    '''
+    for start, end in _markup(data):
+        if end is None:
+            return
+        match = _TAG_RE.match(data, start)
+        if match.group(1) is not None:
+            continue
+        name = match.group(3)
+        if name is not None and not match.group(2) and \
+           name.lower() != 'title':
+            end = match.end()
+        yield data[start:end]
+
+
+def may_have_links(data, link_types):
+    '''Determines whether a document might contain a ``<link/>`` element with
+    one of the given types.
+
+    :param data: The HTML document.
+    :type data: :class:`str` or :class:`unicode`
+    :param link_types: The (lowercase) link types to look for, or
+                       :const:`None` if links of any type can match.
+    :type link_types: a collection of :class:`str`, or :const:`None`
+    :returns: :const:`False` if the document definitely doesn't contain such
+              a link.
+    :rtype: :class:`bool`
+    '''
+    if isinstance(data, unicode):
+        unsafe_re = _UNSAFE_UNICODE_RE
+    else:
+        if '\x00' in data[:NUL_CHECK_LENGTH]:
+            return True
+        unsafe_re = _UNSAFE_RE
+    region = head_region(data)
+    match = _LINK_RE.search(region)
+    if match is None:
+        return False
+    if link_types is None:
+        return True
+    for type_match in _TYPE_RE.finditer(region, match.start()):
+        value = type_match.group(1)
+        if value is None:
+            value = type_match.group(2)
+            if value is None:
+                value = type_match.group(3)
+        if unsafe_re.search(value):
+            return True
+        if value.strip().lower() in link_types:
+            return True
+    return False
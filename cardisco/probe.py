@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Guesses feed URLs on sites which don't advertise any.
+
+When :func:`cardisco.discover` is given a :class:`Prober`, and the page
+doesn't link to anything (or the request failed with an error status), a
+list of well-known paths (:data:`DEFAULT_PATHS`) is tried on the same host.
+Each response is sniffed (see :func:`cardisco.sniff.sniff_feed`), and the
+ones which turn out to be feeds are added to the result, under their
+:data:`cardisco.MODULES` key.
+
+The probes are made concurrently, by a few worker threads. Each worker
+keeps its connection to the host alive between probes (a connection can't
+be shared by several threads), and only reads the first
+:data:`~cardisco.sniff.SNIFF_LENGTH` bytes of each response (with a ranged
+``GET``). Probing stops at a global deadline: the probes which haven't
+finished by then are abandoned.
+'''
+
+import httplib
+from Queue import Empty, Queue
+import socket
+from threading import Thread
+from time import time
+from urlparse import urljoin, urlsplit
+
+from .sniff import SNIFF_LENGTH
+from .stream import DEFAULT_TIMEOUT, fetch, MAX_REDIRECTS, REDIRECT_CODES
+from .verify import _feed_type
+
+#: The paths tried by default.
+DEFAULT_PATHS = ('/feed', '/feed/', '/rss', '/rss.xml', '/atom.xml',
+                 '/index.xml', '/feed.xml', '/feeds/posts/default')
+#: The default number of seconds after which probing stops.
+DEFAULT_DEADLINE = 5.0
+#: Responses whose remaining body is at most this long are read to the end,
+#: so that the connection can be reused. Otherwise, it is closed.
+MAX_DRAIN = 64 * 1024
+
+
+class _Connection(object):
+    '''A keep-alive connection to one host, which is reopened when the
+    server closes it.
+    '''
+
+    def __init__(self, scheme, netloc):
+        if scheme == 'https':
+            self.connection_type = httplib.HTTPSConnection
+        elif scheme == 'http':
+            self.connection_type = httplib.HTTPConnection
+        else:
+            raise ValueError('Unsupported scheme: %s' % scheme)
+        self.host = netloc.rsplit('@', 1)[-1]
+        self.connection = None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def get(self, path, headers, timeout):
+        '''Makes a request, and returns the status, the headers and the first
+        bytes of the body.
+        '''
+        for attempt in (0, 1):
+            reused = self.connection is not None
+            if not reused:
+                self.connection = self.connection_type(self.host,
+                                                       timeout=timeout)
+            else:
+                self.connection.timeout = timeout
+                if self.connection.sock is not None:
+                    self.connection.sock.settimeout(timeout)
+            try:
+                self.connection.request('GET', path, headers=headers)
+                response = self.connection.getresponse()
+                prefix = response.read(SNIFF_LENGTH)
+                self._finish(response)
+            except (httplib.HTTPException, socket.error):
+                self.close()
+                if reused and attempt == 0:
+                    # the server closed the idle connection
+                    continue
+                raise
+            return response.status, dict(response.getheaders()), prefix
+
+    def _finish(self, response):
+        if response.will_close:
+            self.close()
+        elif not response.isclosed():
+            if response.length is not None and response.length <= MAX_DRAIN:
+                response.read()
+            else:
+                self.close()
+
+
+class Prober(object):
+    '''Probes well-known feed paths.
+
+    :param paths: The paths (or URLs, relative to the page URL) to try.
+    :type paths: a sequence of :class:`str`
+    :param float deadline: The number of seconds after which probing stops.
+    :param int workers: The maximum number of concurrent probes (and of
+                        connections to the host).
+    :param timeout: The socket timeout, in seconds. It is shortened to fit
+                    in the deadline.
+    :type timeout: :class:`int`, :class:`float` or :const:`None`
+    :param headers: Extra request headers.
+    :type headers: :class:`dict` or :const:`None`
+    '''
+
+    def __init__(self, paths=DEFAULT_PATHS, deadline=DEFAULT_DEADLINE,
+                 workers=4, timeout=DEFAULT_TIMEOUT, headers=None):
+        self.paths = tuple(paths)
+        self.deadline = deadline
+        self.workers = workers
+        self.timeout = timeout
+        self.headers = headers
+
+    def candidates(self, url):
+        '''Returns the URLs to probe for a page.
+
+        :param str url: The URL of the page.
+        :rtype: :class:`list`
+        '''
+        urls = []
+        for path in self.paths:
+            candidate = urljoin(url, path)
+            if candidate != url and candidate not in urls:
+                urls.append(candidate)
+        return urls
+
+    def _request_headers(self):
+        from . import HTTP_ACCEPT
+
+        headers = dict(self.headers or {})
+        headers['Accept'] = HTTP_ACCEPT
+        headers['Range'] = 'bytes=0-%d' % (SNIFF_LENGTH - 1)
+        return headers
+
+    def _check(self, connections, url, headers, end):
+        '''Probes a URL, following redirects (on the pooled connection when
+        they stay on the same host), and returns ``(mime_type, final_url)``.
+        '''
+        for i in xrange(MAX_REDIRECTS + 1):
+            remaining = end - time()
+            if remaining <= 0:
+                return None, url
+            timeout = remaining
+            if self.timeout is not None:
+                timeout = min(timeout, self.timeout)
+            parts = urlsplit(url)
+            key = (parts.scheme, parts.netloc)
+            if key in connections:
+                path = parts.path or '/'
+                if parts.query:
+                    path = '%s?%s' % (path, parts.query)
+                status, response_headers, prefix = connections[key].get(
+                    path, headers, timeout)
+            else:
+                response = fetch(url, headers=headers, timeout=timeout,
+                                 max_bytes=SNIFF_LENGTH)
+                try:
+                    prefix = response.read()
+                finally:
+                    response.close()
+                return (_feed_type(response.headers.get('content-type'),
+                                   prefix) if response.status in (200, 206)
+                        else None), response.url
+            location = response_headers.get('location')
+            if status in REDIRECT_CODES and location:
+                url = urljoin(url, location)
+                continue
+            if status not in (200, 206):
+                return None, url
+            return _feed_type(response_headers.get('content-type'),
+                              prefix), url
+        return None, url
+
+    def probe(self, url):
+        '''Probes the candidate URLs of a page concurrently, until they have
+        all been tried, or the deadline is reached.
+
+        :param str url: The URL of the page.
+        :returns: A dictionary, where the key is the feed's MIME type and the
+                  value is a dictionary of URL-title pairs (the titles are
+                  always :const:`None`). It only contains the types which
+                  were found.
+        :rtype: :class:`dict`
+        '''
+        end = time() + self.deadline
+        candidates = self.candidates(url)
+        if not candidates:
+            return {}
+        tasks = Queue()
+        for candidate in candidates:
+            tasks.put(candidate)
+        done = Queue()
+        headers = self._request_headers()
+
+        def work():
+            parts = urlsplit(url)
+            connections = {}
+            try:
+                connections[(parts.scheme, parts.netloc)] = \
+                    _Connection(parts.scheme, parts.netloc)
+            except ValueError:
+                pass
+            try:
+                while time() < end:
+                    try:
+                        candidate = tasks.get_nowait()
+                    except Empty:
+                        return
+                    try:
+                        found = self._check(connections, candidate, headers,
+                                            end)
+                    except Exception:
+                        found = (None, candidate)
+                    done.put(found)
+            finally:
+                for connection in connections.itervalues():
+                    connection.close()
+
+        for i in xrange(min(self.workers, len(candidates))):
+            thread = Thread(target=work)
+            thread.daemon = True
+            thread.start()
+
+        result = {}
+        for i in xrange(len(candidates)):
+            remaining = end - time()
+            if remaining <= 0:
+                break
+            try:
+                mime_type, final_url = done.get(timeout=remaining)
+            except Empty:
+                break
+            if mime_type is not None:
+                result.setdefault(mime_type, {})[final_url] = None
+        return result
@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .base import BaseDiscoverer
+from .base import BaseDiscoverer, LinkRule
 
 
 class Discoverer(BaseDiscoverer):
@@ -23,5 +23,7 @@ class Discoverer(BaseDiscoverer):
     * http://xmlns.com/foaf/spec/#sec-autodesc
     '''
 
-    xpath = '/html:html/html:head/html:link[@href]' \
-            '[@type=\'application/rdf+xml\']'
+    required_attributes = ('type', 'href')
+    rules = (
+        LinkRule(types=['application/rdf+xml'], exact=True),
+    )
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Discoverers provided by other packages.
+
+Besides the built-in discoverers in :data:`cardisco.MODULES`, any installed
+package can provide discoverers through the :data:`ENTRY_POINT_GROUP` entry
+point group. The entry point name is the name (MIME type) that the results
+are stored under, and it refers to either a discoverer class or a module
+with a ``Discoverer`` class, e.g. in ``setup.py``::
+
+    entry_points={
+        'cardisco.discoverers': [
+            'application/json+oembed = mypackage.oembed:Discoverer',
+        ],
+    }
+
+Entry points are only loaded the first time that a document is parsed, and
+then cached. They are read straight from the ``entry_points.txt`` files of
+the distributions on :data:`sys.path` (``.egg-info`` and ``.dist-info``
+directories, and unzipped eggs), since building the :mod:`pkg_resources`
+working set takes longer than parsing a document. Zipped eggs are not
+searched. The built-in discoverers take precedence over entry points with
+the same name, and the first distribution on :data:`sys.path` wins if
+several provide the same name.
+'''
+
+from ConfigParser import Error as ConfigError, RawConfigParser
+from importlib import import_module
+import os
+import sys
+from threading import Lock
+from types import ModuleType
+import warnings
+
+ENTRY_POINT_GROUP = 'cardisco.discoverers'
+
+_DISCOVERERS = None
+_LOCK = Lock()
+
+
+def discoverer_class(obj, name):
+    '''Returns the discoverer class for a registered object.
+
+    :param obj: A discoverer class, or a module with a ``Discoverer`` class.
+    :param str name: The name that the discoverer is registered under.
+    :raises AttributeError: if ``obj`` is a module without a ``Discoverer``
+                            class.
+    :rtype: :class:`type`
+    '''
+    if isinstance(obj, ModuleType):
+        try:
+            return obj.Discoverer
+        except AttributeError:
+            raise AttributeError('''\
+Could not find a Discoverer object in the %s module.''' % name)
+    return obj
+
+
+def _entry_point_files():
+    seen = set()
+    for path in sys.path:
+        path = os.path.abspath(path or os.curdir)
+        if path in seen or not os.path.isdir(path):
+            continue
+        seen.add(path)
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            continue
+        for name in names:
+            if name.endswith(('.egg-info', '.dist-info')):
+                filename = os.path.join(path, name, 'entry_points.txt')
+            elif name.endswith('.egg'):
+                filename = os.path.join(path, name, 'EGG-INFO',
+                                        'entry_points.txt')
+            else:
+                continue
+            if os.path.isfile(filename):
+                yield filename
+
+
+def _iter_entry_points(group):
+    '''Yields the ``(name, value)`` pairs of the entry points in a group.'''
+    for filename in _entry_point_files():
+        parser = RawConfigParser()
+        # entry point names are case-sensitive
+        parser.optionxform = str
+        try:
+            parser.read(filename)
+            if parser.has_section(group):
+                for item in parser.items(group):
+                    yield item
+        except ConfigError as e:
+            warnings.warn('Could not read %s: %s' % (filename, e),
+                          RuntimeWarning)
+
+
+def _load(value):
+    # "module:attr.attr [extras]"
+    module, sep, attrs = value.split('[', 1)[0].strip().partition(':')
+    obj = import_module(module.strip())
+    if attrs.strip():
+        for attr in attrs.strip().split('.'):
+            obj = getattr(obj, attr)
+    return obj
+
+
+def _load_entry_points(group):
+    discoverers = {}
+    for name, value in _iter_entry_points(group):
+        if name in discoverers:
+            continue
+        try:
+            discoverers[name] = discoverer_class(_load(value), name)
+        except Exception as e:
+            # one broken package shouldn't break discovery altogether
+            warnings.warn('Could not load the %s discoverer (%s): %s' % (
+                name, value, e), RuntimeWarning)
+    return discoverers
+
+
+def entry_point_discoverers(reload=False):
+    '''Returns the discoverers provided through entry points.
+
+    :param bool reload: Whether to look for entry points again, instead of
+                        returning the cached discoverers.
+    :returns: A dictionary, where the key is the name (MIME type) and the
+              value is the discoverer class.
+    :rtype: :class:`dict`
+    '''
+    global _DISCOVERERS
+
+    with _LOCK:
+        if _DISCOVERERS is None or reload:
+            _DISCOVERERS = _load_entry_points(ENTRY_POINT_GROUP)
+        return dict(_DISCOVERERS)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Compact discovery results, for applications which keep a large number of
+them in memory.
+
+By default, a discovery result is a dictionary of dictionaries, with a key
+for every discoverer (even if it didn't find anything), and the document
+order of the links is lost. With ``compact=True``,
+:func:`cardisco.parse_html` and :func:`cardisco.discover` return a
+:class:`DiscoveryResult` instead: a tuple of :class:`Link` records (which
+use ``__slots__``), in document order. The MIME types and ``rel`` values
+are interned, so that they're shared between all the results, and documents
+without any links all share the same (empty) result.
+
+A :class:`DiscoveryResult` is also a read-only
+:class:`~collections.Mapping`, which looks exactly like the dictionary
+result, so most existing code doesn't have to change::
+
+    >>> result = cardisco.parse_html(html, compact=True)
+    >>> result['application/rss+xml']
+    {'http://example.com/feed.rss': 'My Feed'}
+    >>> [link.href for link in result.links]
+    ['http://example.com/feed.rss']
+
+The dictionaries it returns are built on demand, so modifying them doesn't
+modify the result; use :meth:`DiscoveryResult.to_dict` to get a mutable
+copy.
+'''
+
+from collections import Mapping
+from threading import Lock
+
+#: The maximum number of distinct ``rel`` values that are interned.
+MAX_INTERNED = 4096
+
+_INTERNED = {}
+_INTERN_LOCK = Lock()
+
+
+def intern_value(value):
+    '''Returns a shared copy of a string (which, unlike :func:`intern`, can
+    be a :class:`unicode` object). Only the first :data:`MAX_INTERNED`
+    distinct values are shared, since they can come from untrusted
+    documents.
+
+    :param value: The string.
+    :type value: :class:`str`, :class:`unicode` or :const:`None`
+    '''
+    if value is None:
+        return None
+    try:
+        return _INTERNED[value]
+    except KeyError:
+        pass
+    with _INTERN_LOCK:
+        if len(_INTERNED) >= MAX_INTERNED:
+            return value
+        return _INTERNED.setdefault(value, value)
+
+
+class Link(object):
+    '''A link found by a discoverer.
+
+    :param str type: The name (MIME type) of the discoverer which found it.
+    :param str href: The (resolved) URL.
+    :param title: The ``title`` attribute of the ``<link/>`` element.
+    :type title: :class:`str` or :const:`None`
+    :param rel: The ``rel`` attribute of the ``<link/>`` element.
+    :type rel: :class:`str` or :const:`None`
+    :param position: The position of the ``<link/>`` element amongst the
+                     links in the document head, or :const:`None` if the
+                     link wasn't found in the document (see
+                     :mod:`cardisco.probe`).
+    :type position: :class:`int` or :const:`None`
+    '''
+
+    __slots__ = ('type', 'href', 'title', 'rel', 'position')
+
+    def __init__(self, type, href, title=None, rel=None, position=0):
+        self.type = intern_value(type)
+        self.href = href
+        self.title = title
+        self.rel = intern_value(rel)
+        self.position = position
+
+    def __repr__(self):
+        return 'Link(%r, %r, title=%r, rel=%r, position=%r)' % (
+            self.type, self.href, self.title, self.rel, self.position)
+
+    def __eq__(self, other):
+        if not isinstance(other, Link):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __ne__(self, other):
+        if not isinstance(other, Link):
+            return NotImplemented
+        return self._key() != other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _key(self):
+        return (self.type, self.href, self.title, self.rel, self.position)
+
+    def __getstate__(self):
+        return self._key()
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+
+class DiscoveryResult(object):
+    '''The links found in a document. Also a read-only mapping, with the
+    same keys and values as the dictionary result.
+
+    :param names: The names (MIME types) of the discoverers, which are the
+                  keys of the mapping.
+    :type names: :class:`frozenset`
+    :param links: The links, in document order.
+    :type links: an iterable of :class:`Link` objects
+    '''
+
+    __slots__ = ('names', 'links')
+
+    def __init__(self, names, links=()):
+        self.names = names
+        #: The :class:`Link` objects, in document order.
+        self.links = tuple(links)
+
+    @classmethod
+    def from_dict(cls, result):
+        '''Converts a dictionary result. Since the document order of the
+        links is unknown, they are numbered in the dictionary's order, and
+        their ``rel`` attributes are :const:`None`.
+
+        :param dict result: The dictionary result.
+        :rtype: :class:`DiscoveryResult`
+        '''
+        links = []
+        for name, hrefs in sorted(result.iteritems()):
+            for href, title in sorted(hrefs.iteritems()):
+                links.append(Link(name, href, title, position=len(links)))
+        return cls(frozenset(intern_value(name) for name in result), links)
+
+    def __repr__(self):
+        return 'DiscoveryResult(%r)' % (self.links,)
+
+    def __getstate__(self):
+        return (sorted(self.names), self.links)
+
+    def __setstate__(self, state):
+        names, links = state
+        self.names = frozenset(intern_value(name) for name in names)
+        self.links = links
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        return dict((link.href, link.title) for link in self.links
+                    if link.type == name)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __nonzero__(self):
+        # like the dictionary result, which always has every name
+        return bool(self.names)
+
+    def __eq__(self, other):
+        if isinstance(other, DiscoveryResult):
+            return self.names == other.names and self.links == other.links
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def get(self, name, default=None):
+        if name not in self.names:
+            return default
+        return self[name]
+
+    def iterkeys(self):
+        return iter(self.names)
+
+    def keys(self):
+        return list(self.names)
+
+    def iteritems(self):
+        groups = self._groups()
+        for name in self.names:
+            yield name, groups.get(name, {})
+
+    def items(self):
+        return list(self.iteritems())
+
+    def itervalues(self):
+        for name, links in self.iteritems():
+            yield links
+
+    def values(self):
+        return list(self.itervalues())
+
+    def _groups(self):
+        groups = {}
+        for link in self.links:
+            groups.setdefault(link.type, {})[link.href] = link.title
+        return groups
+
+    def to_dict(self):
+        '''Converts the result into the usual (mutable) dictionary.
+
+        :returns: A dictionary, where the key is the URL's MIME type and the
+                  value is a dictionary of URL-title pairs.
+        :rtype: :class:`dict`
+        '''
+        return dict(self.iteritems())
+
+Mapping.register(DiscoveryResult)
+
+
+class ResultBuilder(object):
+    '''Collects the links found in one document, keeping the first position
+    (and the last title) of a URL which is found more than once, like the
+    dictionary result does.
+
+    :param names: See :class:`DiscoveryResult`.
+    :type names: :class:`frozenset`
+    :param empty: The result returned when no links are found.
+    :type empty: :class:`DiscoveryResult`
+    '''
+
+    def __init__(self, names, empty):
+        self.names = names
+        self.empty = empty
+        self.links = []
+        self._seen = {}
+
+    def add(self, name, href, title, rel, position):
+        key = (name, href)
+        idx = self._seen.get(key)
+        if idx is not None:
+            self.links[idx].title = title
+            return
+        self._seen[key] = len(self.links)
+        self.links.append(Link(name, href, title, rel, position))
+
+    def result(self):
+        '''Returns the :class:`DiscoveryResult`.'''
+        if not self.links:
+            return self.empty
+        return DiscoveryResult(self.names, self.links)
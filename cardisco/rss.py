@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .base import BaseDiscoverer
+from .base import BaseDiscoverer, LinkRule
 
 
 class Discoverer(BaseDiscoverer):
@@ -22,6 +22,8 @@ class Discoverer(BaseDiscoverer):
     * http://www.rssboard.org/rss-autodiscovery
     '''
 
-    xpath = '/html:html/html:head/html:link' \
-            '[@type=\'application/rss+xml\']' \
-            '[@rel=\'alternate\'][@href]'
+    # the specification requires the exact values
+    rules = (
+        LinkRule(types=['application/rss+xml'], rels=['alternate'],
+                 exact=True),
+    )
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Decides how a response should be handled, based on its ``Content-Type``
+header and the first bytes of its body. Based on the WHATWG MIME Sniffing
+standard:
+
+* http://mimesniff.spec.whatwg.org/
+
+Feeds which are served as generic XML (or HTML) are recognized without
+parsing them, and binary documents (images, PDFs, archives and so on) are
+not parsed at all.
+'''
+
+#: The number of bytes of the body that are examined.
+SNIFF_LENGTH = 512
+
+HTML = 'text/html'
+ATOM = 'application/atom+xml'
+RDF = 'application/rdf+xml'
+RSS = 'application/rss+xml'
+
+HTML_TYPES = frozenset(['text/html', 'application/xhtml+xml'])
+XML_TYPES = frozenset(['text/xml', 'application/xml'])
+UNKNOWN_TYPES = frozenset(['', 'unknown/unknown', 'application/unknown',
+                           '*/*', 'application/octet-stream', 'text/plain'])
+
+_WHITESPACE = '\t\n\x0c\r '
+_TAG_TERMINATORS = ' >'
+_HTML_PATTERNS = ['<!doctype html', '<html', '<head', '<script', '<iframe',
+                  '<h1', '<div', '<font', '<table', '<a', '<style', '<title',
+                  '<b', '<body', '<br', '<p', '<link', '<meta', '<base']
+_BINARY_PATTERNS = [
+    # images
+    '\x89PNG\r\n\x1a\n', 'GIF87a', 'GIF89a', '\xff\xd8\xff', 'BM',
+    '\x00\x00\x01\x00', '\x00\x00\x02\x00',
+    # documents and archives
+    '%PDF-', '%!PS-Adobe-', '\x1f\x8b\x08', 'PK\x03\x04', 'Rar!\x1a\x07\x00',
+    # audio and video
+    'OggS\x00', 'ID3', 'fLaC', '\x1aE\xdf\xa3', 'FORM', 'RIFF',
+]
+_TEXT_BOMS = ['\xef\xbb\xbf', '\xfe\xff', '\xff\xfe']
+_BINARY_BYTES = frozenset(chr(i) for i in range(32)) - \
+    frozenset('\t\n\x0c\r\x1b')
+_RSS_NS = 'http://purl.org/rss/1.0/'
+_RDF_NS = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+
+
+def mime_type_essence(content_type):
+    '''Returns the lowercase ``type/subtype`` part of a ``Content-Type``
+    header, without any parameters.
+
+    :param content_type: The header value.
+    :type content_type: :class:`str` or :const:`None`
+    :rtype: :class:`str`
+    '''
+    if not content_type:
+        return ''
+    return content_type.split(';', 1)[0].strip().lower()
+
+
+def _skip_whitespace(data, idx):
+    while idx < len(data) and data[idx] in _WHITESPACE:
+        idx += 1
+    return idx
+
+
+def sniff_feed(data):
+    '''Determines whether a document is an Atom, RSS or RDF document, using
+    the WHATWG rules for distinguishing if a resource is a feed or HTML.
+
+    :param str data: The first bytes of the document.
+    :returns: The MIME type of the feed, or :const:`None`.
+    :rtype: :class:`str` or :const:`None`
+    '''
+    idx = 3 if data.startswith(_TEXT_BOMS[0]) else 0
+    while True:
+        idx = _skip_whitespace(data, idx)
+        if data[idx:idx + 1] != '<':
+            return None
+        idx += 1
+        if data.startswith('!--', idx):
+            end = data.find('-->', idx + 3)
+            if end < 0:
+                return None
+            idx = end + 3
+        elif data.startswith('!', idx):
+            end = data.find('>', idx + 1)
+            if end < 0:
+                return None
+            idx = end + 1
+        elif data.startswith('?', idx):
+            end = data.find('?>', idx + 1)
+            if end < 0:
+                return None
+            idx = end + 2
+        elif data.startswith('rss', idx):
+            return RSS
+        elif data.startswith('feed', idx):
+            return ATOM
+        elif data.startswith('rdf:RDF', idx):
+            if _RDF_NS in data:
+                return RSS if _RSS_NS in data else RDF
+            return None
+        else:
+            return None
+
+
+def looks_like_html(data):
+    '''Determines whether a document starts like an HTML document.
+
+    :param str data: The first bytes of the document.
+    :rtype: :class:`bool`
+    '''
+    idx = _skip_whitespace(data, 0)
+    start = data[idx:idx + 16].lower()
+    if start.startswith('<!--'):
+        return True
+    for pattern in _HTML_PATTERNS:
+        if start.startswith(pattern):
+            terminator = start[len(pattern):len(pattern) + 1]
+            if terminator and terminator in _TAG_TERMINATORS:
+                return True
+    return False
+
+
+def looks_binary(data, signatures=True):
+    '''Determines whether a document is a binary (i.e. non-text) document,
+    either because it starts with a well-known file signature, or because it
+    contains control characters.
+
+    :param str data: The first bytes of the document.
+    :param bool signatures: Whether to look for file signatures.
+    :rtype: :class:`bool`
+    '''
+    for bom in _TEXT_BOMS:
+        if data.startswith(bom):
+            return False
+    if signatures:
+        for pattern in _BINARY_PATTERNS:
+            if data.startswith(pattern):
+                return True
+        if data[4:8] == 'ftyp':
+            # MP4
+            return True
+    for char in data:
+        if char in _BINARY_BYTES:
+            return True
+    return False
+
+
+def sniff(content_type, data):
+    '''Determines how a response should be handled.
+
+    :param content_type: The ``Content-Type`` header of the response.
+    :type content_type: :class:`str` or :const:`None`
+    :param str data: The first bytes of the response body. Only the first
+                     :data:`SNIFF_LENGTH` bytes are examined.
+    :returns: The MIME type of the document, if it's one of the types in
+              :data:`cardisco.MODULES`; :data:`HTML` if the document should be
+              parsed for links; or :const:`None` if it shouldn't be parsed.
+    :rtype: :class:`str` or :const:`None`
+    '''
+    from . import MODULES
+
+    essence = mime_type_essence(content_type)
+    if essence in MODULES:
+        # assume the server's not lying
+        return essence
+    data = data[:SNIFF_LENGTH]
+    if essence in HTML_TYPES or essence in XML_TYPES or \
+       essence.endswith('+xml'):
+        return sniff_feed(data) or HTML
+    if looks_like_html(data):
+        return HTML
+    if essence in UNKNOWN_TYPES:
+        feed = sniff_feed(data)
+        if feed is not None:
+            return feed
+        if not looks_binary(data, signatures=essence != 'text/plain'):
+            return HTML
+    return None
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+A persistent discovery cache, stored in an SQLite database.
+
+:class:`SQLiteCache` can be used wherever a
+:class:`~cardisco.cache.DiscoveryCache` can (e.g. as the ``cache`` argument
+of :func:`cardisco.discover`), but its entries survive restarts, and it can
+be shared by any number of threads and processes on the same machine. The
+database uses write-ahead logging, so readers don't block the writer (and
+vice versa), and concurrent writers wait for each other (for up to
+``timeout`` seconds). Each thread (and process) gets its own connection.
+The database must be on a local filesystem.
+
+Batch jobs can use :meth:`SQLiteCache.missing` to skip the URLs which
+already have a (fresh) result::
+
+    cache = SQLiteCache('discovery.db', ttl=7 * 24 * 3600,
+                        store_unvalidated=True)
+    for url, result in cardisco.discover_many(cache.missing(urls),
+                                              cache=cache):
+        ...
+'''
+
+import json
+import os
+import sqlite3
+import sys
+from threading import local
+from time import time
+
+from .cache import CacheEntry
+from .results import DiscoveryResult
+
+#: The maximum number of URLs looked up in a single query.
+CHUNK_SIZE = 500
+
+_SCHEMA = '''\
+CREATE TABLE IF NOT EXISTS results (
+    url TEXT PRIMARY KEY,
+    fetched REAL NOT NULL,
+    expires REAL,
+    etag TEXT,
+    last_modified TEXT,
+    result TEXT NOT NULL
+)'''
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class SQLiteCache(object):
+    '''A discovery cache stored in an SQLite database.
+
+    :param str path: The path of the database file. It is created if it
+                     doesn't exist.
+    :param ttl: The default number of seconds after which an entry is
+                discarded.
+    :type ttl: :class:`int`, :class:`float` or :const:`None`
+    :param float timeout: How long to wait for other writers, in seconds.
+    :param bool store_unvalidated: Whether :func:`cardisco.discover` should
+                                   also store results without an ``ETag`` or
+                                   ``Last-Modified`` validator (so that
+                                   :meth:`missing` knows about them).
+    '''
+
+    def __init__(self, path, ttl=None, timeout=30, store_unvalidated=False):
+        self.path = path
+        self.ttl = ttl
+        self.timeout = timeout
+        self.store_unvalidated = store_unvalidated
+        self._local = local()
+        self._connection()
+
+    def _connection(self):
+        '''Returns the connection of the current thread, which is (re)opened
+        in forked processes.
+        '''
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                     isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(_SCHEMA)
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def _fresh(self, urls, now):
+        placeholders = ', '.join('?' * len(urls))
+        return self._connection().execute(
+            'SELECT url, fetched, etag, last_modified, result FROM results '
+            'WHERE url IN (%s) AND (expires IS NULL OR expires >= ?)' %
+            placeholders, [_text(url) for url in urls] + [now])
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def get(self, url):
+        '''Retrieves the entry for a URL.
+
+        :param str url: The URL.
+        :rtype: :class:`~cardisco.cache.CacheEntry` or :const:`None`
+        '''
+        return self.get_many([url]).get(url)
+
+    def get_many(self, urls):
+        '''Retrieves the entries for a number of URLs at once.
+
+        :param urls: The URLs.
+        :type urls: an iterable of :class:`str`
+        :returns: A dictionary, where the key is the URL and the value is
+                  its :class:`~cardisco.cache.CacheEntry`. URLs without a
+                  (fresh) entry are left out.
+        :rtype: :class:`dict`
+        '''
+        entries = {}
+        now = time()
+        for chunk in _chunks(urls, CHUNK_SIZE):
+            keys = dict((_text(url), url) for url in chunk)
+            for url, fetched, etag, last_modified, result in \
+                    self._fresh(chunk, now):
+                entries[keys[url]] = CacheEntry(
+                    json.loads(result), etag, last_modified, stored=fetched,
+                    size=len(result))
+        return entries
+
+    def missing(self, urls):
+        '''Filters out the URLs which have a (fresh) entry.
+
+        :param urls: The URLs.
+        :type urls: an iterable of :class:`str`
+        :returns: The URLs without an entry, in the same order. They are
+                  looked up :data:`CHUNK_SIZE` at a time, so ``urls`` can be
+                  an arbitrarily long iterator.
+        :rtype: a generator of :class:`str`
+        '''
+        for chunk in _chunks(urls, CHUNK_SIZE):
+            known = set(row[0] for row in self._fresh(chunk, time()))
+            for url in chunk:
+                if _text(url) not in known:
+                    yield url
+
+    def set(self, url, result, etag=None, last_modified=None, ttl=None):
+        '''Stores the discovery result for a URL.
+
+        :param str url: The URL.
+        :param result: The discovery result.
+        :type result: :class:`dict` or
+                      :class:`~cardisco.results.DiscoveryResult`
+        :param etag: The ``ETag`` header of the response.
+        :type etag: :class:`str` or :const:`None`
+        :param last_modified: The ``Last-Modified`` header of the response.
+        :type last_modified: :class:`str` or :const:`None`
+        :param ttl: The number of seconds after which the entry is discarded.
+                    Defaults to the cache's ``ttl``.
+        :type ttl: :class:`int`, :class:`float` or :const:`None`
+        '''
+        self.set_many([(url, result, etag, last_modified)], ttl=ttl)
+
+    def set_many(self, entries, ttl=None):
+        '''Stores a number of discovery results in a single transaction.
+
+        :param entries: ``(url, result, etag, last_modified)`` tuples (see
+                        :meth:`set`).
+        :type entries: an iterable of :class:`tuple` objects
+        :param ttl: See :meth:`set`.
+        :type ttl: :class:`int`, :class:`float` or :const:`None`
+        '''
+        if ttl is None:
+            ttl = self.ttl
+        now = time()
+        expires = None if ttl is None else now + ttl
+        rows = []
+        for url, result, etag, last_modified in entries:
+            if isinstance(result, DiscoveryResult):
+                result = result.to_dict()
+            rows.append((_text(url), now, expires, _text(etag),
+                         _text(last_modified),
+                         json.dumps(result, sort_keys=True)))
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT OR REPLACE INTO results (url, fetched, expires, etag, '
+                'last_modified, result) VALUES (?, ?, ?, ?, ?, ?)', rows)
+            connection.execute('COMMIT')
+        except Exception:
+            # don't leave the transaction open (e.g. if the COMMIT failed
+            # because the database is locked), or the next write fails
+            exc_info = sys.exc_info()
+            try:
+                connection.execute('ROLLBACK')
+            except sqlite3.Error:
+                # SQLite already rolled the transaction back
+                pass
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def delete(self, url):
+        '''Removes the entry for a URL, if there is one.
+
+        :param str url: The URL.
+        '''
+        self._connection().execute('DELETE FROM results WHERE url = ?',
+                                   (_text(url),))
+
+    def purge(self):
+        '''Removes the expired entries.
+
+        :returns: The number of entries removed.
+        :rtype: :class:`int`
+        '''
+        return self._connection().execute(
+            'DELETE FROM results WHERE expires < ?', (time(),)).rowcount
+
+    def clear(self):
+        '''Removes every entry.'''
+        self._connection().execute('DELETE FROM results')
+
+    def close(self):
+        '''Closes the connection of the current thread.'''
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            if self._local.pid == os.getpid():
+                connection.close()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Opt-in instrumentation for discovery calls.
+
+:func:`cardisco.discover`, :func:`cardisco.discover_streaming` and
+:func:`cardisco.parse_html` accept a ``hooks`` object, which is told how long
+each stage of the call took, and is given counters:
+
+* :data:`FETCH`: the HTTP request (the size is the number of bytes read);
+* :data:`DECODE`: sniffing, pre-filtering and reading the document before it
+  is parsed (the size is the document size, if it is known);
+* :data:`BUILD`: building the tree;
+* :data:`PROBE`: probing well-known feed paths, when :func:`cardisco.discover`
+  is given a :class:`~cardisco.probe.Prober` (the size is the number of feed
+  types found);
+* :data:`DISPATCH`: looking up the head links in the table compiled from
+  the discoverers' :class:`~cardisco.base.LinkRule` objects, which is shared
+  by all of them (the size is the number of head links);
+* ``discoverer:<name>`` (see :func:`discoverer_stage`): the time spent in
+  one discoverer's own code, i.e. its own
+  :meth:`~cardisco.base.BaseDiscoverer.check_link_element` or ``xpath``,
+  if it has one, and resolving the links it matched (the size is the number
+  of links it matched);
+* the :data:`BYTES_READ`, :data:`LINKS_EXAMINED` and :data:`LINKS_MATCHED`
+  counters.
+
+When a :class:`~cardisco.memo.HeadMemo` is used, the :data:`MEMO_HITS` and
+:data:`MEMO_MISSES` counters are given, and the dispatch and discoverer
+stages aren't reported. Neither are they for compact results (see
+:mod:`cardisco.results`), which only get the link counters.
+
+:class:`DiscoveryStats` records the stats for a single call, and
+:class:`StatsCollector` aggregates them across calls (and threads), for a
+host application to poll.
+'''
+
+from threading import Lock
+from timeit import default_timer
+
+FETCH = 'fetch'
+DECODE = 'decode'
+BUILD = 'build'
+DISPATCH = 'dispatch'
+PROBE = 'probe'
+
+BYTES_READ = 'bytes_read'
+LINKS_EXAMINED = 'links_examined'
+LINKS_MATCHED = 'links_matched'
+MEMO_HITS = 'memo_hits'
+MEMO_MISSES = 'memo_misses'
+
+#: The clock used for the timings.
+clock = default_timer
+
+
+def discoverer_stage(name):
+    '''Returns the stage name used for a discoverer.
+
+    :param str name: The name (MIME type) the discoverer is registered as.
+    :rtype: :class:`str`
+    '''
+    return 'discoverer:%s' % name
+
+
+class Hooks(object):
+    '''The hook interface. Every method does nothing, so subclasses only need
+    to override the ones they're interested in.
+    '''
+
+    def stage(self, name, seconds, size=None):
+        '''Called when a stage of a discovery call has finished.
+
+        :param str name: The name of the stage.
+        :param float seconds: How long the stage took.
+        :param size: The size of the stage's input, if it is known.
+        :type size: :class:`int` or :const:`None`
+        '''
+
+    def count(self, name, value=1):
+        '''Called to increment a counter.
+
+        :param str name: The name of the counter.
+        :param int value: The amount to increment it by.
+        '''
+
+
+class CombinedHooks(Hooks):
+    '''Passes everything on to several hook objects.
+
+    :param hooks: The hook objects.
+    :type hooks: a collection of :class:`Hooks`
+    '''
+
+    def __init__(self, *hooks):
+        self.hooks = hooks
+
+    def stage(self, name, seconds, size=None):
+        for hooks in self.hooks:
+            hooks.stage(name, seconds, size)
+
+    def count(self, name, value=1):
+        for hooks in self.hooks:
+            hooks.count(name, value)
+
+
+class DiscoveryStats(Hooks):
+    '''The stats for a single discovery call.'''
+
+    def __init__(self):
+        #: A dictionary, where the key is the stage name and the value is a
+        #: ``(seconds, size)`` tuple.
+        self.stages = {}
+        #: A dictionary of counters.
+        self.counters = {}
+
+    def stage(self, name, seconds, size=None):
+        self.stages[name] = (seconds, size)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+class StatsCollector(Hooks):
+    '''Aggregates stats across discovery calls. It is thread-safe, and cheap
+    enough to be left on permanently.
+    '''
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stages = {}
+        self._counters = {}
+
+    def stage(self, name, seconds, size=None):
+        with self._lock:
+            totals = self._stages.get(name)
+            if totals is None:
+                totals = self._stages[name] = [0, 0.0, 0.0, 0]
+            totals[0] += 1
+            totals[1] += seconds
+            if seconds > totals[2]:
+                totals[2] = seconds
+            if size is not None:
+                totals[3] += size
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def _snapshot(self):
+        stages = {}
+        for name, (calls, seconds, max_seconds, size) in \
+                self._stages.iteritems():
+            stages[name] = {
+                'calls': calls,
+                'seconds': seconds,
+                'max_seconds': max_seconds,
+                'size': size,
+            }
+        return {
+            'stages': stages,
+            'counters': dict(self._counters),
+        }
+
+    def snapshot(self, reset=False):
+        '''Returns the stats collected so far.
+
+        :param bool reset: Whether to start again from zero (atomically).
+        :returns: A dictionary with a ``stages`` dictionary (where each stage
+                  has the number of ``calls``, the total ``seconds``, the
+                  ``max_seconds`` and the total ``size``) and a ``counters``
+                  dictionary.
+        :rtype: :class:`dict`
+        '''
+        with self._lock:
+            snapshot = self._snapshot()
+            if reset:
+                self._stages.clear()
+                self._counters.clear()
+        return snapshot
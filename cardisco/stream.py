@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Streamed discovery, which stops downloading a document once its head has
+been parsed.
+
+:func:`cardisco.discover` uses :mod:`httplib2`, which reads the whole
+response body into memory before it is parsed. The functions in this module
+read the response in chunks instead, feed them to the head-only parser
+(see :mod:`cardisco.head`), and close the connection as soon as the head is
+complete (or a byte limit is reached).
+'''
+
+import httplib
+from urlparse import urljoin, urlsplit
+
+#: The default maximum number of bytes read from a response body.
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+REDIRECT_CODES = frozenset([301, 302, 303, 307, 308])
+
+
+class StreamedResponse(object):
+    '''A file-like HTTP response, which stops returning data after a given
+    number of bytes.
+
+    :param connection: The connection the response was received on.
+    :type connection: :class:`httplib.HTTPConnection`
+    :param response: The response.
+    :type response: :class:`httplib.HTTPResponse`
+    :param str url: The URL that the response was retrieved from.
+    :param max_bytes: The maximum number of bytes to read from the body.
+    :type max_bytes: :class:`int` or :const:`None`
+    '''
+
+    def __init__(self, connection, response, url, max_bytes=None):
+        self.connection = connection
+        self.response = response
+        self.url = url
+        self.status = response.status
+        self.headers = dict(response.getheaders())
+        self.max_bytes = max_bytes
+        #: The number of body bytes read so far.
+        self.bytes_read = 0
+        #: Whether the body was cut short because of ``max_bytes``.
+        self.truncated = False
+
+    def read(self, size=-1):
+        if self.max_bytes is not None:
+            remaining = self.max_bytes - self.bytes_read
+            if remaining <= 0:
+                if not self.response.isclosed():
+                    self.truncated = True
+                return ''
+            if size < 0 or size > remaining:
+                size = remaining
+        if size < 0:
+            data = self.response.read()
+        else:
+            data = self.response.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        '''Closes the connection, discarding the rest of the response.'''
+        # The response holds its own reference to the socket, which would
+        # otherwise stay open until the response is garbage collected.
+        self.response.close()
+        self.connection.close()
+
+
+class _PrefixedReader(object):
+    '''A file-like object which returns some already-read data, followed by
+    the rest of another file-like object.
+    '''
+
+    def __init__(self, prefix, file_obj):
+        self.prefix = prefix
+        self.file_obj = file_obj
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.file_obj.read(size)
+        if size < 0:
+            data = self.prefix + self.file_obj.read()
+            self.prefix = ''
+        elif size == 0:
+            data = ''
+        else:
+            data = self.prefix[:size]
+            self.prefix = self.prefix[size:]
+        return data
+
+
+def _read_prefix(file_obj, size):
+    chunks = []
+    while size > 0:
+        data = file_obj.read(size)
+        if not data:
+            break
+        chunks.append(data)
+        size -= len(data)
+    return ''.join(chunks)
+
+
+def fetch(url, headers=None, timeout=DEFAULT_TIMEOUT,
+          max_bytes=DEFAULT_MAX_BYTES, method='GET'):
+    '''Makes a ``GET`` (or ``HEAD``) request, following redirects, without
+    reading the response body.
+
+    :param str url: The URL to retrieve.
+    :param headers: Extra request headers.
+    :type headers: :class:`dict` or :const:`None`
+    :param timeout: The socket timeout, in seconds.
+    :type timeout: :class:`int`, :class:`float` or :const:`None`
+    :param max_bytes: The maximum number of bytes to read from the body.
+    :type max_bytes: :class:`int` or :const:`None`
+    :param str method: The request method.
+    :returns: The response, which must be closed by the caller.
+    :rtype: :class:`StreamedResponse`
+    '''
+    for i in xrange(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme == 'https':
+            connection_type = httplib.HTTPSConnection
+        elif parts.scheme == 'http':
+            connection_type = httplib.HTTPConnection
+        else:
+            raise ValueError('Unsupported URL: %s' % url)
+        path = parts.path or '/'
+        if parts.query:
+            path = '%s?%s' % (path, parts.query)
+        connection = connection_type(parts.netloc.rsplit('@', 1)[-1],
+                                     timeout=timeout)
+        try:
+            connection.request(method, path, headers=headers or {})
+            response = connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+        location = response.getheader('location')
+        if response.status not in REDIRECT_CODES or not location:
+            return StreamedResponse(connection, response, url,
+                                    max_bytes=max_bytes)
+        connection.close()
+        url = urljoin(url, location)
+    raise httplib.HTTPException('Too many redirects')
+
+
+def discover_streaming(url, headers=None, timeout=DEFAULT_TIMEOUT,
+                       max_bytes=DEFAULT_MAX_BYTES, cache=None, hooks=None,
+                       compact=False):
+    '''Discovers various metadata URLs embedded in an HTML document, such
+    as feeds and RDF, reading only as much of the document as is needed.
+
+    :param str url: The URL to retrieve the HTML document from.
+    :param headers: Extra request headers.
+    :type headers: :class:`dict` or :const:`None`
+    :param timeout: The socket timeout, in seconds.
+    :type timeout: :class:`int`, :class:`float` or :const:`None`
+    :param max_bytes: The maximum number of bytes to read from the body.
+    :type max_bytes: :class:`int` or :const:`None`
+    :param cache: The cache used to avoid downloading and parsing unchanged
+                  documents.
+    :type cache: :class:`cardisco.cache.DiscoveryCache` or :const:`None`
+    :param hooks: The object that timings and counters are reported to. The
+                  ``fetch`` stage only covers the request and the response
+                  headers, since the body is read while it is parsed. See
+                  :mod:`cardisco.stats`.
+    :type hooks: :class:`cardisco.stats.Hooks` or :const:`None`
+    :param bool compact: Whether to return a
+                         :class:`~cardisco.results.DiscoveryResult` instead
+                         of a dictionary. See :mod:`cardisco.results`.
+    :returns: A dictionary, where the key is the URL's MIME type and the value
+              is a dictionary of URL-title pairs.
+    :rtype: :class:`dict` or :class:`~cardisco.results.DiscoveryResult`
+    '''
+    from . import (_cached_result, _empty_result, _feed_result, HTTP_ACCEPT,
+                   MODULES, parse_html)
+    from .encoding import charset_label
+    from .sniff import sniff, SNIFF_LENGTH
+    from .stats import BYTES_READ, clock, FETCH
+
+    headers = dict(headers or {})
+    headers['Accept'] = HTTP_ACCEPT
+    entry = None
+    if cache is not None:
+        entry = cache.get(url)
+        if entry is not None:
+            headers.update(entry.conditional_headers())
+    if hooks is not None:
+        start = clock()
+    response = fetch(url, headers=headers, timeout=timeout,
+                     max_bytes=max_bytes)
+    if hooks is not None:
+        hooks.stage(FETCH, clock() - start)
+    try:
+        if entry is not None and response.status == 304:
+            return _cached_result(entry.result, compact)
+        prefix = _read_prefix(response, SNIFF_LENGTH)
+        content_type = response.headers.get('content-type')
+        mime_type = sniff(content_type, prefix)
+        if mime_type in MODULES:
+            result = _feed_result(mime_type, url, compact)
+        elif mime_type is None:
+            result = _empty_result(compact)
+        else:
+            result = parse_html(_PrefixedReader(prefix, response), url=url,
+                                head_only=True, hooks=hooks, compact=compact,
+                                encoding=charset_label(content_type))
+    finally:
+        response.close()
+        if hooks is not None:
+            hooks.count(BYTES_READ, response.bytes_read)
+    if cache is not None and response.status == 200:
+        etag = response.headers.get('etag')
+        last_modified = response.headers.get('last-modified')
+        if etag or last_modified or cache.store_unvalidated:
+            cache.set(url, result, etag, last_modified)
+    return result
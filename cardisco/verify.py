@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Checks that discovered URLs actually point to feeds (or the other metadata
+documents in :data:`cardisco.MODULES`).
+
+Discovered links are often dead, redirect somewhere else, or serve an HTML
+page. :class:`FeedVerifier` requests each URL, and only reads the first
+:data:`~cardisco.sniff.SNIFF_LENGTH` bytes of the response (with a ranged
+``GET``), which are sniffed for ``<rss``, ``<feed`` or ``<rdf:RDF`` (see
+:func:`cardisco.sniff.sniff_feed`). Alternatively, a ``HEAD`` request can
+be tried first, and its ``Content-Type`` trusted when it is a feed type.
+
+The URLs are requested concurrently, by a bounded pool of threads, with a
+limit on the number of concurrent requests to each host. Each URL is only
+requested once per batch, however many pages link to it, and the verdicts
+can be kept in a :class:`VerdictCache` between batches::
+
+    results = list(cardisco.discover_many(urls))
+    verifier = FeedVerifier(cache=VerdictCache(ttl=3600))
+    for url, result in verify_results(results, verifier):
+        ...
+'''
+
+from collections import deque, OrderedDict
+from threading import Condition, Lock, Thread
+from time import time
+from urlparse import urlsplit
+
+from .results import DiscoveryResult
+from .sniff import looks_like_html, mime_type_essence, sniff_feed, \
+    SNIFF_LENGTH
+from .stream import DEFAULT_TIMEOUT, fetch
+
+GET = 'GET'
+HEAD = 'HEAD'
+
+
+class Verdict(object):
+    '''The outcome of checking a URL.
+
+    :param str url: The URL which was checked.
+    :param mime_type: The type of the document (one of the names in
+                      :data:`cardisco.MODULES`), or :const:`None` if it's
+                      not a feed (or it couldn't be retrieved).
+    :type mime_type: :class:`str` or :const:`None`
+    :param status: The HTTP status code of the (final) response.
+    :type status: :class:`int` or :const:`None`
+    :param final_url: The URL after following redirects.
+    :type final_url: :class:`str` or :const:`None`
+    :param error: The error which prevented the URL from being checked.
+    :type error: :class:`str` or :const:`None`
+    :param float checked: When the URL was checked (a UNIX timestamp).
+    '''
+
+    def __init__(self, url, mime_type=None, status=None, final_url=None,
+                 error=None, checked=None):
+        self.url = url
+        self.mime_type = mime_type
+        self.status = status
+        self.final_url = final_url or url
+        self.error = error
+        self.checked = time() if checked is None else checked
+
+    def __repr__(self):
+        return 'Verdict(%r, mime_type=%r, status=%r, final_url=%r, ' \
+               'error=%r)' % (self.url, self.mime_type, self.status,
+                              self.final_url, self.error)
+
+    @property
+    def ok(self):
+        '''Whether the URL points to a feed.'''
+        return self.mime_type is not None
+
+    @property
+    def redirected(self):
+        '''Whether the URL redirects to another URL.'''
+        return self.final_url != self.url
+
+
+class VerdictCache(object):
+    '''An in-memory, thread-safe LRU cache of verdicts.
+
+    :param ttl: The number of seconds after which a verdict is discarded.
+    :type ttl: :class:`int`, :class:`float` or :const:`None`
+    :param int max_entries: The maximum number of cached URLs.
+    '''
+
+    def __init__(self, ttl=3600, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, url):
+        '''Retrieves the verdict for a URL, unless it has expired.
+
+        :param str url: The URL.
+        :rtype: :class:`Verdict` or :const:`None`
+        '''
+        with self._lock:
+            verdict = self._entries.pop(url, None)
+            if verdict is None:
+                return None
+            if self.ttl is not None and verdict.checked + self.ttl < time():
+                return None
+            self._entries[url] = verdict
+            return verdict
+
+    def set(self, verdict):
+        '''Stores a verdict, evicting the least recently used ones if the
+        cache is full.
+
+        :param verdict: The verdict.
+        :type verdict: :class:`Verdict`
+        '''
+        with self._lock:
+            self._entries.pop(verdict.url, None)
+            self._entries[verdict.url] = verdict
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        '''Removes every verdict.'''
+        with self._lock:
+            self._entries.clear()
+
+
+def _feed_type(content_type, prefix):
+    from . import MODULES
+
+    mime_type = sniff_feed(prefix)
+    if mime_type is not None:
+        return mime_type
+    essence = mime_type_essence(content_type)
+    if essence in MODULES and prefix.strip() and \
+       not looks_like_html(prefix):
+        # e.g. OpenSearch descriptions, which sniff_feed() doesn't know
+        return essence
+    return None
+
+
+def check_url(url, method=GET, headers=None, timeout=DEFAULT_TIMEOUT):
+    '''Checks whether a URL points to a feed.
+
+    :param str url: The URL.
+    :param str method: :data:`GET` to sniff the first bytes of the response,
+                       or :data:`HEAD` to try a ``HEAD`` request first, and
+                       only fall back to a ranged ``GET`` if its
+                       ``Content-Type`` isn't a feed type.
+    :param headers: Extra request headers.
+    :type headers: :class:`dict` or :const:`None`
+    :param timeout: The socket timeout, in seconds.
+    :type timeout: :class:`int`, :class:`float` or :const:`None`
+    :rtype: :class:`Verdict`
+    '''
+    from . import HTTP_ACCEPT, MODULES
+
+    headers = dict(headers or {})
+    headers['Accept'] = HTTP_ACCEPT
+    try:
+        if method == HEAD:
+            response = fetch(url, headers=headers, timeout=timeout,
+                             max_bytes=0, method=HEAD)
+            response.close()
+            essence = mime_type_essence(response.headers.get('content-type'))
+            if response.status == 200 and essence in MODULES:
+                return Verdict(url, essence, response.status, response.url)
+        headers['Range'] = 'bytes=0-%d' % (SNIFF_LENGTH - 1)
+        response = fetch(url, headers=headers, timeout=timeout,
+                         max_bytes=SNIFF_LENGTH)
+        try:
+            prefix = response.read()
+        finally:
+            response.close()
+    except Exception as e:
+        return Verdict(url, error='%s: %s' % (type(e).__name__, e))
+    mime_type = None
+    if response.status in (200, 206):
+        mime_type = _feed_type(response.headers.get('content-type'), prefix)
+    return Verdict(url, mime_type, response.status, response.url)
+
+
+def _host(url):
+    return urlsplit(url).netloc.lower()
+
+
+class FeedVerifier(object):
+    '''Checks URLs concurrently.
+
+    :param int workers: The maximum number of concurrent requests.
+    :param int per_host: The maximum number of concurrent requests to the
+                         same host.
+    :param str method: See :func:`check_url`.
+    :param cache: The cache that verdicts are looked up in, and stored in.
+    :type cache: :class:`VerdictCache` or :const:`None`
+    :param timeout: The socket timeout, in seconds.
+    :type timeout: :class:`int`, :class:`float` or :const:`None`
+    :param headers: Extra request headers.
+    :type headers: :class:`dict` or :const:`None`
+    '''
+
+    def __init__(self, workers=10, per_host=2, method=GET, cache=None,
+                 timeout=DEFAULT_TIMEOUT, headers=None):
+        self.workers = workers
+        self.per_host = per_host
+        self.method = method
+        self.cache = cache
+        self.timeout = timeout
+        self.headers = headers
+
+    def verify(self, urls):
+        '''Checks URLs (each one only once).
+
+        :param urls: The URLs.
+        :type urls: an iterable of :class:`str`
+        :returns: A dictionary, where the key is the URL and the value is its
+                  :class:`Verdict`.
+        :rtype: :class:`dict`
+        '''
+        verdicts = {}
+        queues = OrderedDict()
+        for url in urls:
+            if url in verdicts:
+                continue
+            verdict = None
+            if self.cache is not None:
+                verdict = self.cache.get(url)
+            verdicts[url] = verdict
+            if verdict is None:
+                queues.setdefault(_host(url), deque()).append(url)
+        if queues:
+            self._run(queues, verdicts)
+        return verdicts
+
+    def _run(self, queues, verdicts):
+        condition = Condition()
+        active = dict((host, 0) for host in queues)
+
+        def next_url():
+            with condition:
+                while queues:
+                    for host, queue in queues.iteritems():
+                        if active[host] < self.per_host:
+                            url = queue.popleft()
+                            if not queue:
+                                del queues[host]
+                            active[host] += 1
+                            return host, url
+                    condition.wait()
+                return None, None
+
+        def work():
+            while True:
+                host, url = next_url()
+                if url is None:
+                    return
+                try:
+                    verdict = check_url(url, method=self.method,
+                                        headers=self.headers,
+                                        timeout=self.timeout)
+                    if self.cache is not None:
+                        self.cache.set(verdict)
+                    verdicts[url] = verdict
+                finally:
+                    with condition:
+                        active[host] -= 1
+                        condition.notify_all()
+
+        total = sum(len(queue) for queue in queues.itervalues())
+        threads = [Thread(target=work)
+                   for i in xrange(min(self.workers, total))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def result_links(result):
+    '''Returns the URLs in a discovery result.
+
+    :param result: The discovery result.
+    :type result: :class:`dict` or
+                  :class:`~cardisco.results.DiscoveryResult`
+    :rtype: :class:`list`
+    '''
+    return [href for links in result.itervalues() for href in links]
+
+
+def verified_result(result, verdicts):
+    '''Removes the URLs which aren't feeds from a discovery result.
+
+    :param result: The discovery result.
+    :type result: :class:`dict` or
+                  :class:`~cardisco.results.DiscoveryResult`
+    :param dict verdicts: The verdicts returned by
+                          :meth:`FeedVerifier.verify`.
+    :returns: A new discovery result, of the same kind.
+    :rtype: :class:`dict` or :class:`~cardisco.results.DiscoveryResult`
+    '''
+    def ok(href):
+        verdict = verdicts.get(href)
+        return verdict is not None and verdict.ok
+
+    if isinstance(result, DiscoveryResult):
+        return DiscoveryResult(result.names,
+                               [link for link in result.links
+                                if ok(link.href)])
+    return dict((name, dict((href, title)
+                            for href, title in links.iteritems()
+                            if ok(href)))
+                for name, links in result.iteritems())
+
+
+def verify_results(results, verifier=None, **kwargs):
+    '''Verifies the URLs in a batch of discovery results, e.g. the ones
+    returned by :func:`cardisco.discover_many`. URLs found on several pages
+    are only checked once.
+
+    :param results: ``(url, result)`` tuples, where ``result`` is a
+                    discovery result, or an exception (which is passed
+                    through).
+    :type results: an iterable of :class:`tuple` objects
+    :param verifier: The verifier. If it's not set, one is created.
+    :type verifier: :class:`FeedVerifier` or :const:`None`
+    :param dict \*\*kwargs: Arguments to :class:`FeedVerifier`, when there is
+                           no verifier.
+    :returns: ``(url, result)`` tuples, in the same order, where the results
+              only contain verified URLs.
+    :rtype: :class:`list`
+    '''
+    if verifier is None:
+        verifier = FeedVerifier(**kwargs)
+    results = list(results)
+    verdicts = verifier.verify(href for url, result in results
+                               if not isinstance(result, Exception)
+                               for href in result_links(result))
+    return [(url, result if isinstance(result, Exception)
+             else verified_result(result, verdicts))
+            for url, result in results]
@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+Discovery over web archives (WARC and ARC files), for documents which have
+already been crawled.
+
+Archives are read as a stream, one record at a time, so their size doesn't
+matter, and they don't need to be seekable (e.g. they can be piped in).
+Compressed archives (a gzip member per record, or one for the whole file)
+are decompressed on the fly. Only ``response`` records containing HTML are
+kept; the target URI of the record is used to resolve relative links, and
+the HTTP headers stored in the record are honored (``Content-Type`` and its
+``charset``, ``Transfer-Encoding: chunked`` and ``Content-Encoding``).
+
+Specifications:
+
+* http://iipc.github.io/warc-specifications/
+* http://archive.org/web/researcher/ArcFileFormat.php
+'''
+
+import codecs
+import zlib
+
+from .encoding import charset_from_content_type
+from .sniff import HTML, sniff, SNIFF_LENGTH
+
+#: The size of the chunks that archives are read in.
+CHUNK_SIZE = 64 * 1024
+#: The default maximum number of (decoded) bytes kept from a response body.
+DEFAULT_MAX_BODY = 1024 * 1024
+#: The maximum length of a header line.
+MAX_LINE = 64 * 1024
+
+_GZIP_MAGIC = '\x1f\x8b'
+_BOMS = (codecs.BOM_UTF8, codecs.BOM_UTF16_BE, codecs.BOM_UTF16_LE)
+
+
+class ArchiveError(Exception):
+    '''Raised when an archive is malformed.'''
+
+
+class _Reader(object):
+    '''A buffered reader over a (possibly multi-member gzip) file, which only
+    ever holds one chunk of it in memory.
+    '''
+
+    def __init__(self, file_obj):
+        self.file_obj = file_obj
+        self.buffer = file_obj.read(CHUNK_SIZE)
+        self.pos = 0
+        self.eof = not self.buffer
+        self.decompressor = None
+        if self.buffer.startswith(_GZIP_MAGIC):
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self.buffer = self._decompress(self.buffer)
+
+    def _decompress(self, data):
+        chunks = [self.decompressor.decompress(data)]
+        while self.decompressor.unused_data:
+            data = self.decompressor.unused_data
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks.append(self.decompressor.decompress(data))
+        return ''.join(chunks)
+
+    def _fill(self):
+        '''Reads at least one more byte into the buffer, unless the end of the
+        file has been reached.
+        '''
+        while not self.eof:
+            data = self.file_obj.read(CHUNK_SIZE)
+            if not data:
+                self.eof = True
+                if self.decompressor is not None:
+                    data = self.decompressor.flush()
+            elif self.decompressor is not None:
+                data = self._decompress(data)
+            if data:
+                self.buffer = self.buffer[self.pos:] + data
+                self.pos = 0
+                return True
+        return False
+
+    def read(self, size):
+        while len(self.buffer) - self.pos < size and self._fill():
+            pass
+        data = self.buffer[self.pos:self.pos + size]
+        self.pos += len(data)
+        return data
+
+    def readline(self, limit=MAX_LINE):
+        while True:
+            end = self.buffer.find('\n', self.pos, self.pos + limit)
+            if end >= 0:
+                end += 1
+                break
+            if len(self.buffer) - self.pos >= limit or not self._fill():
+                end = min(len(self.buffer), self.pos + limit)
+                break
+        data = self.buffer[self.pos:end]
+        self.pos = end
+        return data
+
+
+class _Block(object):
+    '''Reads a record's block (which has a known length) from a reader.'''
+
+    def __init__(self, reader, length):
+        self.reader = reader
+        self.remaining = length
+
+    def read(self, size=CHUNK_SIZE):
+        data = self.reader.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        if size and self.remaining and not data:
+            raise ArchiveError('Truncated record')
+        return data
+
+    def readline(self, limit=MAX_LINE):
+        data = self.reader.readline(min(limit, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def skip(self):
+        while self.remaining > 0:
+            self.read()
+
+
+class ArchivedResponse(object):
+    '''An HTML response stored in an archive.
+
+    :param str url: The target URI of the record.
+    :param int status: The HTTP status code.
+    :param dict headers: The HTTP headers (with lowercase names).
+    :param body: The response body, decoded according to the ``charset`` in
+                 the ``Content-Type`` header, if it has a (known) one.
+    :type body: :class:`str` or :class:`unicode`
+    :param bool truncated: Whether the body was longer than the maximum, and
+                           was cut short.
+    '''
+
+    def __init__(self, url, status, headers, body, truncated=False):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.truncated = truncated
+
+
+def _read_headers(stream):
+    headers = {}
+    name = None
+    while True:
+        line = stream.readline()
+        if not line.strip():
+            return headers
+        if line[0] in ' \t' and name is not None:
+            headers[name] += ' ' + line.strip()
+            continue
+        name, sep, value = line.partition(':')
+        if not sep:
+            name = None
+            continue
+        name = name.strip().lower()
+        headers[name] = value.strip()
+
+
+def _chunked(block):
+    '''Decodes a body with ``Transfer-Encoding: chunked``.'''
+    while True:
+        line = block.readline()
+        try:
+            size = int(line.split(';', 1)[0].strip(), 16)
+        except ValueError:
+            return
+        if size == 0:
+            return
+        while size > 0:
+            data = block.read(min(size, CHUNK_SIZE))
+            if not data:
+                return
+            size -= len(data)
+            yield data
+        block.readline()
+
+
+def _identity(block):
+    while True:
+        data = block.read()
+        if not data:
+            return
+        yield data
+
+
+def _decompressed(chunks, encoding):
+    if encoding == 'deflate':
+        wbits = zlib.MAX_WBITS
+    else:
+        wbits = 16 + zlib.MAX_WBITS
+    decompressor = zlib.decompressobj(wbits)
+    first = True
+    for data in chunks:
+        if first and wbits == zlib.MAX_WBITS:
+            try:
+                data = decompressor.decompress(data)
+            except zlib.error:
+                # some servers send raw deflate streams, not zlib ones
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                data = decompressor.decompress(data)
+        else:
+            data = decompressor.decompress(data)
+        first = False
+        yield data
+
+
+def _body_chunks(block, headers):
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        chunks = _chunked(block)
+    else:
+        chunks = _identity(block)
+    encoding = headers.get('content-encoding', '').strip().lower()
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        chunks = _decompressed(chunks, encoding)
+    return chunks
+
+
+def _read_response(url, block, max_body):
+    status_line = block.readline()
+    if not status_line.startswith('HTTP/'):
+        return None
+    try:
+        status = int(status_line.split(None, 2)[1])
+    except (IndexError, ValueError):
+        return None
+    headers = _read_headers(block)
+    content_type = headers.get('content-type')
+    chunks = []
+    size = 0
+    sniffed = truncated = False
+    try:
+        for data in _body_chunks(block, headers):
+            chunks.append(data)
+            size += len(data)
+            if not sniffed and size >= SNIFF_LENGTH:
+                # don't bother reading the rest of images and so on
+                if sniff(content_type, ''.join(chunks)) != HTML:
+                    return None
+                sniffed = True
+            if size > max_body:
+                truncated = True
+                break
+    except zlib.error:
+        return None
+    body = ''.join(chunks)
+    if not sniffed and sniff(content_type, body) != HTML:
+        return None
+    if truncated:
+        body = body[:max_body]
+    charset = charset_from_content_type(content_type)
+    if charset is not None and not body.startswith(_BOMS):
+        body = body.decode(charset, 'replace')
+    return ArchivedResponse(url, status, headers, body, truncated=truncated)
+
+
+def iter_responses(file_obj, max_body=DEFAULT_MAX_BODY):
+    '''Iterates over the HTML responses in a WARC or ARC archive.
+
+    :param file_obj: The archive (optionally gzip-compressed), or its path.
+    :type file_obj: a file-like object or :class:`str`
+    :param int max_body: The maximum number of (decoded) bytes to keep from
+                         each response body.
+    :rtype: a generator of :class:`ArchivedResponse` objects
+    '''
+    if isinstance(file_obj, basestring):
+        with open(file_obj, 'rb') as f:
+            for response in iter_responses(f, max_body=max_body):
+                yield response
+        return
+    reader = _Reader(file_obj)
+    while True:
+        line = reader.readline()
+        if not line:
+            return
+        line = line.strip()
+        if not line:
+            # the blank lines between records
+            continue
+        if line.startswith('WARC/'):
+            headers = _read_headers(reader)
+            try:
+                length = int(headers.get('content-length', ''))
+            except ValueError:
+                raise ArchiveError('Invalid Content-Length')
+            url = headers.get('warc-target-uri', '').strip('<>')
+            is_response = headers.get('warc-type') == 'response' and \
+                headers.get('content-type', '').startswith('application/http')
+        else:
+            fields = line.split()
+            try:
+                length = int(fields[-1])
+            except (IndexError, ValueError):
+                raise ArchiveError('Invalid record header: %r' % line[:100])
+            url = fields[0]
+            is_response = not url.startswith('filedesc:')
+        block = _Block(reader, length)
+        response = None
+        if is_response:
+            response = _read_response(url, block, max_body)
+        block.skip()
+        if response is not None:
+            yield response
+
+
+def documents(file_obj, max_body=DEFAULT_MAX_BODY):
+    '''Iterates over the HTML responses in an archive, as ``(body, url)``
+    tuples, which can be passed to
+    :meth:`cardisco.executor.ParseExecutor.map`.
+
+    :param file_obj: See :func:`iter_responses`.
+    :param int max_body: See :func:`iter_responses`.
+    :rtype: a generator of :class:`tuple` objects
+    '''
+    for response in iter_responses(file_obj, max_body=max_body):
+        yield response.body, response.url
+
+
+def discover_archive(file_obj, executor=None, max_body=DEFAULT_MAX_BODY,
+                     **kwargs):
+    '''Discovers the metadata URLs in the HTML responses of an archive.
+
+    :param file_obj: See :func:`iter_responses`.
+    :param executor: The executor that parses the documents in parallel. If
+                     it's not set, they're parsed in this process.
+    :type executor: :class:`cardisco.executor.ParseExecutor` or
+                    :const:`None`
+    :param int max_body: See :func:`iter_responses`.
+    :param dict \*\*kwargs: Extra arguments to :func:`cardisco.parse_html`,
+                           when there is no executor.
+    :returns: ``(url, result)`` tuples, where ``result`` is the discovery
+              result dictionary, or the exception raised while parsing the
+              document. They are in the same order as in the archive.
+    :rtype: a generator of :class:`tuple` objects
+    '''
+    from . import parse_html
+    from .executor import expand
+
+    docs = documents(file_obj, max_body=max_body)
+    if executor is not None:
+        for idx, url, links in executor.map(docs):
+            if isinstance(links, Exception):
+                yield url, links
+            else:
+                yield url, expand(links)
+        return
+    for body, url in docs:
+        try:
+            yield url, parse_html(body, url=url, **kwargs)
+        except Exception as e:
+            yield url, e
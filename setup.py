@@ -7,8 +7,15 @@ setup(name='cardisco',
       version='1.0',
       description='HTML Autodiscovery Library',
       author='Mark Lee',
-      packages=find_packages(),
+      packages=find_packages(exclude=['benchmarks']),
       install_requires=[
           'html5lib',
           'httplib2',
-      ])
+          'lxml',
+          'webencodings',
+      ],
+      entry_points={
+          'console_scripts': [
+              'cardisco = cardisco.cli:main',
+          ],
+      })
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+'''\
+A local HTTP server, which stands in for real websites in the tests.
+'''
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from threading import Thread
+import time
+
+
+class Page(object):
+    '''A canned response.
+
+    :param str body: The response body.
+    :param int status: The HTTP status code.
+    :param dict headers: The response headers. Defaults to an HTML
+                         ``Content-Type``.
+    :param delay: The number of seconds to wait before responding.
+    :type delay: :class:`int` or :class:`float`
+    '''
+
+    def __init__(self, body='', status=200, headers=None, delay=0):
+        self.body = body
+        self.status = status
+        if headers is None:
+            headers = {'Content-Type': 'text/html'}
+        self.headers = headers
+        self.delay = delay
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self._respond()
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def _respond(self, body=True):
+        self.server.requests.append((self.path, dict(self.headers)))
+        self.server.methods.append(self.command)
+        self.server.clients.append(self.client_address)
+        page = self.server.pages.get(self.path.split('?', 1)[0])
+        if page is None:
+            page = Page('Not Found', status=404)
+        if callable(page):
+            page = page(self)
+        if page.delay:
+            time.sleep(page.delay)
+        self.send_response(page.status)
+        for name, value in page.headers.iteritems():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(page.body)))
+        self.end_headers()
+        if not body:
+            return
+        try:
+            self.wfile.write(page.body)
+        except IOError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _KeepAliveHandler(_Handler):
+    protocol_version = 'HTTP/1.1'
+    # idle connections are closed, so that the server can shut down
+    timeout = 0.5
+
+
+class LocalServer(ThreadingMixIn, HTTPServer):
+    '''Serves a dictionary of paths to :class:`Page` objects (or callables
+    which accept the request handler and return a :class:`Page`) on a random
+    local port. Use as a context manager.
+
+    :param dict pages: The pages.
+    :param bool keep_alive: Whether to keep connections open between
+                            requests (i.e. to speak HTTP/1.1).
+    '''
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, pages, keep_alive=False):
+        handler = _KeepAliveHandler if keep_alive else _Handler
+        HTTPServer.__init__(self, ('127.0.0.1', 0), handler)
+        self.pages = pages
+        self.requests = []
+        self.methods = []
+        self.clients = []
+        self.threads = []
+
+    def url(self, path):
+        return 'http://127.0.0.1:%d%s' % (self.server_address[1], path)
+
+    def process_request(self, request, client_address):
+        # ThreadingMixIn doesn't keep track of its threads, which would then
+        # still be running when the interpreter shuts down.
+        thread = Thread(target=self.process_request_thread,
+                        args=(request, client_address))
+        thread.daemon = True
+        self.threads.append(thread)
+        thread.start()
+
+    def handle_error(self, request, client_address):
+        # clients which time out on purpose aren't interesting.
+        pass
+
+    def __enter__(self):
+        thread = Thread(target=self.serve_forever, kwargs={
+            'poll_interval': 0.01,
+        })
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        for thread in self.threads:
+            thread.join(5)
+        self.server_close()
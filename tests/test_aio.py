@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncore
+from cardisco import HTTP_ACCEPT
+from cardisco.aio import AsyncDiscoverer, AsyncoreTransport, Response, \
+    Transport, discover_async
+from local_server import LocalServer, Page
+import socket
+from test_base import MINIMAL_HTML
+from threading import Timer
+from time import sleep
+from unittest2 import TestCase
+
+PAGES = {
+    '/a/page': Page(MINIMAL_HTML),
+    '/feed': Page('', headers={'Content-Type': 'application/atom+xml'}),
+    '/moved': Page(status=301, headers={'Location': '/a/page'}),
+    '/slow': Page(MINIMAL_HTML, delay=1),
+    '/big': Page(MINIMAL_HTML + 'x' * (4 * 1024 * 1024)),
+}
+
+
+class FakeTransport(Transport):
+    '''Completes every request on the next poll.'''
+
+    def __init__(self):
+        self.requests = []
+
+    def request(self, url, headers, callback, socket_map):
+        self.requests.append((url, headers, callback))
+        return self
+
+    def cancel(self):
+        pass
+
+    def respond(self):
+        requests, self.requests = self.requests, []
+        for url, headers, callback in requests:
+            callback(Response(200, {'content-type': 'text/html'},
+                              MINIMAL_HTML), None)
+
+
+class ThreadedTransport(Transport):
+    '''Completes every request from another thread, without using the socket
+    map.
+    '''
+
+    def request(self, url, headers, callback, socket_map):
+        timer = Timer(0.2, callback, (Response(200, {}, ''), None))
+        timer.start()
+        return timer
+
+
+class DiscoverAsyncTestCase(TestCase):
+    '''Tests event-driven discovery against a local HTTP server.'''
+
+    def test_discover_async(self):
+        with LocalServer(PAGES) as server:
+            urls = [server.url(path) for path in ['/a/page', '/feed']]
+            results = dict(discover_async(urls))
+            self.assertEqual(server.requests[0][1]['accept'], HTTP_ACCEPT)
+        self.assertEqual(results[urls[0]]['application/rss+xml'], {
+            server.url('/a/foo.rss'): None,
+        })
+        self.assertEqual(results[urls[1]], {
+            'application/atom+xml': {
+                urls[1]: None,
+            },
+        })
+
+    def test_redirect(self):
+        with LocalServer(PAGES) as server:
+            url = server.url('/moved')
+            results = list(discover_async([url]))
+        self.assertEqual(results[0][0], url)
+        self.assertEqual(results[0][1]['application/atom+xml'], {
+            server.url('/foo.atom'): None,
+        })
+
+    def test_timeout(self):
+        with LocalServer(PAGES) as server:
+            urls = [server.url('/slow'), server.url('/a/page')]
+            results = dict(discover_async(urls, timeout=0.3))
+        self.assertIsInstance(results[urls[0]], socket.timeout)
+        self.assertIn('application/rss+xml', results[urls[1]])
+
+    def test_connection_error(self):
+        with LocalServer(PAGES) as server:
+            url = server.url('/a/page')
+        results = list(discover_async([url, 'ftp://example.com/']))
+        self.assertEqual(len(results), 2)
+        for url, result in results:
+            self.assertIsInstance(result, Exception)
+
+    def test_many(self):
+        with LocalServer(PAGES) as server:
+            urls = [server.url('/a/page?%d' % i) for i in range(200)]
+            results = list(discover_async(urls, concurrency=50))
+        self.assertEqual(sorted(url for url, result in results),
+                         sorted(urls))
+        for url, result in results:
+            self.assertEqual(len(result['application/atom+xml']), 1)
+
+    def test_max_bytes(self):
+        responses = []
+        transport = AsyncoreTransport(max_bytes=1000)
+        socket_map = {}
+        with LocalServer(PAGES) as server:
+            transport.request(server.url('/big'), {},
+                              lambda response, error: responses.append(
+                                  (response, error)), socket_map)
+            while socket_map:
+                asyncore.loop(timeout=0.05, map=socket_map, count=1)
+            transport.close()
+            url = server.url('/big')
+            results = dict(discover_async([url]))
+        response, error = responses[0]
+        self.assertIsNone(error)
+        self.assertEqual(response.body, (MINIMAL_HTML + 'x' * 1000)[:1000])
+        self.assertIn('application/rss+xml', results[url])
+
+    def test_no_socket_map(self):
+        polls = []
+        discoverer = AsyncDiscoverer(transport=ThreadedTransport())
+        discoverer.discover('http://a/', lambda url, result: None)
+        original = discoverer.poll
+        discoverer.poll = lambda: polls.append(original())
+        discoverer.run()
+        discoverer.close()
+        # the loop waits between polls instead of spinning
+        self.assertLess(len(polls), 20)
+
+    def test_concurrency_limit(self):
+        transport = FakeTransport()
+        discoverer = AsyncDiscoverer(transport=transport, concurrency=3)
+        results = []
+        for i in range(10):
+            discoverer.discover('http://a/%d' % i,
+                                lambda url, result: results.append(url))
+        self.assertEqual(len(transport.requests), 3)
+        while discoverer.pending():
+            transport.respond()
+            discoverer.poll()
+            self.assertLessEqual(len(transport.requests), 3)
+        discoverer.close()
+        self.assertEqual(len(results), 10)
+
+
+class ResolverTestCase(TestCase):
+    '''Tests that host names are resolved off the event loop.'''
+
+    def setUp(self):
+        getaddrinfo = socket.getaddrinfo
+
+        def fake_getaddrinfo(host, port, *args):
+            if host.endswith('.invalid') and len(args) < 4:
+                if host.startswith('slow.'):
+                    sleep(0.5)
+                elif host.startswith('missing.'):
+                    raise socket.gaierror(socket.EAI_NONAME, 'Unknown host')
+                host = '127.0.0.1'
+            return getaddrinfo(host, port, *args)
+
+        socket.getaddrinfo = fake_getaddrinfo
+        self.addCleanup(setattr, socket, 'getaddrinfo', getaddrinfo)
+
+    def urls(self, server, *hosts):
+        port = server.server_address[1]
+        return ['http://%s:%d/a/page' % (host, port) for host in hosts]
+
+    def test_slow_resolution(self):
+        with LocalServer(PAGES) as server:
+            urls = self.urls(server, 'slow.invalid', 'fast.invalid')
+            results = list(discover_async(urls))
+        self.assertEqual([url for url, result in results], urls[::-1])
+        for url, result in results:
+            self.assertIn('application/rss+xml', result)
+
+    def test_resolution_timeout(self):
+        with LocalServer(PAGES) as server:
+            urls = self.urls(server, 'slow.invalid', 'fast.invalid')
+            results = list(discover_async(urls, timeout=0.2))
+        self.assertEqual([url for url, result in results], urls[::-1])
+        self.assertIn('application/rss+xml', results[0][1])
+        self.assertIsInstance(results[1][1], socket.timeout)
+
+    def test_resolution_error(self):
+        with LocalServer(PAGES) as server:
+            urls = self.urls(server, 'missing.invalid')
+            results = list(discover_async(urls))
+        self.assertIsInstance(results[0][1], socket.gaierror)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cardisco import parse_html
+from cardisco.backends import parse_with_lxml, SuspiciousDocument
+from glob import glob
+import os
+from StringIO import StringIO
+from test_atom import HTML5_TEMPLATE, SECTION_7_1_REL, SECTION_7_2_TYPE, \
+    SECTION_7_3_PARAMS, SECTION_7_3_TEMPLATE
+from test_engine import MIXED_HTML
+from test_head import LATE_LINK_HTML
+from unittest2 import TestCase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+URL = 'http://www.example.com/a/b'
+
+MALFORMED_HTML = [
+    LATE_LINK_HTML,
+    # html5lib ends the head at <header>, libxml2 doesn't.
+    '''<head><header>x</header>
+<link href=a.rss rel=alternate type=application/rss+xml></head>''',
+    # text in the head ends it, too.
+    '''<head>some text
+<link href=a.rss rel=alternate type=application/rss+xml></head>''',
+    '''<head><!-- <link href=a.rss rel=alternate
+type=application/rss+xml> --></head>''',
+    '''<head><title>\xe9</title>
+<link href=a.rss rel=alternate type=application/rss+xml title="\xe9">''',
+    # libxml2 doesn't map windows-1252 references the way html5lib does,
+    '<link href=a.rss rel=alternate type=application/rss+xml '
+    'title="&#x92;quote&#150;">',
+    # nor does it resolve references without a semicolon.
+    '<link href=a.rss rel=alternate type=application/rss+xml '
+    'title="News &amp Views">',
+    # a <body> tag in the title doesn't end the head.
+    '''<title>How to write <body> tags</title>
+<link rel=alternate type=application/rss+xml href=/feed>''',
+]
+
+
+def documents():
+    for path in glob(os.path.join(BASE_DIR, '*', '*.htm*')):
+        yield open(path).read()
+    for rel in SECTION_7_1_REL:
+        yield HTML5_TEMPLATE % ('%s type=application/atom+xml href=a' % rel)
+    for ltype in SECTION_7_2_TYPE:
+        yield HTML5_TEMPLATE % ('%s rel=alternate href=a' % ltype)
+    for params in SECTION_7_3_PARAMS:
+        yield SECTION_7_3_TEMPLATE % params
+    yield MIXED_HTML
+    yield u'<link href="\xe9.rss" rel=alternate type=application/rss+xml>'
+    yield ''
+
+
+class BackendTestCase(TestCase):
+    '''Tests the parser backends.'''
+
+    def assertSameResults(self, html, backend):
+        self.assertEqual(parse_html(html, url=URL, backend=backend),
+                         parse_html(html, url=URL), html)
+
+    def test_lxml(self):
+        for html in documents():
+            self.assertSameResults(html, 'lxml')
+
+    def test_auto(self):
+        for html in documents():
+            self.assertSameResults(html, 'auto')
+        for html in MALFORMED_HTML:
+            self.assertSameResults(html, 'auto')
+
+    def test_suspicious(self):
+        for html in MALFORMED_HTML:
+            self.assertRaises(SuspiciousDocument, parse_with_lxml, html,
+                              strict=True)
+
+    def test_file_like_object(self):
+        html = open(glob(os.path.join(BASE_DIR, 'rss', '*.html'))[0]).read()
+        for backend in ['lxml', 'auto']:
+            self.assertEqual(parse_html(StringIO(html), backend=backend),
+                             parse_html(html))
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, parse_html, MIXED_HTML,
+                          backend='beautifulsoup')
@@ -14,8 +14,13 @@
 # limitations under the License.
 
 import cardisco
+from cardisco.base import BaseDiscoverer
+from cardisco.engine import LinkDispatcher
+from cardisco.rss import Discoverer as RSSDiscoverer
 from copy import copy
+import html5lib
 from StringIO import StringIO
+from threading import Thread
 from unittest2 import TestCase
 
 MINIMAL_HTML = '''\
@@ -26,6 +31,14 @@ MINIMAL_HTML = '''\
 </head>
 '''
 
+BASE_HTML = '''\
+<!DOCTYPE html>
+<head>
+    <base href="http://%d.example.com/">
+    <link href=foo.rss rel=alternate type=application/rss+xml>
+</head>
+'''
+
 
 class FakeHTTPResponse(StringIO):
     '''A fake HTTP response for FakeHTTPConnection. Copied from
@@ -35,7 +48,8 @@ class FakeHTTPResponse(StringIO):
 
     def __init__(self, body, **kwargs):
         StringIO.__init__(self, body)
-        self.headers = kwargs
+        self.headers = dict((key.replace('_', '-'), value)
+                            for key, value in kwargs.iteritems())
 
     def iteritems(self):
         return self.headers.iteritems()
@@ -142,3 +156,51 @@ class BaseFunctionalityTestCase(TestCase):
 
     def test_class_not_found(self):
         self.assertModuleRaises('no_class', 'no_class', AttributeError)
+
+    def test_concurrent_parse(self):
+        cardisco._MODULE_CACHE = {}
+        errors = []
+
+        def run(idx):
+            html = BASE_HTML % idx
+            expected = {
+                'http://%d.example.com/foo.rss' % idx: None,
+            }
+            try:
+                for i in range(20):
+                    feeds = cardisco.parse_html(html, url='http://a/')
+                    if feeds['application/rss+xml'] != expected:
+                        errors.append((idx, feeds))
+            except Exception as e:
+                errors.append((idx, e))
+
+        threads = [Thread(target=run, args=(idx,)) for idx in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_compiled_xpath(self):
+        class NextDiscoverer(RSSDiscoverer):
+            xpath = '/html:html/html:head/html:link[@rel=\'next\']'
+
+        doc = html5lib.parse(MINIMAL_HTML.replace('foo.rss rel=alternate',
+                                                  'foo.rss rel=next'),
+                             treebuilder='lxml')
+        self.assertEqual(NextDiscoverer.compiled_xpath.path,
+                         NextDiscoverer.xpath)
+        self.assertNotEqual(RSSDiscoverer.compiled_xpath.path,
+                            NextDiscoverer.xpath)
+        self.assertEqual(NextDiscoverer.parse(doc), {})
+        self.assertEqual(RSSDiscoverer.parse(doc), {})
+        NextDiscoverer.check_link_element = classmethod(lambda cls, e: True)
+        self.assertEqual(NextDiscoverer.parse(doc), {'foo.rss': None})
+        # the dispatcher runs the compiled expression too
+        self.assertEqual(LinkDispatcher({'next': NextDiscoverer}).parse(doc),
+                         {'next': {'foo.rss': None}})
+        NextDiscoverer.xpath = BaseDiscoverer.xpath
+        self.assertEqual(NextDiscoverer.parse(doc), {
+            'foo.rss': None,
+            'foo.atom': None,
+        })
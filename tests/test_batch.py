@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+import httplib2
+from test_base import FakeHTTPConnection, FakeHTTPResponse, MINIMAL_HTML
+from threading import active_count, Lock
+from unittest2 import TestCase
+
+
+class FakeHTMLConnection(FakeHTTPConnection):
+    '''Fake HTTP connection which always returns a minimal HTML document.'''
+
+    def getresponse(self):
+        return FakeHTTPResponse(MINIMAL_HTML, **{
+            'content-type': 'text/html',
+        })
+
+
+class CountingFactory(object):
+    '''Counts the number of HTTP objects created.'''
+
+    def __init__(self):
+        self.count = 0
+        self.lock = Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.count += 1
+        return httplib2.Http()
+
+
+class DiscoverManyTestCase(TestCase):
+    '''Tests the batch discovery API.'''
+
+    def test_discover_many(self):
+        urls = ['http://h%d/dir/page' % (i % 5) for i in range(50)]
+        factory = CountingFactory()
+        results = list(cardisco.discover_many(
+            iter(urls), workers=4, http_factory=factory,
+            connection_type=FakeHTMLConnection))
+        self.assertEqual(sorted(url for url, result in results),
+                         sorted(urls))
+        for url, result in results:
+            host = url[:url.rindex('/') + 1]
+            self.assertEqual(result['application/rss+xml'], {
+                '%sfoo.rss' % host: None,
+            })
+        self.assertLessEqual(factory.count, 4)
+
+    def test_errors(self):
+        results = list(cardisco.discover_many(
+            ['http://a/1', 'http://b/2'], workers=2,
+            connection_type=FakeHTTPConnection))
+        self.assertEqual(len(results), 2)
+        for url, result in results:
+            self.assertIsInstance(result, Exception)
+
+    def test_headers_not_modified(self):
+        headers = {'User-Agent': 'test'}
+        list(cardisco.discover_many(['http://a/1'], workers=1,
+                                    headers=headers,
+                                    connection_type=FakeHTMLConnection))
+        self.assertEqual(headers, {'User-Agent': 'test'})
+
+    def test_abandon(self):
+        def urls():
+            i = 0
+            while True:
+                i += 1
+                yield 'http://a/%d' % i
+
+        results = cardisco.discover_many(urls(), workers=2,
+                                         connection_type=FakeHTMLConnection)
+        self.assertEqual(len([results.next() for i in range(5)]), 5)
+        before = active_count()
+        results.close()
+        self.assertLessEqual(active_count(), before - 2)
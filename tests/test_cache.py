@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.cache import DiscoveryCache
+from local_server import LocalServer, Page
+from test_base import MINIMAL_HTML
+import time
+from unittest2 import TestCase
+
+ETAG = '"v1"'
+LAST_MODIFIED = 'Mon, 01 Mar 2010 00:00:00 GMT'
+
+
+def conditional_page(handler):
+    if handler.headers.get('If-None-Match') == ETAG:
+        return Page(status=304, headers={'ETag': ETAG})
+    return Page(MINIMAL_HTML, headers={
+        'Content-Type': 'text/html',
+        'ETag': ETAG,
+        'Last-Modified': LAST_MODIFIED,
+    })
+
+
+PAGES = {
+    '/conditional': conditional_page,
+    '/plain': Page(MINIMAL_HTML),
+}
+
+
+class DiscoveryCacheTestCase(TestCase):
+    '''Tests the discovery result cache.'''
+
+    def test_not_modified(self):
+        cache = DiscoveryCache()
+        with LocalServer(PAGES) as server:
+            url = server.url('/conditional')
+            first = cardisco.discover(url, cache=cache)
+            first['application/rss+xml'].clear()
+            second = cardisco.discover(url, cache=cache)
+            requests = server.requests
+        self.assertEqual(len(requests), 2)
+        self.assertNotIn('if-none-match', requests[0][1])
+        self.assertEqual(requests[1][1]['if-none-match'], ETAG)
+        self.assertEqual(requests[1][1]['if-modified-since'], LAST_MODIFIED)
+        self.assertEqual(second, cardisco.parse_html(MINIMAL_HTML, url=url))
+
+    def test_no_validators(self):
+        cache = DiscoveryCache()
+        with LocalServer(PAGES) as server:
+            cardisco.discover(server.url('/plain'), cache=cache)
+        self.assertEqual(len(cache), 0)
+
+    def test_lru(self):
+        cache = DiscoveryCache(max_entries=2)
+        for url in ['a', 'b', 'c']:
+            cache.set(url, {}, ETAG)
+            cache.get('a')
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+
+    def test_max_size(self):
+        cache = DiscoveryCache(max_size=100)
+        result = {'x': {'y' * 30: None}}
+        for url in ['a', 'b', 'c', 'd']:
+            cache.set(url, result, ETAG)
+        self.assertEqual(len(cache), 3)
+        self.assertLessEqual(cache.size, 100)
+        self.assertIsNone(cache.get('a'))
+
+    def test_ttl(self):
+        cache = DiscoveryCache(ttl=0.05)
+        cache.set('a', {}, ETAG)
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.cli import _work, _Worker, completed_inputs, main, \
+    read_inputs, run
+import json
+from local_server import LocalServer, Page
+import os
+from Queue import Queue
+import shutil
+from StringIO import StringIO
+from tempfile import mkdtemp
+from test_base import MINIMAL_HTML
+from unittest2 import TestCase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(BASE_DIR, 'from_rssbandit', 'AutoDiscovery1.htm')
+
+PAGES = {
+    '/slow': Page(MINIMAL_HTML, delay=0.2),
+    '/slower': Page(MINIMAL_HTML, delay=1),
+    '/fast': Page(MINIMAL_HTML),
+}
+
+
+def read_records(output):
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    return sorted(records, key=lambda record: record['index'])
+
+
+class CLITestCase(TestCase):
+    '''Tests the ``cardisco`` command.'''
+
+    def setUp(self):
+        self.tmp_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_run(self, threads):
+        with LocalServer(PAGES) as server:
+            inputs = [server.url('/slow'), FIXTURE, server.url('/fast'),
+                      os.path.join(self.tmp_dir, 'missing.html')]
+            output = StringIO()
+            count = run(inputs, output, workers=3, threads=threads, window=2)
+        self.assertEqual(count, 4)
+        records = read_records(output)
+        self.assertEqual([record['index'] for record in records], range(4))
+        self.assertEqual([record['input'] for record in records], inputs)
+        self.assertEqual(records[0]['result'],
+                         cardisco.parse_html(MINIMAL_HTML, url=inputs[0]))
+        self.assertIn(u'file://%s/SampleRss0.92Feed.rss' %
+                      os.path.dirname(FIXTURE),
+                      records[1]['result']['application/rss+xml'])
+        self.assertTrue(records[3]['error'].startswith('IOError'))
+
+    def test_threads(self):
+        self.check_run(True)
+
+    def test_processes(self):
+        self.check_run(False)
+
+    def test_slow_input(self):
+        with LocalServer(PAGES) as server:
+            inputs = [server.url('/slower')] + [FIXTURE] * 10
+            output = StringIO()
+            count = run(inputs, output, workers=2, threads=True, window=4)
+        self.assertEqual(count, 11)
+        lines = output.getvalue().splitlines()
+        # the other inputs went past the slow one, and weren't held up
+        self.assertEqual(json.loads(lines[-1])['index'], 0)
+        self.assertEqual(sorted(json.loads(line)['index'] for line in lines),
+                         range(11))
+
+    def test_errors(self):
+        class Stop(BaseException):
+            pass
+
+        errors = {
+            'unicode': ValueError(u'\xe9'),
+            'bytes': ValueError('\xe9'),
+            '\xff': ValueError('x'),
+            'stop': Stop(),
+        }
+
+        def discover(worker, item):
+            raise errors[item]
+
+        original = _Worker.discover
+        _Worker.discover = discover
+        try:
+            output = StringIO()
+            inputs = ['unicode', 'bytes', '\xff']
+            count = run(inputs, output, workers=2, threads=True)
+            # the worker still answers when it is stopped
+            tasks, results = Queue(), Queue()
+            tasks.put((0, 'stop'))
+            with self.assertRaises(Stop):
+                _work(tasks, results, {'timeout': 1})
+        finally:
+            _Worker.discover = original
+        self.assertEqual(count, 3)
+        records = read_records(output)
+        self.assertEqual([record['error'] for record in records], [
+            u'ValueError: \xe9',
+            u'ValueError: \ufffd',
+            u'ValueError: x',
+        ])
+        self.assertEqual(records[2]['input'], u'\ufffd')
+        record = json.loads(results.get_nowait())
+        self.assertEqual(record['error'], u'RuntimeError: worker stopped')
+        self.assertEqual(record['index'], 0)
+
+    def test_read_inputs(self):
+        self.assertEqual(list(read_inputs(['a\n', '\n', '# b\n', ' c '])),
+                         ['a', 'c'])
+
+    def test_resume(self):
+        input_path = os.path.join(self.tmp_dir, 'input.txt')
+        output_path = os.path.join(self.tmp_dir, 'output.jsonl')
+        with open(input_path, 'w') as f:
+            f.write('%s\n' % '\n'.join([FIXTURE] * 4))
+        with open(output_path, 'w') as f:
+            f.write('{"index": 2, "input": "done"}\n{"inp')
+        self.assertEqual(main(['-o', output_path, '--resume', '--threads',
+                               input_path]), 0)
+        with open(output_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(json.loads(lines[0]), {'index': 2, 'input': 'done'})
+        self.assertEqual(sorted(json.loads(line)['index']
+                                for line in lines[1:]), [0, 1, 3])
+        self.assertEqual(json.loads(lines[1])['input'], FIXTURE)
+        self.assertEqual(completed_inputs(output_path), set(range(4)))
+
+    def test_resume_input_order(self):
+        output_path = os.path.join(self.tmp_dir, 'output.jsonl')
+        with open(output_path, 'w') as f:
+            f.write('{"input": "a"}\n{"input": "b"}\n')
+        self.assertEqual(completed_inputs(output_path), set([0, 1]))
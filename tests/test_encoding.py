@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cardisco import _result_from_response, parse_html
+from cardisco.backends import BACKENDS
+from cardisco.encoding import (charset_from_content_type, charset_label,
+                               decode_document, detect_encoding,
+                               lookup_encoding, prescan)
+import codecs
+from cStringIO import StringIO
+from unittest2 import TestCase
+
+TITLE = u'ニュース'
+HTML = u'''<!DOCTYPE html>
+<html><head>%s<title>x</title>
+<link href=a.rss rel=alternate type=application/rss+xml title="%s">
+</head><body><p>%s</p></body></html>'''
+
+
+def document(encoding, meta=''):
+    return (HTML % (meta, TITLE, TITLE * 100)).encode(encoding)
+
+
+class EncodingTestCase(TestCase):
+    '''Tests finding the encoding of documents before they are parsed.'''
+
+    def test_lookup(self):
+        self.assertEqual(lookup_encoding('ISO-8859-1'), 'cp1252')
+        self.assertEqual(lookup_encoding(' "Shift_JIS" '), 'cp932')
+        self.assertEqual(lookup_encoding('utf8'), 'utf-8')
+        self.assertIsNone(lookup_encoding('x-unknown'))
+        self.assertIsNone(lookup_encoding(None))
+        self.assertEqual(charset_label('text/html; charset="EUC-JP"'),
+                         'EUC-JP')
+        self.assertEqual(charset_from_content_type('text/html;charset=gb2312'),
+                         'gbk')
+        self.assertIsNone(charset_from_content_type('text/html'))
+
+    def test_prescan(self):
+        self.assertEqual(prescan('<meta charset="euc-jp">'), 'euc_jp')
+        self.assertEqual(prescan('''<meta name=x><META
+            HTTP-EQUIV=Content-Type content='text/html; charset=koi8-r'>'''),
+                         'koi8-r')
+        self.assertEqual(prescan('<meta charset=utf-16le>'), 'utf-8')
+        self.assertIsNone(prescan('<!-- <meta charset=koi8-r> -->'))
+        self.assertIsNone(prescan('<meta charset=x-unknown>'))
+        self.assertIsNone(prescan('<meta content="charset=koi8-r">'))
+        self.assertIsNone(prescan(' ' * 1024 + '<meta charset=koi8-r>'))
+        self.assertEqual(prescan('<meta charset=x-unknown>'
+                                 '<meta charset=koi8-r>'), 'koi8-r')
+
+    def test_detect(self):
+        data = '<meta charset=koi8-r>'
+        self.assertEqual(detect_encoding(data), ('koi8-r', 0))
+        self.assertEqual(detect_encoding(data, 'latin1'), ('cp1252', 0))
+        self.assertEqual(detect_encoding(data, 'x-unknown'), ('koi8-r', 0))
+        self.assertEqual(detect_encoding(codecs.BOM_UTF8 + data, 'latin1'),
+                         ('utf-8', 3))
+        self.assertEqual(detect_encoding('<p>'), (None, 0))
+        self.assertEqual(decode_document(codecs.BOM_UTF8 + 'caf\xc3\xa9'),
+                         u'caf\xe9')
+        self.assertEqual(decode_document('caf\xe9'), 'caf\xe9')
+        self.assertEqual(decode_document(u'caf\xe9', 'ascii'), u'caf\xe9')
+
+    def assertTitle(self, data, stream=False, **kwargs):
+        for backend in BACKENDS:
+            result = parse_html(StringIO(data) if stream else data,
+                                backend=backend, **kwargs)
+            self.assertEqual(result['application/rss+xml'], {'a.rss': TITLE},
+                             backend)
+
+    def test_transport_encoding(self):
+        for encoding in ('shift_jis', 'euc-jp', 'utf-16le', 'utf-8'):
+            data = document(encoding)
+            self.assertTitle(data, encoding=encoding)
+            self.assertTitle(data, stream=True, encoding=encoding)
+            self.assertTitle(data, stream=True, encoding=encoding,
+                             head_only=True)
+        data = document('shift_jis')
+        result = _result_from_response('http://example.com/',
+                                       'text/html; charset=Shift_JIS', data)
+        self.assertEqual(result['application/rss+xml'], {
+            'http://example.com/a.rss': TITLE,
+        })
+
+    def test_meta(self):
+        for encoding in ('shift_jis', 'euc-jp', 'utf-8'):
+            data = document(encoding, '<meta charset=%s>' % encoding)
+            self.assertTitle(data)
+            self.assertTitle(data, prefilter=True)
+
+    def test_unicode(self):
+        self.assertTitle(HTML % ('', TITLE, TITLE))
+        self.assertTitle(HTML % ('<meta charset=koi8-r>', TITLE, TITLE))
+
+    def test_non_text_codecs(self):
+        for label in ('hex', 'base64', 'zlib', 'bz2', 'uu', 'rot13', 'utf-7',
+                      'x-user-defined'):
+            self.assertIsNone(lookup_encoding(label), label)
+            self.assertEqual(detect_encoding('<p>', label), (None, 0))
+            html = ('<head><meta charset=%s><link href=f.rss rel=alternate '
+                    'type=application/rss+xml></head>' % label)
+            self.assertEqual(prescan(html), None)
+            for backend in BACKENDS:
+                for data in (html, StringIO(html)):
+                    result = parse_html(data, url='http://a/',
+                                        backend=backend)
+                    self.assertEqual(result['application/rss+xml'],
+                                     {'http://a/f.rss': None},
+                                     (label, backend))
+            result = _result_from_response(
+                'http://a/', 'text/html; charset=%s' % label, html)
+            self.assertEqual(result['application/rss+xml'],
+                             {'http://a/f.rss': None}, label)
+        # the prescan is used when the transport label is ignored
+        self.assertEqual(detect_encoding('<meta charset=koi8-r>', 'hex'),
+                         ('koi8-r', 0))
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.base import BaseDiscoverer, LinkRule
+from cardisco.engine import LinkDispatcher
+from cardisco.stats import DiscoveryStats
+from glob import glob
+import html5lib
+from importlib import import_module
+import os
+from unittest2 import TestCase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MIXED_HTML = '''\
+<!DOCTYPE html>
+<head>
+<link href=a.rss rel=alternate type=application/rss+xml>
+<link href=b.rss rel=alternate type=Application/RSS+XML>
+<link href=c.rss rel="alternate foo" type=application/rss+xml>
+<link href=a.atom rel="Alternate foo" type=" application/atom+xml ">
+<link href=a.rdf type=application/rdf+xml>
+<link href=b.rdf rel=meta type=APPLICATION/RDF+XML>
+<base href="http://example.org/base/">
+<link href=a.osd rel=search type=application/opensearchdescription+xml
+      title="Search">
+<link href=b.osd type=application/opensearchdescription+xml>
+<link href=a.css rel=stylesheet type=text/css>
+<link rel=alternate type=application/atom+xml>
+</head>
+'''
+
+
+class LinkDispatcherTestCase(TestCase):
+    '''Tests that the single-pass engine returns the same results as the
+    individual discoverers.
+    '''
+
+    @classmethod
+    def setUpClass(cls):
+        cls.discoverers = {}
+        for name, module in cardisco.MODULES.iteritems():
+            mod = import_module(module, package='cardisco')
+            cls.discoverers[name] = mod.Discoverer
+        cls.dispatcher = LinkDispatcher(cls.discoverers)
+
+    def assertSameResults(self, doc, url=None, msg=None):
+        expected = dict((name, discoverer.parse(doc, url=url))
+                        for name, discoverer in self.discoverers.iteritems())
+        self.assertEqual(self.dispatcher.parse(doc, url=url), expected, msg)
+
+    def test_mixed(self):
+        doc = html5lib.parse(MIXED_HTML, treebuilder='lxml')
+        self.assertSameResults(doc)
+        self.assertSameResults(doc, url='http://example.com/index.html')
+
+    def test_fixtures(self):
+        paths = glob(os.path.join(BASE_DIR, '*', '*.htm*'))
+        self.assertTrue(paths)
+        for path in paths:
+            doc = html5lib.parse(open(path), treebuilder='lxml')
+            self.assertSameResults(doc, msg=path)
+            self.assertSameResults(doc, url='http://example.com/a/b',
+                                   msg=path)
+
+    def test_custom_link_types(self):
+        class FooDiscoverer(self.discoverers['application/atom+xml']):
+            link_types = ('application/atom+xml', 'application/x-foo')
+
+            @classmethod
+            def check_link_element(cls, element):
+                return True
+
+        dispatcher = LinkDispatcher({'foo': FooDiscoverer})
+        doc = html5lib.parse('''\
+<link href=a.atom rel=alternate type=application/atom+xml>
+<link href=a.foo rel=alternate type=application/x-foo>
+<link href=a.rss rel=alternate type=application/rss+xml>''',
+                             treebuilder='lxml')
+        self.assertEqual(dispatcher.parse(doc), {
+            'foo': {
+                'a.atom': None,
+                'a.foo': None,
+            },
+        })
+
+    def test_custom_check_link_element(self):
+        class HubDiscoverer(BaseDiscoverer):
+            required_attributes = ('rel', 'href')
+
+            @classmethod
+            def check_link_element(cls, element):
+                return 'hub' in element.attrib['rel'].lower().split()
+
+        class OEmbedDiscoverer(BaseDiscoverer):
+            @classmethod
+            def check_link_element(cls, element):
+                return element.attrib['type'].strip().lower() in (
+                    'application/json+oembed', 'text/xml+oembed')
+
+        discoverers = dict(self.discoverers)
+        discoverers['hub'] = HubDiscoverer
+        discoverers['application/json+oembed'] = OEmbedDiscoverer
+        dispatcher = LinkDispatcher(discoverers)
+        self.assertIsNone(dispatcher.link_types)
+        html = MIXED_HTML.replace('</head>', '''\
+<link href=/hub rel=hub>
+<link href=/o.json rel=alternate type=application/json+oembed>
+<link href=/o.xml rel=alternate type=text/xml+oembed>
+</head>''')
+        doc = html5lib.parse(html, treebuilder='lxml')
+        expected = dict((name, discoverer.parse(doc))
+                        for name, discoverer in discoverers.iteritems())
+        self.assertEqual(expected['hub'], {
+            'http://example.org/hub': None,
+        })
+        self.assertEqual(len(expected['application/json+oembed']), 2)
+        self.assertEqual(dispatcher.parse(doc), expected)
+        self.assertEqual(dispatcher.parse(doc, hooks=DiscoveryStats()),
+                         expected)
+        self.assertEqual(dispatcher.parse(doc, compact=True).to_dict(),
+                         expected)
+        self.assertEqual(dispatcher.extract(doc).resolve(None, dispatcher),
+                         expected)
+
+    def test_rules(self):
+        class HubDiscoverer(BaseDiscoverer):
+            required_attributes = ('rel', 'href')
+            rules = (LinkRule(rels=['hub']),)
+
+        class OEmbedDiscoverer(BaseDiscoverer):
+            rules = (
+                LinkRule(types=['application/json+oembed',
+                                'text/xml+oembed'], rels=['alternate']),
+            )
+
+        discoverers = dict(self.discoverers)
+        discoverers['hub'] = HubDiscoverer
+        discoverers['oembed'] = OEmbedDiscoverer
+        dispatcher = LinkDispatcher(discoverers)
+        self.assertIsNone(dispatcher.link_types)
+        self.assertIn('application/rss+xml',
+                      LinkDispatcher(self.discoverers).link_types)
+        html = MIXED_HTML.replace('</head>', '''\
+<link href=hub rel="self HUB">
+<link href=a.json rel=alternate type=" Application/JSON+oEmbed ">
+<link href=a.xml rel="alternate hub" type=text/xml+oembed>
+</head>''')
+        doc = html5lib.parse(html, treebuilder='lxml')
+        expected = dict((name, discoverer.parse(doc))
+                        for name, discoverer in discoverers.iteritems())
+        self.assertEqual(dispatcher.parse(doc), expected)
+        base = 'http://example.org/base/'
+        self.assertEqual(expected['hub'], {
+            base + 'hub': None,
+            base + 'a.xml': None,
+        })
+        self.assertEqual(expected['oembed'], {
+            base + 'a.json': None,
+            base + 'a.xml': None,
+        })
+        self.assertEqual(expected['application/rss+xml'], {
+            'a.rss': None,
+        })
+
+    def test_rule_normalization(self):
+        class FooDiscoverer(BaseDiscoverer):
+            rules = (LinkRule(types=[' Application/X-Foo'], rels=['Foo']),)
+
+        self.assertEqual(FooDiscoverer.rules[0].types,
+                         frozenset(['application/x-foo']))
+        discoverers = dict(self.discoverers)
+        discoverers['foo'] = FooDiscoverer
+        dispatcher = LinkDispatcher(discoverers)
+        self.assertIn('application/x-foo', dispatcher.link_types)
+        html = '''\
+<link href=a.foo rel="FOO bar" type=APPLICATION/X-FOO>
+<link href=b.foo rel="bar\tfoo" type=application/x-foo>
+<link href=a.atom rel="alternate\tfoo" type=application/atom+xml>
+<link href=b.atom rel="foo  alternate" type=application/atom+xml>
+<link href=a.osd rel="search\n" type=application/opensearchdescription+xml>
+'''
+        doc = html5lib.parse(html, treebuilder='lxml')
+        expected = dict((name, discoverer.parse(doc))
+                        for name, discoverer in discoverers.iteritems())
+        # only spaces separate rel tokens
+        self.assertEqual(expected['foo'], {'a.foo': None})
+        self.assertEqual(expected['application/atom+xml'], {'b.atom': None})
+        self.assertEqual(expected['application/opensearchdescription+xml'],
+                         {})
+        self.assertEqual(dispatcher.parse(doc), expected)
+
+    def test_custom_xpath(self):
+        class NextDiscoverer(BaseDiscoverer):
+            xpath = "/html:html/html:head/html:link[@href][@rel='next']"
+            required_attributes = ('href',)
+
+        class AnchorDiscoverer(BaseDiscoverer):
+            xpath = "//html:a[@href][@rel='alternate']"
+            rules = (LinkRule(types=['application/rss+xml']),)
+
+        discoverers = dict(self.discoverers)
+        discoverers['next'] = NextDiscoverer
+        dispatcher = LinkDispatcher(discoverers)
+        self.assertIsNone(dispatcher.link_types)
+        self.assertTrue(dispatcher.head_only)
+        html = MIXED_HTML.replace('</head>', '''\
+<link href=p.html rel=prev>
+<link href=n.html rel=next>
+</head>''')
+        doc = html5lib.parse(html, treebuilder='lxml')
+        expected = dict((name, discoverer.parse(doc))
+                        for name, discoverer in discoverers.iteritems())
+        self.assertEqual(expected['next'], {
+            'http://example.org/base/n.html': None,
+        })
+        self.assertEqual(dispatcher.parse(doc), expected)
+        self.assertEqual(dispatcher.parse(doc, compact=True).to_dict(),
+                         expected)
+        self.assertEqual(dispatcher.extract(doc).resolve(None, dispatcher),
+                         expected)
+        discoverers['anchor'] = AnchorDiscoverer
+        dispatcher = LinkDispatcher(discoverers)
+        self.assertFalse(dispatcher.head_only)
+        doc = html5lib.parse('''\
+<link href=a.rss rel=alternate type=application/rss+xml>
+<body><a href=b.rss rel=alternate type=application/rss+xml>b</a>
+<a href=c.atom rel=alternate type=application/atom+xml>c</a>''',
+                             treebuilder='lxml')
+        result = dispatcher.parse(doc, compact=True)
+        self.assertEqual(result['anchor'], {'b.rss': None})
+        self.assertEqual([(link.type, link.position) for link in result.links
+                          if link.href == 'b.rss'], [('anchor', None)])
+        self.assertEqual(result, dispatcher.parse(doc))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.executor import compact, expand, parse_many, ParseExecutor, \
+    WorkerError
+import cPickle
+from test_backends import documents
+from test_engine import MIXED_HTML
+from unittest2 import TestCase
+
+URL = 'http://www.example.com/a/b'
+
+
+class UnpicklableError(Exception):
+
+    def __init__(self):
+        Exception.__init__(self, 'unpicklable')
+        self.callback = lambda: None
+
+
+class FailingDocument(object):
+    '''A document whose parsing raises an exception which can't be sent
+    back from the worker.
+    '''
+
+    def read(self, size=-1):
+        raise UnpicklableError()
+
+
+class UnpicklableDocument(object):
+    '''A document which can't be sent to a worker.'''
+
+    def __reduce__(self):
+        raise TypeError('not picklable')
+
+
+class ParseExecutorTestCase(TestCase):
+    '''Tests the process-pool parse executor.'''
+
+    def setUp(self):
+        self.documents = [(html, URL) for html in documents()
+                          if not isinstance(html, unicode)]
+
+    def check_results(self, results):
+        self.assertEqual(len(results), len(self.documents))
+        for idx, url, links in results:
+            html = self.documents[idx][0]
+            self.assertEqual(url, URL)
+            self.assertEqual(expand(links), cardisco.parse_html(html, url=URL))
+
+    def test_ordered(self):
+        with ParseExecutor(processes=2, chunksize=3, max_pending=2) as \
+                executor:
+            results = list(executor.map(self.documents))
+        self.assertEqual([idx for idx, url, links in results],
+                         range(len(self.documents)))
+        self.check_results(results)
+
+    def test_unordered(self):
+        results = list(parse_many(self.documents, ordered=False, processes=2,
+                                  chunksize=3, max_pending=2))
+        self.check_results(results)
+
+    def test_options(self):
+        results = list(parse_many([MIXED_HTML], processes=1,
+                                  backend='no-such-backend'))
+        self.assertIsInstance(results[0][2], ValueError)
+        self.assertIsNone(results[0][1])
+
+    def test_compact(self):
+        result = cardisco.parse_html(MIXED_HTML, url=URL)
+        links = compact(result)
+        self.assertEqual(cPickle.loads(cPickle.dumps(links, -1)), links)
+        self.assertEqual(expand(links), result)
+        self.assertEqual(compact(cardisco.parse_html('')), ())
+
+    def test_failures(self):
+        documents = [(MIXED_HTML, URL), (FailingDocument(), URL),
+                     (UnpicklableDocument(), URL), (MIXED_HTML, URL)]
+        for ordered in (True, False):
+            results = sorted(parse_many(documents, ordered=ordered,
+                                        processes=2, chunksize=1,
+                                        max_pending=2))
+            self.assertEqual([idx for idx, url, links in results], range(4))
+            expected = compact(cardisco.parse_html(MIXED_HTML, url=URL))
+            self.assertEqual(results[0][2], expected)
+            self.assertEqual(results[3][2], expected)
+            self.assertIsInstance(results[1][2], WorkerError)
+            self.assertIn('UnpicklableError', str(results[1][2]))
+            self.assertIsInstance(results[2][2], WorkerError)
+            self.assertIn('not picklable', str(results[2][2]))
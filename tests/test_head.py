@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cardisco import parse_html
+from cardisco.head import parse_head
+from glob import glob
+import os
+from StringIO import StringIO
+from unittest2 import TestCase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LATE_LINK_HTML = '''\
+<!DOCTYPE html>
+<head>
+<title>Late link</title>
+</head>
+<link href=late.rss rel=alternate type=application/rss+xml>
+<body>
+<link href=body.atom rel=alternate type=application/atom+xml>
+</body>
+'''
+
+
+def fixture_paths():
+    for pattern in ['*/*.html', '*/*.htm']:
+        for path in glob(os.path.join(BASE_DIR, pattern)):
+            yield path
+
+
+class HeadOnlyTestCase(TestCase):
+    '''Tests the head-only parse mode.'''
+
+    def test_fixtures(self):
+        for path in fixture_paths():
+            expected = parse_html(open(path), url='http://example.com/a/b')
+            feeds = parse_html(open(path), url='http://example.com/a/b',
+                               head_only=True)
+            self.assertEqual(feeds, expected, path)
+
+    def test_link_after_head(self):
+        # links between </head> and <body> still belong to the head.
+        feeds = parse_html(LATE_LINK_HTML, head_only=True)
+        self.assertEqual(feeds, parse_html(LATE_LINK_HTML))
+        self.assertEqual(feeds['application/rss+xml'], {'late.rss': None})
+        self.assertEqual(feeds['application/atom+xml'], {})
+
+    def test_body_not_parsed(self):
+        html = '%s<p>%s</p>' % (LATE_LINK_HTML, 'x' * (1024 * 1024))
+        doc = parse_head(StringIO(html))
+        root = doc.getroot()
+        self.assertEqual([child.tag.split('}')[1] for child in root],
+                         ['head'])
+
+    def test_body_not_read(self):
+        obj = StringIO('%s%s' % (LATE_LINK_HTML, 'x' * (1024 * 1024)))
+        parse_head(obj)
+        self.assertLess(obj.tell(), 64 * 1024)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cardisco import parse_html
+from cardisco.memo import head_key, HeadMemo
+from cardisco.stats import BUILD, DECODE, DiscoveryStats, MEMO_HITS, \
+    MEMO_MISSES
+from test_backends import documents, URL
+from test_engine import MIXED_HTML
+from unittest2 import TestCase
+
+TEMPLATE = '''\
+<!DOCTYPE html>
+<html>
+  <head>
+    <title>Blog</title>
+    <link href=feed.rss rel=alternate type=application/rss+xml title=Posts>
+    <link href=/comments.atom rel=alternate type=application/atom+xml>
+  </head>
+  <body>%s</body>
+</html>'''
+
+
+class HeadMemoTestCase(TestCase):
+    '''Tests the memo of document heads.'''
+
+    def test_same_results(self):
+        memo = HeadMemo()
+        for html in list(documents()) + [MIXED_HTML]:
+            for url in (None, URL):
+                for compact in (False, True):
+                    for i in xrange(2):
+                        self.assertEqual(
+                            parse_html(html, url=url, compact=compact,
+                                       memo=memo),
+                            parse_html(html, url=url, compact=compact))
+        self.assertGreater(memo.hits, 0)
+
+    def test_template(self):
+        memo = HeadMemo()
+        first = parse_html(TEMPLATE % 'first', url='http://example.com/a/1',
+                           memo=memo)
+        html = (TEMPLATE % 'second').replace('\n', '\r\n    ')
+        stats = DiscoveryStats()
+        second = parse_html(html, url='http://example.com/b/2', memo=memo,
+                            hooks=stats)
+        self.assertEqual((memo.hits, memo.misses), (1, 1))
+        self.assertEqual(memo.hit_rate(), 0.5)
+        self.assertEqual(first['application/rss+xml'], {
+            'http://example.com/a/feed.rss': 'Posts',
+        })
+        self.assertEqual(second['application/rss+xml'], {
+            'http://example.com/b/feed.rss': 'Posts',
+        })
+        self.assertEqual(second['application/atom+xml'], {
+            'http://example.com/comments.atom': None,
+        })
+        self.assertEqual(second, parse_html(html, url='http://example.com/b/2'))
+        # neither the tree builder nor the discoverers were run
+        self.assertEqual(stats.counters, {MEMO_HITS: 1})
+        self.assertEqual(stats.stages.keys(), [DECODE])
+        result = parse_html(TEMPLATE % 'third', url='http://example.com/c',
+                            memo=memo, compact=True)
+        self.assertEqual([link.href for link in result.links], [
+            'http://example.com/feed.rss',
+            'http://example.com/comments.atom',
+        ])
+
+    def test_keys(self):
+        key = head_key(TEMPLATE % 'x')
+        self.assertEqual(head_key(TEMPLATE % 'y'), key)
+        self.assertEqual(head_key(TEMPLATE.replace('\n', '\r\n') % 'y'), key)
+        self.assertNotEqual(head_key(TEMPLATE.replace('Blog', 'Log') % 'x'),
+                            key)
+        self.assertNotEqual(head_key(TEMPLATE % 'x', encoding='utf-8'), key)
+        self.assertNotEqual(head_key(TEMPLATE % 'x', backend='lxml'), key)
+        self.assertNotEqual(head_key(unicode(TEMPLATE % 'x')), key)
+        self.assertNotEqual(head_key(TEMPLATE.replace('title=Posts',
+                                                      'title="Po sts"') %
+                                     'x'), key)
+
+    def test_body_in_attribute(self):
+        page = ('<head><meta name=x content="Put <body> here">'
+                '<link href=/%s.rss rel=alternate type=application/rss+xml>'
+                '</head><body></body>')
+        memo = HeadMemo()
+        self.assertEqual(parse_html(page % 'a', url='http://h/', memo=memo),
+                         parse_html(page % 'a', url='http://h/'))
+        self.assertEqual(parse_html(page % 'b', url='http://h/', memo=memo),
+                         parse_html(page % 'b', url='http://h/'))
+        self.assertEqual(memo.hits, 0)
+
+    def test_charset_in_body(self):
+        head = ('<head><link href=a.rss rel=alternate '
+                'type=application/rss+xml title="\xc3\xa9t\xc3\xa9"></head>')
+        utf8 = head + '<body><meta charset=utf-8>'
+        cp1252 = head + '<body><meta charset=windows-1252>'
+        self.assertNotEqual(head_key(utf8), head_key(cp1252))
+        memo = HeadMemo()
+        for page in [utf8, cp1252]:
+            self.assertEqual(parse_html(page, url='http://h/', memo=memo),
+                             parse_html(page, url='http://h/'))
+        self.assertEqual(memo.hits, 0)
+
+    def test_whitespace_in_attribute(self):
+        page = ('<head>\n  <link href=a.rss rel=alternate title="%s"\n'
+                '    type=application/rss+xml>\n</head><body></body>')
+        self.assertEqual(head_key(page % 'a>  <b'),
+                         head_key((page % 'a>  <b').replace('>\n', '>')))
+        self.assertNotEqual(head_key(page % 'a>  <b'), head_key(page % 'a><b'))
+
+    def test_eviction(self):
+        memo = HeadMemo(max_entries=1)
+        stats = DiscoveryStats()
+        parse_html(TEMPLATE % 'x', memo=memo)
+        parse_html(MIXED_HTML, memo=memo)
+        self.assertEqual(len(memo), 1)
+        parse_html(TEMPLATE % 'x', memo=memo, hooks=stats)
+        self.assertEqual((memo.hits, memo.misses), (0, 3))
+        self.assertEqual(stats.counters[MEMO_MISSES], 1)
+        self.assertIn(BUILD, stats.stages)
+        memo.clear()
+        self.assertEqual((len(memo), memo.hits, memo.misses), (0, 0, 0))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cardisco import _get_dispatcher, parse_html
+from cardisco.prefilter import head_region, head_tags, may_have_links
+from test_backends import documents, MALFORMED_HTML, URL
+from unittest2 import TestCase
+
+TRICKY_HTML = [
+    # the head isn't over until the (real) <body> tag.
+    '''<head><script>document.write("<body>")</script>
+<!-- <body> --><title><body></title></head>
+<link href=a.rss rel=alternate type=application/rss+xml>''',
+    # character references in the type
+    '''<link href=a.rss rel=alternate type=application/rss&#43;xml>''',
+    '''<link href=a.atom rel=alternate type="application/atom&#43xml">''',
+    # '>' in an attribute value
+    '''<link title="a > b" href=a.rss rel=alternate
+    TYPE = ' Application/RSS+XML '>''',
+    # '<body>' in an attribute value
+    '''<head><meta content="x <body> y"><meta content='<body>'>
+<link href=b.rss rel=alternate type=application/rss+xml></head>''',
+    # empty comments
+    '''<head><!--><!---><link href=a.rss rel=alternate
+type=application/rss+xml></head><body><!-- --></body>''',
+    # UTF-16
+    u'<link href=a.rss rel=alternate type=application/rss+xml>'
+    .encode('utf-16'),
+]
+
+NO_LINKS_HTML = [
+    '<html><head><title>x</title></head><body><p>x</p></body></html>',
+    '''<head><link rel=stylesheet type=text/css href=a.css></head>
+<body><link href=a.rss rel=alternate type=application/rss+xml></body>''',
+    '<head><title>x</title><body><link href=a.rss type=application/rss+xml>',
+]
+
+
+class PrefilterTestCase(TestCase):
+    '''Tests the byte-level pre-filter.'''
+
+    def assertNoFalseNegatives(self, html):
+        result = parse_html(html, url=URL)
+        self.assertEqual(parse_html(html, url=URL, prefilter=True), result,
+                         html)
+        if any(result.itervalues()):
+            self.assertTrue(may_have_links(html, _get_dispatcher().link_types),
+                            html)
+
+    def test_no_false_negatives(self):
+        for html in documents():
+            self.assertNoFalseNegatives(html)
+        for html in MALFORMED_HTML:
+            self.assertNoFalseNegatives(html)
+        for html in TRICKY_HTML:
+            self.assertNoFalseNegatives(html)
+            self.assertTrue(may_have_links(html, _get_dispatcher().link_types),
+                            html)
+
+    def test_no_links(self):
+        for html in NO_LINKS_HTML:
+            self.assertFalse(may_have_links(html, _get_dispatcher().link_types),
+                             html)
+            self.assertEqual(parse_html(html, prefilter=True),
+                             parse_html(html))
+
+    def test_head_region(self):
+        self.assertEqual(head_region('<head></head><BODY>x'), '<head></head>')
+        self.assertEqual(head_region('<!-- <body> -->'), '<!-- <body> -->')
+        self.assertEqual(head_region('<style>'), '<style>')
+        self.assertEqual(head_region('<meta content="<body>"><body>x'),
+                         '<meta content="<body>">')
+        self.assertEqual(head_region("<meta a='<body>' b=<body><body>x"),
+                         "<meta a='<body>' b=<body>")
+        self.assertEqual(head_region('<meta content="<body>'),
+                         '<meta content="<body>')
+        self.assertEqual(head_region('<!--><body>x'), '<!-->')
+        self.assertEqual(head_region('<!---><body>x'), '<!--->')
+        self.assertEqual(head_region('<!-- --!><body>x'), '<!-- --!>')
+        self.assertEqual(head_region('</body><body>x'), '</body>')
+        self.assertEqual(head_region('<script></scriptx><body></script>'),
+                         '<script></scriptx><body></script>')
+        self.assertEqual(head_region('<title></title x="<body>"><body>'),
+                         '<title></title x="<body>">')
+
+    def test_head_tags(self):
+        html = '''<head><!-- &amp; --><title>a &amp b</title>
+<script src="a?b&amp;c">a && b</script><link href=a></head><body><p>'''
+        self.assertEqual(list(head_tags(html)), [
+            '<head>', '<title>a &amp b</title>', '<script src="a?b&amp;c">',
+            '<link href=a>', '</head>',
+        ])
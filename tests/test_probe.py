@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.probe import Prober
+from cardisco.sniff import ATOM, RSS
+from cardisco.stats import DiscoveryStats, PROBE
+from local_server import LocalServer, Page
+from test_base import MINIMAL_HTML
+from test_verify import ATOM_BODY, RSS_BODY
+import time
+from unittest2 import TestCase
+
+PAGES = {
+    '/': Page('<title>No feeds here</title>'),
+    '/linked': Page(MINIMAL_HTML),
+    '/broken': Page('<title>Oops</title>', status=500),
+    '/feed': Page(RSS_BODY, headers={'Content-Type': 'text/xml'}),
+    '/rss': Page(status=301, headers={'Location': '/feed'}),
+    '/atom.xml': Page(ATOM_BODY, headers={'Content-Type': ATOM}),
+    '/index.xml': Page('<!DOCTYPE html><title>Not found</title>'),
+}
+PATHS = ('/feed', '/rss', '/atom.xml', '/index.xml', '/rss.xml')
+
+
+class ProberTestCase(TestCase):
+    '''Tests probing well-known feed paths.'''
+
+    def test_probe(self):
+        with LocalServer(PAGES, keep_alive=True) as server:
+            found = Prober(paths=PATHS, workers=1).probe(server.url('/'))
+            clients = set(server.clients)
+        self.assertEqual(found, {
+            RSS: {
+                server.url('/feed'): None,
+            },
+            ATOM: {
+                server.url('/atom.xml'): None,
+            },
+        })
+        # every probe (and redirect) went over the same connection
+        self.assertEqual(len(clients), 1)
+
+    def test_discover(self):
+        stats = DiscoveryStats()
+        prober = Prober(paths=PATHS)
+        with LocalServer(PAGES) as server:
+            result = cardisco.discover(server.url('/'), probe=prober,
+                                       hooks=stats)
+            self.assertEqual(result['application/rss+xml'], {
+                server.url('/feed'): None,
+            })
+            self.assertEqual(result['application/rdf+xml'], {})
+            self.assertEqual(stats.stages[PROBE][1], 2)
+            result = cardisco.discover(server.url('/broken'), probe=prober,
+                                       compact=True)
+            self.assertEqual(sorted((link.type, link.position)
+                                    for link in result.links),
+                             [(ATOM, None), (RSS, None)])
+            self.assertIn('application/opensearchdescription+xml', result)
+            del server.requests[:]
+            result = cardisco.discover(server.url('/linked'), probe=prober)
+            self.assertEqual(len(server.requests), 1)
+            self.assertEqual(result, cardisco.parse_html(
+                MINIMAL_HTML, url=server.url('/linked')))
+
+    def test_deadline(self):
+        pages = dict(PAGES)
+        pages['/feed'] = Page(RSS_BODY, headers={'Content-Type': RSS},
+                              delay=1)
+        with LocalServer(pages) as server:
+            start = time.time()
+            found = Prober(paths=PATHS, deadline=0.3).probe(server.url('/'))
+            elapsed = time.time() - start
+        self.assertLess(elapsed, 0.8)
+        self.assertEqual(found, {
+            ATOM: {
+                server.url('/atom.xml'): None,
+            },
+        })
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco import registry
+import os
+import shutil
+import subprocess
+import sys
+from tempfile import mkdtemp
+from unittest2 import TestCase
+import warnings
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUP = 'cardisco.test_discoverers'
+
+PLUGIN = '''\
+from cardisco.base import BaseDiscoverer
+
+
+class Discoverer(BaseDiscoverer):
+    required_attributes = ('type', 'href')
+'''
+
+ENTRY_POINTS = '''\
+[%s]
+application/json+oembed = cardisco_test_plugin
+broken = cardisco_test_plugin:NoSuchDiscoverer
+''' % GROUP
+
+HTML = '''\
+<!DOCTYPE html>
+<link href=a.json type=application/json+oembed>
+'''
+
+
+class RegistryTestCase(TestCase):
+    '''Tests the lazy imports and the entry point registry.'''
+
+    def assertNotImported(self, module, names, code=''):
+        script = 'import sys, %s; %s; print sorted(name for name in %r if ' \
+                 'sys.modules.get(name))' % (module, code or 'pass', names)
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         cwd=ROOT_DIR)
+        self.assertEqual(output.strip(), '[]', module)
+
+    def test_lazy_imports(self):
+        self.assertNotImported('cardisco', [
+            'html5lib', 'httplib2', 'pkg_resources', 'lxml.etree', 'ssl',
+            'socket', 'asyncore', 'httplib', 'gzip', 'hashlib',
+            'multiprocessing', 'cardisco.aio', 'cardisco.batch',
+            'cardisco.cache', 'cardisco.stream', 'cardisco.sniff',
+            'cardisco.backends', 'cardisco.engine', 'cardisco.base',
+        ])
+        # discoverers can be defined without lxml
+        self.assertNotImported('cardisco.base, cardisco.rss', ['lxml.etree'])
+        # entry points are found without pkg_resources
+        self.assertNotImported('cardisco', ['pkg_resources'],
+                               code='cardisco.parse_html(%r)' % HTML)
+
+    def test_entry_points(self):
+        tmp_dir = mkdtemp()
+        try:
+            with open(os.path.join(tmp_dir, 'cardisco_test_plugin.py'),
+                      'w') as f:
+                f.write(PLUGIN)
+            egg_info = os.path.join(tmp_dir, 'cardisco_test_plugin.egg-info')
+            os.mkdir(egg_info)
+            with open(os.path.join(egg_info, 'PKG-INFO'), 'w') as f:
+                f.write('Metadata-Version: 1.0\nName: cardisco-test-plugin\n'
+                        'Version: 1.0\n')
+            with open(os.path.join(egg_info, 'entry_points.txt'), 'w') as f:
+                f.write(ENTRY_POINTS)
+            sys.path.insert(0, tmp_dir)
+            registry.ENTRY_POINT_GROUP = GROUP
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                discoverers = registry.entry_point_discoverers(reload=True)
+            self.assertEqual(discoverers.keys(), ['application/json+oembed'])
+            self.assertEqual(len(caught), 1)
+            self.assertIn('broken', str(caught[0].message))
+
+            cardisco._MODULE_CACHE = {}
+            result = cardisco.parse_html(HTML, url='http://a/')
+            self.assertEqual(result['application/json+oembed'], {
+                'http://a/a.json': None,
+            })
+            self.assertEqual(result['application/rss+xml'], {})
+        finally:
+            registry.ENTRY_POINT_GROUP = 'cardisco.discoverers'
+            registry.entry_point_discoverers(reload=True)
+            cardisco._MODULE_CACHE = {}
+            sys.path.remove(tmp_dir)
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cardisco import _get_dispatcher, _result_from_response, parse_html
+from cardisco.cache import copy_result
+from cardisco.executor import compact
+from cardisco.results import DiscoveryResult, Link
+from collections import Mapping
+import cPickle as pickle
+from test_backends import documents, URL
+from test_engine import MIXED_HTML
+from unittest2 import TestCase
+
+
+class DiscoveryResultTestCase(TestCase):
+    '''Tests the compact results.'''
+
+    def test_same_as_dict(self):
+        for html in list(documents()) + [MIXED_HTML]:
+            expected = parse_html(html, url=URL)
+            result = parse_html(html, url=URL, compact=True)
+            self.assertIsInstance(result, DiscoveryResult)
+            self.assertIsInstance(result, Mapping)
+            self.assertEqual(result, expected)
+            self.assertEqual(expected, result)
+            self.assertEqual(result.to_dict(), expected)
+            self.assertEqual(sorted(result.keys()), sorted(expected.keys()))
+            for name, links in expected.iteritems():
+                self.assertEqual(result[name], links)
+                self.assertEqual(result.get(name), links)
+            self.assertEqual(compact(result), compact(expected))
+
+    def test_links(self):
+        result = parse_html(MIXED_HTML, compact=True)
+        self.assertEqual([(link.type, link.href, link.position)
+                          for link in result.links], [
+            ('application/rss+xml', 'a.rss', 0),
+            ('application/atom+xml', 'a.atom', 3),
+            ('application/rdf+xml', 'a.rdf', 4),
+            ('application/opensearchdescription+xml',
+             'http://example.org/base/a.osd', 6),
+        ])
+        osd = result.links[-1]
+        self.assertEqual(osd.title, 'Search')
+        self.assertEqual(osd.rel, 'search')
+        self.assertIsNone(result.links[2].rel)
+        # the types are shared with the dispatcher
+        names = dict((name, name) for name in _get_dispatcher().names)
+        for link in result.links:
+            self.assertIs(link.type, names[link.type])
+        self.assertFalse(hasattr(osd, '__dict__'))
+        self.assertFalse(hasattr(result, '__dict__'))
+        self.assertIsNone(result.get('text/css'))
+        self.assertRaises(KeyError, lambda: result['text/css'])
+
+    def test_duplicates(self):
+        result = parse_html('''\
+<link href=a.rss rel=alternate type=application/rss+xml title=A>
+<link href=b.rss rel=alternate type=application/rss+xml>
+<link href=a.rss rel=alternate type=application/rss+xml title=B>''',
+                            compact=True)
+        self.assertEqual([(link.href, link.title, link.position)
+                          for link in result.links],
+                         [('a.rss', 'B', 0), ('b.rss', None, 1)])
+
+    def test_empty(self):
+        empty = _get_dispatcher().empty
+        self.assertIs(parse_html('<title>x</title>', compact=True), empty)
+        self.assertIs(parse_html('<title>x</title>', compact=True,
+                                 prefilter=True), empty)
+        self.assertIs(_result_from_response(URL, 'image/png', '\x89PNG',
+                                            compact=True), empty)
+        self.assertEqual(empty, parse_html('<title>x</title>'))
+        self.assertEqual(empty.links, ())
+
+    def test_feed(self):
+        result = _result_from_response(URL, 'application/rss+xml', '<rss>',
+                                       compact=True)
+        self.assertEqual(result, {
+            'application/rss+xml': {
+                URL: None,
+            },
+        })
+
+    def test_pickle(self):
+        result = parse_html(MIXED_HTML, compact=True)
+        for protocol in (0, pickle.HIGHEST_PROTOCOL):
+            copy = pickle.loads(pickle.dumps(result, protocol))
+            self.assertEqual(copy, result)
+            self.assertEqual(copy.links, result.links)
+
+    def test_from_dict(self):
+        expected = parse_html(MIXED_HTML)
+        result = DiscoveryResult.from_dict(expected)
+        self.assertEqual(result, expected)
+        self.assertIs(copy_result(result), result)
+        self.assertEqual(result.links[0], Link('application/atom+xml',
+                                               'a.atom'))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.sniff import HTML, sniff
+from glob import glob
+from local_server import LocalServer, Page
+import os
+from test_base import MINIMAL_HTML
+from unittest2 import TestCase
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+RSS_DOC = '''\
+<?xml version="1.0"?>
+<!-- a comment -->
+<rss version="2.0"><channel></channel></rss>'''
+ATOM_DOC = '''\
+\xef\xbb\xbf<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"></feed>'''
+RSS1_DOC = '''\
+<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns="http://purl.org/rss/1.0/"></rdf:RDF>'''
+RDF_DOC = '''\
+<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+         xmlns:foaf="http://xmlns.com/foaf/0.1/"></rdf:RDF>'''
+PNG_DOC = '\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+PDF_DOC = '%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+
+
+class SniffTestCase(TestCase):
+    '''Tests the MIME sniffing algorithm.'''
+
+    def test_declared_feed(self):
+        self.assertEqual(sniff('application/rss+xml', ''),
+                         'application/rss+xml')
+        self.assertEqual(sniff('Application/Atom+XML; charset=utf-8', ''),
+                         'application/atom+xml')
+
+    def test_xml_feeds(self):
+        for content_type in ['text/xml', 'application/xml; charset=utf-8',
+                             'text/html', None]:
+            self.assertEqual(sniff(content_type, RSS_DOC),
+                             'application/rss+xml')
+            self.assertEqual(sniff(content_type, ATOM_DOC),
+                             'application/atom+xml')
+            self.assertEqual(sniff(content_type, RSS1_DOC),
+                             'application/rss+xml')
+            self.assertEqual(sniff(content_type, RDF_DOC),
+                             'application/rdf+xml')
+
+    def test_html(self):
+        for content_type in ['text/html', 'text/html; charset=utf-8',
+                             'application/xhtml+xml', 'text/xml',
+                             'text/plain', 'application/octet-stream', None,
+                             'image/png']:
+            self.assertEqual(sniff(content_type, MINIMAL_HTML), HTML)
+        self.assertEqual(sniff('text/html', PNG_DOC), HTML)
+
+    def test_binary(self):
+        for content_type in ['image/png', 'application/pdf',
+                             'application/octet-stream', None]:
+            self.assertIsNone(sniff(content_type, PNG_DOC))
+            self.assertIsNone(sniff(content_type, PDF_DOC))
+        self.assertIsNone(sniff('application/json', '{"a": 1}'))
+        self.assertIsNone(sniff('text/plain', 'a\x00b'))
+        self.assertEqual(sniff('text/plain', 'BMW'), HTML)
+
+    def test_fixtures(self):
+        for path in glob(os.path.join(BASE_DIR, '*', '*.htm*')):
+            data = open(path).read()
+            self.assertEqual(sniff('text/html', data), HTML, path)
+            self.assertEqual(sniff(None, data), HTML, path)
+
+    def test_discover(self):
+        pages = {
+            '/feed.xml': Page(RSS_DOC, headers={'Content-Type': 'text/xml'}),
+            '/image': Page(PNG_DOC, headers={'Content-Type': 'image/png'}),
+        }
+        with LocalServer(pages) as server:
+            url = server.url('/feed.xml')
+            self.assertEqual(cardisco.discover(url), {
+                'application/rss+xml': {
+                    url: None,
+                },
+            })
+            feeds = cardisco.discover(server.url('/image'))
+        self.assertEqual(feeds, dict((name, {}) for name in cardisco.MODULES))
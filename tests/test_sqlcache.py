@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.sqlcache import SQLiteCache
+from local_server import LocalServer
+from multiprocessing import Process
+import os
+import shutil
+import sqlite3
+import tempfile
+from test_base import MINIMAL_HTML
+from test_cache import ETAG, LAST_MODIFIED, PAGES
+import time
+from unittest2 import TestCase
+
+RESULT = {
+    'application/rss+xml': {
+        'http://example.com/feed.rss': u'Caf\xe9',
+    },
+    'application/atom+xml': {},
+}
+
+
+def _write(path, worker):
+    cache = SQLiteCache(path)
+    for i in xrange(50):
+        cache.set('http://example.com/%d/%d' % (worker, i), RESULT, ETAG)
+
+
+class SQLiteCacheTestCase(TestCase):
+    '''Tests the SQLite discovery cache.'''
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_get_set(self):
+        cache = SQLiteCache(self.path)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', RESULT, ETAG, LAST_MODIFIED)
+        entry = SQLiteCache(self.path).get('a')
+        self.assertEqual(entry.result, RESULT)
+        self.assertEqual(entry.conditional_headers(), {
+            'If-None-Match': ETAG,
+            'If-Modified-Since': LAST_MODIFIED,
+        })
+        self.assertLessEqual(entry.stored, time.time())
+        compact = cardisco.parse_html(MINIMAL_HTML, compact=True)
+        cache.set('b', compact)
+        self.assertEqual(cache.get('b').result, compact)
+        self.assertEqual(len(cache), 2)
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        mode = cache._connection().execute('PRAGMA journal_mode').fetchone()
+        self.assertEqual(mode[0], 'wal')
+
+    def test_bulk(self):
+        cache = SQLiteCache(self.path)
+        urls = ['http://example.com/%d' % i for i in xrange(1200)]
+        cache.set_many((url, RESULT, None, None) for url in urls[::2])
+        entries = cache.get_many(urls)
+        self.assertEqual(sorted(entries), sorted(urls[::2]))
+        self.assertEqual(list(cache.missing(iter(urls))), urls[1::2])
+
+    def test_failed_commit(self):
+        cache = SQLiteCache(self.path)
+        connection = cache._connection()
+
+        class FailingConnection(object):
+            def execute(self, sql, *args):
+                if sql == 'COMMIT':
+                    raise sqlite3.OperationalError('database is locked')
+                return connection.execute(sql, *args)
+
+            def executemany(self, sql, rows):
+                return connection.executemany(sql, rows)
+
+        cache._local.connection = FailingConnection()
+        with self.assertRaises(sqlite3.OperationalError):
+            cache.set_many([('a', RESULT, None, None)])
+        cache._local.connection = connection
+        self.assertIsNone(cache.get('a'))
+        cache.set_many([('b', RESULT, None, None)])
+        self.assertEqual(SQLiteCache(self.path).get('b').result, RESULT)
+
+    def test_ttl(self):
+        cache = SQLiteCache(self.path, ttl=0.05)
+        cache.set('a', RESULT)
+        cache.set('b', RESULT, ttl=60)
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(list(cache.missing(['a', 'b'])), ['a'])
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(len(cache), 1)
+
+    def test_processes(self):
+        SQLiteCache(self.path)
+        processes = [Process(target=_write, args=(self.path, i))
+                     for i in xrange(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(len(SQLiteCache(self.path)), 200)
+
+    def test_discover(self):
+        cache = SQLiteCache(self.path)
+        with LocalServer(PAGES) as server:
+            url = server.url('/conditional')
+            first = cardisco.discover(url, cache=cache)
+            second = cardisco.discover(url, cache=SQLiteCache(self.path))
+            self.assertEqual(server.requests[1][1]['if-none-match'], ETAG)
+            self.assertEqual(second, first)
+            plain = server.url('/plain')
+            cardisco.discover(plain, cache=cache)
+            self.assertIsNone(cache.get(plain))
+            cache.store_unvalidated = True
+            cardisco.discover(plain, cache=cache)
+            self.assertEqual(list(cache.missing([url, plain])), [])
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.base import BaseDiscoverer
+from cardisco.engine import LinkDispatcher
+from cardisco.stats import BUILD, BYTES_READ, CombinedHooks, DECODE, \
+    discoverer_stage, DISPATCH, DiscoveryStats, FETCH, LINKS_EXAMINED, \
+    LINKS_MATCHED, StatsCollector
+import html5lib
+from local_server import LocalServer, Page
+from test_base import FakeHTMLConnection, MINIMAL_HTML
+from test_engine import MIXED_HTML
+import time
+from unittest2 import TestCase
+
+
+class StatsTestCase(TestCase):
+    '''Tests the instrumentation hooks.'''
+
+    def test_parse_html(self):
+        stats = DiscoveryStats()
+        result = cardisco.parse_html(MIXED_HTML, url='http://a/', hooks=stats)
+        self.assertEqual(result, cardisco.parse_html(MIXED_HTML,
+                                                     url='http://a/'))
+        self.assertEqual(stats.stages[DECODE][1], len(MIXED_HTML))
+        self.assertEqual(stats.stages[BUILD][1], len(MIXED_HTML))
+        self.assertEqual(stats.stages[discoverer_stage('application/rss+xml')]
+                         [1], 1)
+        self.assertEqual(stats.stages[DISPATCH][1], 9)
+        self.assertEqual(stats.counters[LINKS_EXAMINED], 9)
+        self.assertEqual(stats.counters[LINKS_MATCHED],
+                         sum(len(urls) for urls in result.itervalues()))
+        stats = DiscoveryStats()
+        cardisco.parse_html(MIXED_HTML, hooks=stats, compact=True)
+        self.assertEqual(stats.stages.keys(), [DECODE, BUILD])
+        self.assertEqual(stats.counters[LINKS_EXAMINED], 9)
+
+    def test_discoverer_timings(self):
+        class SlowDiscoverer(BaseDiscoverer):
+            link_types = ('text/css',)
+
+            @classmethod
+            def check_link_element(cls, element):
+                time.sleep(0.02)
+                return True
+
+        class NextDiscoverer(BaseDiscoverer):
+            xpath = "/html:html/html:head/html:link[@href][@rel='next']"
+            required_attributes = ('href',)
+
+        dispatcher = LinkDispatcher({
+            'slow': SlowDiscoverer,
+            'next': NextDiscoverer,
+            'application/rss+xml':
+                cardisco._get_dispatcher().discoverers['application/rss+xml'],
+        })
+        doc = html5lib.parse(MIXED_HTML.replace('</head>',
+                                                '<link href=n rel=next>'),
+                             treebuilder='lxml')
+        stats = DiscoveryStats()
+        result = dispatcher.parse(doc, hooks=stats)
+        self.assertEqual(result, dispatcher.parse(doc))
+        # the time spent in check_link_element() is the slow discoverer's
+        seconds, links = stats.stages[discoverer_stage('slow')]
+        self.assertGreaterEqual(seconds, 0.02)
+        self.assertEqual(links, 1)
+        self.assertLess(stats.stages[discoverer_stage('application/rss+xml')]
+                        [0], 0.02)
+        self.assertEqual(stats.stages[discoverer_stage('next')][1], 1)
+        self.assertLess(stats.stages[DISPATCH][0], 0.02)
+        self.assertEqual(stats.counters[LINKS_EXAMINED], 10)
+
+    def test_discover(self):
+        stats = DiscoveryStats()
+        cardisco.discover('http://a/html', connection_type=FakeHTMLConnection,
+                          hooks=stats)
+        self.assertIn(FETCH, stats.stages)
+        self.assertIn(BUILD, stats.stages)
+        self.assertEqual(stats.counters[BYTES_READ], len(MINIMAL_HTML))
+        self.assertEqual(stats.counters[LINKS_MATCHED], 2)
+
+    def test_discover_streaming(self):
+        stats = DiscoveryStats()
+        with LocalServer({'/': Page(MINIMAL_HTML)}) as server:
+            cardisco.discover_streaming(server.url('/'), hooks=stats)
+        self.assertIn(FETCH, stats.stages)
+        self.assertIsNone(stats.stages[BUILD][1])
+        self.assertEqual(stats.counters[BYTES_READ], len(MINIMAL_HTML))
+
+    def test_collector(self):
+        collector = StatsCollector()
+        stats = DiscoveryStats()
+        hooks = CombinedHooks(collector, stats)
+        for i in xrange(3):
+            cardisco.parse_html(MINIMAL_HTML, hooks=hooks)
+        snapshot = collector.snapshot(reset=True)
+        self.assertEqual(snapshot['stages'][BUILD]['calls'], 3)
+        self.assertEqual(snapshot['stages'][BUILD]['size'],
+                         3 * len(MINIMAL_HTML))
+        self.assertLessEqual(snapshot['stages'][BUILD]['max_seconds'],
+                             snapshot['stages'][BUILD]['seconds'])
+        self.assertEqual(snapshot['counters'][LINKS_MATCHED], 6)
+        self.assertEqual(stats.counters[LINKS_MATCHED], 6)
+        self.assertEqual(collector.snapshot(), {
+            'stages': {},
+            'counters': {},
+        })
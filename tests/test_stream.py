@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.cache import DiscoveryCache
+from cardisco.stream import discover_streaming, fetch
+from local_server import LocalServer, Page
+from test_base import MINIMAL_HTML
+from unittest2 import TestCase
+
+BIG_HTML = '%s<body>%s</body>' % (MINIMAL_HTML, '<p>lorem ipsum</p>' * 300000)
+
+PAGES = {
+    '/big': Page(BIG_HTML),
+    '/feed': Page('', headers={'Content-Type': 'application/rss+xml'}),
+    '/moved': Page(status=302, headers={'Location': '/big'}),
+    '/etag': Page(MINIMAL_HTML, headers={
+        'Content-Type': 'text/html',
+        'ETag': '"x"',
+    }),
+}
+
+
+class StreamingTestCase(TestCase):
+    '''Tests the streamed discovery path.'''
+
+    def test_stops_after_head(self):
+        with LocalServer(PAGES) as server:
+            url = server.url('/big')
+            response = fetch(url)
+            try:
+                feeds = cardisco.parse_html(response, url=url, head_only=True)
+            finally:
+                response.close()
+        self.assertLess(response.bytes_read, 64 * 1024)
+        self.assertFalse(response.truncated)
+        self.assertEqual(feeds, cardisco.parse_html(MINIMAL_HTML, url=url))
+
+    def test_discover_streaming(self):
+        with LocalServer(PAGES) as server:
+            url = server.url('/moved')
+            feeds = discover_streaming(url)
+            self.assertEqual(feeds['application/rss+xml'], {
+                server.url('/foo.rss'): None,
+            })
+            url = server.url('/feed')
+            self.assertEqual(discover_streaming(url), {
+                'application/rss+xml': {
+                    url: None,
+                },
+            })
+
+    def test_max_bytes(self):
+        with LocalServer(PAGES) as server:
+            response = fetch(server.url('/big'), max_bytes=10)
+            try:
+                data = response.read()
+                self.assertEqual(response.read(), '')
+            finally:
+                response.close()
+        self.assertEqual(data, BIG_HTML[:10])
+        self.assertTrue(response.truncated)
+
+    def test_cache(self):
+        cache = DiscoveryCache()
+        with LocalServer(PAGES) as server:
+            url = server.url('/etag')
+            first = discover_streaming(url, cache=cache)
+            self.assertEqual(discover_streaming(url, cache=cache), first)
+            self.assertEqual(server.requests[1][1]['if-none-match'], '"x"')
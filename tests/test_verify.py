@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cardisco import parse_html
+from cardisco.sniff import ATOM, RSS
+from cardisco.verify import (check_url, FeedVerifier, HEAD, VerdictCache,
+                             verify_results)
+from local_server import LocalServer, Page
+from threading import Lock
+import time
+from unittest2 import TestCase
+
+RSS_BODY = '<?xml version="1.0"?>\n<rss version="2.0"><channel>%s' \
+           '</channel></rss>' % ('<item/>' * 1000)
+ATOM_BODY = '<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom">'
+OSD = 'application/opensearchdescription+xml'
+
+PAGES = {
+    '/feed.rss': Page(RSS_BODY, headers={'Content-Type': 'text/xml'}),
+    '/atom': Page(ATOM_BODY, headers={'Content-Type': ATOM}),
+    '/fake.rss': Page('<!DOCTYPE html><title>x</title>',
+                      headers={'Content-Type': RSS}),
+    '/search.xml': Page('<?xml version="1.0"?><OpenSearchDescription/>',
+                        headers={'Content-Type': OSD}),
+    '/moved.rss': Page(status=301, headers={'Location': '/feed.rss'}),
+}
+
+HTML = '''\
+<link href=/feed.rss rel=alternate type=application/rss+xml>
+<link href=/atom rel=alternate type=application/atom+xml>
+<link href=/fake.rss rel=alternate type=application/rss+xml title=Fake>
+<link href=/missing.rss rel=alternate type=application/rss+xml>
+'''
+
+
+class FeedVerifierTestCase(TestCase):
+    '''Tests verifying discovered URLs.'''
+
+    def test_check_url(self):
+        with LocalServer(PAGES) as server:
+            verdict = check_url(server.url('/feed.rss'))
+            self.assertTrue(verdict.ok)
+            self.assertEqual(verdict.mime_type, RSS)
+            self.assertEqual(verdict.status, 200)
+            self.assertFalse(verdict.redirected)
+            self.assertEqual(server.requests[0][1]['range'], 'bytes=0-511')
+            self.assertEqual(check_url(server.url('/atom')).mime_type, ATOM)
+            self.assertEqual(check_url(server.url('/search.xml')).mime_type,
+                             OSD)
+            self.assertFalse(check_url(server.url('/fake.rss')).ok)
+            verdict = check_url(server.url('/missing.rss'))
+            self.assertFalse(verdict.ok)
+            self.assertEqual(verdict.status, 404)
+            verdict = check_url(server.url('/moved.rss'))
+            self.assertTrue(verdict.ok)
+            self.assertTrue(verdict.redirected)
+            self.assertEqual(verdict.final_url, server.url('/feed.rss'))
+            verdict = check_url('http://127.0.0.1:1/feed.rss')
+            self.assertFalse(verdict.ok)
+            self.assertIsNone(verdict.status)
+            self.assertTrue(verdict.error)
+
+    def test_head(self):
+        with LocalServer(PAGES) as server:
+            # the Content-Type header is trusted
+            self.assertTrue(check_url(server.url('/fake.rss'),
+                                      method=HEAD).ok)
+            self.assertEqual(server.methods, ['HEAD'])
+            # but generic types fall back to a GET
+            self.assertTrue(check_url(server.url('/feed.rss'),
+                                      method=HEAD).ok)
+            self.assertEqual(server.methods, ['HEAD', 'HEAD', 'GET'])
+
+    def test_verify_results(self):
+        with LocalServer(PAGES) as server:
+            results = [
+                (server.url('/a'), parse_html(HTML, url=server.url('/a'))),
+                (server.url('/b'), parse_html(HTML, url=server.url('/b'),
+                                              compact=True)),
+                (server.url('/c'), ValueError('x')),
+            ]
+            verified = verify_results(results, per_host=1)
+            paths = sorted(path for path, headers in server.requests)
+        self.assertEqual(paths, ['/atom', '/fake.rss', '/feed.rss',
+                                 '/missing.rss'])
+        self.assertEqual([url for url, result in verified],
+                         [url for url, result in results])
+        expected = {
+            RSS: {
+                server.url('/feed.rss'): None,
+            },
+            ATOM: {
+                server.url('/atom'): None,
+            },
+            'application/rdf+xml': {},
+            OSD: {},
+        }
+        self.assertEqual(verified[0][1], expected)
+        self.assertEqual(verified[1][1], expected)
+        self.assertEqual([link.href for link in verified[1][1].links],
+                         [server.url('/feed.rss'), server.url('/atom')])
+        self.assertIs(verified[2][1], results[2][1])
+
+    def test_cache(self):
+        cache = VerdictCache(ttl=60)
+        verifier = FeedVerifier(cache=cache)
+        with LocalServer(PAGES) as server:
+            url = server.url('/feed.rss')
+            first = verifier.verify([url, url])
+            second = verifier.verify([url])
+            self.assertEqual(len(server.requests), 1)
+            self.assertIs(first[url], second[url])
+            cache.ttl = 0
+            time.sleep(0.01)
+            verifier.verify([url])
+            self.assertEqual(len(server.requests), 2)
+
+    def test_per_host(self):
+        lock = Lock()
+        counts = {
+            'active': 0,
+            'max': 0,
+        }
+
+        def slow(handler):
+            with lock:
+                counts['active'] += 1
+                counts['max'] = max(counts['max'], counts['active'])
+            time.sleep(0.05)
+            with lock:
+                counts['active'] -= 1
+            return Page(RSS_BODY, headers={'Content-Type': RSS})
+
+        pages = dict(('/%d.rss' % i, slow) for i in xrange(8))
+        with LocalServer(pages) as server:
+            urls = [server.url(path) for path in pages]
+            verdicts = FeedVerifier(workers=8, per_host=2).verify(urls)
+        self.assertTrue(all(verdict.ok for verdict in verdicts.itervalues()))
+        self.assertEqual(counts['max'], 2)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# Copyright 2010 Mark Lee
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cardisco
+from cardisco.executor import ParseExecutor
+from cardisco.warc import discover_archive, iter_responses
+from gzip import GzipFile
+from StringIO import StringIO
+from test_base import MINIMAL_HTML
+from unittest2 import TestCase
+
+LATIN1_HTML = '''<!DOCTYPE html>
+<meta charset=utf-8>
+<link rel=alternate type=application/rss+xml href=caf\xe9.rss title=Caf\xe9>
+'''
+
+
+def gzipped(data):
+    buf = StringIO()
+    f = GzipFile(fileobj=buf, mode='wb')
+    f.write(data)
+    f.close()
+    return buf.getvalue()
+
+
+def chunked(data, size=7):
+    chunks = ['%x\r\n%s\r\n' % (len(data[i:i + size]), data[i:i + size])
+              for i in xrange(0, len(data), size)]
+    return ''.join(chunks) + '0\r\n\r\n'
+
+
+def http_response(body, headers):
+    lines = ['HTTP/1.1 200 OK'] + ['%s: %s' % header for header in headers]
+    return '%s\r\n\r\n%s' % ('\r\n'.join(lines), body)
+
+
+def warc_record(warc_type, url, block, content_type='application/http; '
+                                                    'msgtype=response'):
+    return 'WARC/1.0\r\nWARC-Type: %s\r\nWARC-Target-URI: %s\r\n' \
+           'Content-Type: %s\r\nContent-Length: %d\r\n\r\n%s\r\n\r\n' % (
+               warc_type, url, content_type, len(block), block)
+
+
+RECORDS = [
+    warc_record('warcinfo', '', 'software: test\r\n',
+                content_type='application/warc-fields'),
+    warc_record('request', 'http://a.example.com/x/',
+                'GET /x/ HTTP/1.1\r\n\r\n',
+                content_type='application/http; msgtype=request'),
+    warc_record('response', 'http://a.example.com/x/', http_response(
+        MINIMAL_HTML, [('Content-Type', 'text/html')])),
+    warc_record('response', 'http://b.example.com/logo.png', http_response(
+        '\x89PNG\r\n\x1a\n' + '\x00' * 1000,
+        [('Content-Type', 'image/png')])),
+    warc_record('response', 'http://c.example.com/y', http_response(
+        chunked(gzipped(LATIN1_HTML)), [
+            ('Content-Type', 'text/html; charset="ISO-8859-1"'),
+            ('Transfer-Encoding', 'chunked'),
+            ('Content-Encoding', 'gzip'),
+        ])),
+]
+
+
+class WARCTestCase(TestCase):
+    '''Tests reading web archives.'''
+
+    def check_responses(self, responses):
+        self.assertEqual([response.url for response in responses],
+                         ['http://a.example.com/x/', 'http://c.example.com/y'])
+        self.assertEqual(responses[0].body, MINIMAL_HTML)
+        self.assertEqual(responses[1].body, LATIN1_HTML.decode('latin-1'))
+        self.assertEqual(responses[1].headers['content-encoding'], 'gzip')
+
+    def test_uncompressed(self):
+        archive = StringIO(''.join(RECORDS))
+        self.check_responses(list(iter_responses(archive)))
+
+    def test_gzip_members(self):
+        archive = StringIO(''.join(gzipped(record) for record in RECORDS))
+        self.check_responses(list(iter_responses(archive)))
+
+    def test_arc(self):
+        body = http_response(MINIMAL_HTML, [('Content-Type', 'text/html')])
+        version = '1 0 test\nURL IP-address Archive-date Content-type ' \
+                  'Archive-length\n'
+        archive = StringIO(
+            'filedesc://test.arc 0.0.0.0 20100101000000 text/plain %d\n%s\n'
+            'http://a.example.com/x/ 10.0.0.1 20100101000000 text/html %d\n'
+            '%s\n' % (len(version), version, len(body), body))
+        responses = list(iter_responses(archive))
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(responses[0].url, 'http://a.example.com/x/')
+        self.assertEqual(responses[0].body, MINIMAL_HTML)
+
+    def test_max_body(self):
+        archive = StringIO(''.join(RECORDS))
+        responses = list(iter_responses(archive, max_body=20))
+        self.assertEqual(len(responses), 2)
+        self.assertTrue(responses[0].truncated)
+        self.assertEqual(responses[0].body, MINIMAL_HTML[:20])
+
+    def test_discover_archive(self):
+        archive = ''.join(gzipped(record) for record in RECORDS)
+        results = list(discover_archive(StringIO(archive)))
+        self.assertEqual(results[0], ('http://a.example.com/x/',
+                                      cardisco.parse_html(
+                                          MINIMAL_HTML,
+                                          url='http://a.example.com/x/')))
+        self.assertEqual(results[1][1]['application/rss+xml'], {
+            u'http://c.example.com/caf\xe9.rss': u'Caf\xe9',
+        })
+        with ParseExecutor(processes=2, chunksize=1) as executor:
+            self.assertEqual(list(discover_archive(StringIO(archive),
+                                                   executor=executor)),
+                             results)